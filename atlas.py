@@ -4,8 +4,20 @@
 
 Run this script with the name of a database file created by the script
 naevdb.py. It will read information from this database and output a set
-of HTML files to an atlas/ subdirectory. Example usage:
+of HTML files to an atlas/ subdirectory, or into a single zip archive
+with the --zip option. With the --gzip option, each file is accompanied
+by a gzip-compressed copy for web servers to send as it is. The pages
+can be written by several processes at once with the --jobs option. An
+existing atlas can be brought up to date with the --incremental option,
+which rewrites only the pages whose content has changed. Example usage:
     user@home:~/naev/$ atlas naev.db
+    user@home:~/naev/$ atlas --jobs 4 naev.db
+    user@home:~/naev/$ atlas --incremental naev.db
+    user@home:~/naev/$ atlas --zip atlas.zip naev.db
+
+Alternatively, the atlas can be served straight from the database by a
+local web server, which renders each page when it is first asked for:
+    user@home:~/naev/$ atlas serve naev.db
 
 '''
 
@@ -25,14 +37,39 @@ of HTML files to an atlas/ subdirectory. Example usage:
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # Standard library imports.
-from datetime import date, fromtimestamp
+import argparse
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+import gzip
+import hashlib
+from html import escape
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
+import json
 import os
-import sqlite3 as db
+import re
+from string import Formatter
 import sys
+import threading
+from urllib.parse import quote, unquote, urlsplit
+import zipfile
 
 # Local imports.
+from jumpmap import MapIndex, svg_point, svg_viewbox
+from naevdata import content_hash
 import naevdb
 
+# The version of the page layout. Changing this forces an incremental
+# update to rewrite every page.
+PAGE_FORMAT = 4
+
+# The name of the file, within the atlas directory, recording the content of
+# each page (see main()).
+MANIFEST = 'manifest.json'
+
 def scale_term(val, terms):
     '''Describe the relative scale or magnitude of a value.
 
@@ -79,76 +116,335 @@ def scale_term(val, terms):
         # Fell through without a match. Use the last one.
         return word
 
-def ssysdesc(ssys, out):
-    '''Write a description of a star system to an output file.
+class Markup(str):
+    '''A string of HTML markup, which a Template will not escape.'''
+    pass
+
+# The same names turn up on many pages, so remember how they were escaped.
+_escape_text = lru_cache(maxsize=2 ** 16)(escape)
+
+# Types whose string forms never need escaping.
+_PLAIN_TYPES = (int, float, bool, type(None))
+
+def _escape_value(val):
+    '''Convert a value to a string, escaping it for HTML if need be.'''
+    val_type = type(val)
+    if val_type is str:
+        return _escape_text(val)
+    elif val_type is Markup:
+        return val
+    elif val_type in _PLAIN_TYPES:
+        return str(val)
+    else:
+        return escape(str(val))
+
+class Template:
+    '''A fragment of HTML with replacement fields.
+
+    The template text is compiled just once, when the Template is
+    created, into a function that joins its static parts together with
+    the values of its fields. Filling it in is then a single call.
+
+    The replacement fields are written as for str.format(), but each
+    must be a keyword argument name, optionally followed by attribute
+    lookups and a format specification; for example, {ssys.name} or
+    {value:.1f}. Conversions such as {value!r} are not allowed. Values
+    are escaped for HTML, unless they are instances of Markup (and have
+    no format specification).
+
+    '''
+    def __init__(self, text):
+        '''Compile the template.
+
+        Keyword arguments:
+            text -- The text of the template.
+
+        '''
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if literal:
+                parts.append(repr(literal))
+            if field is None:
+                continue
+            names = field.split('.')
+            if not all(name.isidentifier() for name in names):
+                raise ValueError("bad template field '{}'".format(field))
+            if conversion:
+                raise ValueError("conversion '!{}' not allowed in template "
+                                 "field '{}'".format(conversion, field))
+            expr = '.'.join(['_fields[{!r}]'.format(names[0])] + names[1:])
+            if spec:
+                expr = 'format({}, {!r})'.format(expr, spec)
+            parts.append('_escape_value({})'.format(expr))
+
+        # Each part is followed by a comma, so that the parts always make
+        # a tuple, even if there is only one part or none at all.
+        source = ('def render(_fields, Markup=Markup, '
+                  '_escape_value=_escape_value):\n'
+                  '    return Markup(\'\'.join(({})))\n'.format(
+                      ''.join(part + ', ' for part in parts)))
+        namespace = {'Markup': Markup, '_escape_value': _escape_value}
+        exec(source, namespace)
+        self._render = namespace['render']
+
+    def render(self, **fields):
+        '''Fill in the template.
+
+        Keyword arguments:
+            Any -- The values to fill in the template fields.
+        Returns:
+            The completed HTML, as a Markup instance.
+
+        '''
+        return self._render(fields)
+
+def page_filename(name):
+    '''Get the file name of the page for a star system or asset.
+
+    Names may hold any character, but a '/' would put the page in a
+    subdirectory, so it is written as %2F, and a '%' as %25 to keep the
+    two apart. unquote() turns the file name back into the name.
+
+    '''
+    return name.replace('%', '%25').replace('/', '%2F')
+
+@lru_cache(maxsize=2 ** 16)
+def url(name):
+    '''Get the URL-safe form of a page name, leading to its file.'''
+    return quote(page_filename(name), safe='')
+
+SSYS_PAGE = Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{ssys.name} system - Naev Atlas</title>
+</head>
+<body>
+<h1>{ssys.name}</h1>
+<h2>Key data</h2>
+  <dl>
+    <dt>Coordinates</dt> <dd>({ssys.pos.x}, {ssys.pos.y})</dd>
+    <dt>Interference</dt> <dd>{ssys.interference} ({interference})</dd>
+    <dt>Radius</dt> <dd>{ssys.radius} ({radius})</dd>
+    <dt>Nebula</dt> <dd>Density {ssys.nebula.density} ({density}),
+        volatility {ssys.nebula.volatility} ({volatility})</dd>
+    <dt>Stars</dt> <dd>{ssys.stars} ({stars})</dd>
+  </dl>
+<h2>Assets</h2>
+  <ul>
+{assets}  </ul>
+<h2>Neighbourhood</h2>
+{minimap}<h2>Jumps</h2>
+  <ul>
+{jumps}  </ul>
+</body>
+</html>
+''')
+SSYS_ASSET = Template('    <li><a href="../assets/{url}.html">'
+                      '{name}</a></li>\n')
+SSYS_JUMP = Template('    <li><a href="{url}.html">{name}</a>\n'
+                     '{details}    </li>\n')
+JUMP_POS = Template('        @ ({jump.x}, {jump.y})\n')
+JUMP_AUTOPOS = Markup('        (auto-positioned)\n')
+JUMP_EXIT_ONLY = Markup('        (exit-only)\n')
+
+# The neighbourhood shown on the map of each system: every system within
+# this many jumps, or within this distance.
+MINIMAP_JUMPS = 2
+MINIMAP_RADIUS = 150
+
+# The width and height of the map of each system, in pixels.
+MINIMAP_SIZE = 240
+
+MINIMAP = Template('''<svg class="minimap" xmlns="http://www.w3.org/2000/svg"
+     width="{size}" height="{size}"
+     viewBox="{left:g} {top:g} {width:g} {height:g}">
+<g stroke="grey" stroke-width="{stroke:g}">
+{links}</g>
+<g stroke="none" font-size="{font:g}">
+{systems}</g>
+</svg>
+''')
+MINIMAP_LINK = Template('  <line x1="{x1:g}" y1="{y1:g}" '
+                        'x2="{x2:g}" y2="{y2:g}"/>\n')
+MINIMAP_SSYS = Template('  <a href="{url}.html"><circle cx="{x:g}" cy="{y:g}" '
+                        'r="{r:g}" fill="orange"/>'
+                        '<text x="{tx:g}" y="{ty:g}">{name}</text></a>\n')
+MINIMAP_HERE = Template('  <circle cx="{x:g}" cy="{y:g}" r="{r:g}" '
+                        'fill="red"/>'
+                        '<text x="{tx:g}" y="{ty:g}" font-weight="bold">'
+                        '{name}</text>\n')
 
-    The output is in HTML format and includes hyperlinks to in-system
-    assets and connected systems.
+def minimap(name, neighbourhood):
+    '''Get an inline SVG map of the neighbourhood of a star system.
+
+    Keyword arguments:
+        name -- The name of the star system at the centre of the map.
+        neighbourhood -- The systems to show, and the jumps between
+            them, as returned by MapIndex.neighbourhood().
+
+    '''
+    (xmin, xmax, ymin, ymax), systems, links = neighbourhood
+    # Show a square region centred on the neighbourhood, and size the
+    # markers to suit.
+    span = max(xmax - xmin, ymax - ymin, MINIMAP_RADIUS)
+    centre_x, centre_y = (xmin + xmax) / 2, (ymin + ymax) / 2
+    left, top, width, height = svg_viewbox((centre_x - span / 2,
+                                            centre_x + span / 2,
+                                            centre_y - span / 2,
+                                            centre_y + span / 2),
+                                           margin=span / 8)
+    size = span / 40
+
+    positions = {}
+    marks = []
+    for other, x, y in systems:
+        x, y = positions[other] = svg_point(x, y)
+        mark = MINIMAP_HERE if other == name else MINIMAP_SSYS
+        marks.append(mark.render(url=url(other), name=other, x=x, y=y,
+                                 r=size, tx=x + 1.5 * size, ty=y + size))
+    lines = []
+    for origin, dest in links:
+        (x1, y1), (x2, y2) = positions[origin], positions[dest]
+        lines.append(MINIMAP_LINK.render(x1=x1, y1=y1, x2=x2, y2=y2))
+
+    return MINIMAP.render(size=MINIMAP_SIZE, left=left, top=top, width=width,
+                          height=height, stroke=size / 4, font=3 * size,
+                          links=Markup(''.join(lines)),
+                          systems=Markup(''.join(marks)))
+
+def ssys_neighbourhood(map_index, name):
+    '''Find the neighbourhood of a star system shown on its page.'''
+    return map_index.neighbourhood(name, MINIMAP_JUMPS, MINIMAP_RADIUS)
+
+def ssyspage(ssys, map_index=None):
+    '''Get the HTML page describing a star system.
+
+    The page includes hyperlinks to in-system assets and connected
+    systems, and a map of the systems around it.
 
     Keyword arguments:
         ssys -- The star system to describe. An instance of SSystem.
+        map_index -- The MapIndex to draw the map from. If omitted,
+            the page has no map.
+
+    '''
+    assets = Markup(''.join(SSYS_ASSET.render(url=url(asset), name=asset)
+                            for asset in sorted(ssys.assets)))
+
+    jumps = []
+    for jumpname, jump in sorted(ssys.jumps.items()):
+        details = []
+        if jump.x is not None:
+            details.append(JUMP_POS.render(jump=jump))
+        if jump.autopos:
+            details.append(JUMP_AUTOPOS)
+        if jump.exit_only:
+            details.append(JUMP_EXIT_ONLY)
+        jumps.append(SSYS_JUMP.render(url=url(jumpname), name=jumpname,
+                                      details=Markup(''.join(details))))
+
+    if map_index is not None and ssys.name in map_index.positions:
+        ssys_map = minimap(ssys.name, ssys_neighbourhood(map_index, ssys.name))
+    else:
+        ssys_map = Markup('')
+
+    return SSYS_PAGE.render(
+        ssys=ssys, assets=assets, jumps=Markup(''.join(jumps)),
+        minimap=ssys_map,
+        interference=scale_term(ssys.interference, 'interference'),
+        radius=scale_term(ssys.radius, 'radius'),
+        density=scale_term(ssys.nebula.density, 'density'),
+        volatility=scale_term(ssys.nebula.volatility, 'volatility'),
+        stars=scale_term(ssys.stars, 'stars'))
+
+def ssysdesc(ssys, out, map_index=None):
+    '''Write a description of a star system to an output file.
+
+    The output is the page given by ssyspage(), written all at once.
+
+    Keyword arguments:
+        ssys, map_index -- As for ssyspage().
         out -- A file or file-like object, already opened for writing.
 
     '''
-    # Start the HTML output.
-    print('''<!DOCTYPE html>
-<html lang="en">''', file=out)
-
-    # Set metadata.
-    print('''<head>
-<title>{0.name} system - Naev Atlas</title>
-</head>'''.format(ssys), file=out)
-
-    # Describe the system.
-    print('''<body>
-<h1>{0.name}</h1>
-<h2>Key data</h2>
+    out.write(ssyspage(ssys, map_index))
+
+ASSET_PAGE = Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{asset.name} - Naev Atlas</title>
+</head>
+<body>
+<hgroup>
+<h1>{asset.name}</h1>
+<h2>({location})</h2>
+</hgroup>
+{about}<h2>Key data</h2>
   <dl>
-    <dt>Coordinates</dt> <dd>({0.pos.x}, {0.pos.y})</dd>
-    <dt>Interference</dt> <dd>{0.interference} ({1})</dd>
-    <dt>Radius</dt> <dd>{0.radius} ({2})</dd>
-    <dt>Nebula</dt> <dd>Density {0.nebula.density} ({3}),
-                        volatility {0.nebula.volatility} ({4})</dd>
-    <dt>Stars</dt> <dd>{0.stars} ({5})</dd>
-  </dl>'''.format(ssys, scale_term(ssys.interference, 'interference'),
-                  scale_term(ssys.radius, 'radius'),
-                  scale_term(ssys.nebula.density, 'density'),
-                  scale_term(ssys.interference, 'volatility'),
-                  scale_term(ssys.stars, 'stars')),
-          file=out)
-
-    # Name the assets present here.
-    # TODO: Link to them as well.
-    print('<h2>Assets</h2>', file=out)
-    print('  <ul>', file=out)
-    for asset in ssys.assets:
-        print('    <li><a href="../assets/{0}.html">'
-              '{0}</a></li>'.format(asset), file=out)
-    print('  </ul>', file=out)
-
-    # Name the systems connected to here via hyperspace jumps.
-    print('<h2>Jumps</h2>', file=out)
-    print('  <ul>', file=out)
-    for jumpname, jump in ssys.jumps.items():
-        print('    <li><a href="{0}.html">{0}</a>'.format(jumpname),
-              file=out)
-        if jump.x is None:
-            print('        (auto-positioned)', file=out)
-        else:
-            print('        @ ({0.x}, {0.y})'.format(jump), file=out)
-        if jump.exit_only:
-            print('        (exit-only)', file=out)
-        print('    </li>', file=out)
-    print('  </ul>', file=out)
+    <dt>Coordinates</dt> <dd>({asset.pos.x}, {asset.pos.y})</dd>
+    <dt>Faction</dt> <dd>{asset.presence.faction}
+        ({asset.presence.value}, range {asset.presence.range})</dd>
+    <dt>Class</dt> <dd>{asset.world_class}</dd>
+    <dt>Population</dt> <dd>{asset.population}</dd>
+    <dt>Hide value</dt> <dd>{asset.hide}</dd>
+  </dl>
+<h2>Services</h2>
+  <dl>
+    <dt>Landing rights</dt> <dd>{services.land}</dd>
+    <dt>Spaceport bar</dt> <dd>{services.bar}</dd>
+    <dt>Commodities</dt> <dd>{commodities}</dd>
+    <dt>Refueling</dt> <dd>{services.refuel}</dd>
+    <dt>Missions</dt> <dd>{services.missions}</dd>
+    <dt>Shipyard</dt> <dd>{services.shipyard}</dd>
+    <dt>Outfits</dt> <dd>{services.outfits}</dd>
+  </dl>
+</body>
+</html>
+''')
+ASSET_SSYS = Template('<a href="../ssys/{url}.html">{name}</a>')
+ASSET_DESCRIPTION = Template('<p>{description}</p>\n')
+ASSET_VIRTUAL = Markup('<p>Virtual asset.</p>\n')
+ASSET_GFX = Template('<p>{purpose} image: {image}</p>\n')
+
+def assetpage(asset, systems):
+    '''Get the HTML page describing an asset.
+
+    The page includes a hyperlink to the asset\'s star system, if it is
+    present in only one.
+
+    Keyword arguments:
+        asset -- The asset to describe. An instance of Asset.
+        systems -- Names of star systems where this asset is present.
+
+    '''
+    if len(systems) == 0:
+        location = 'None'
+    elif len(systems) > 1:
+        location = 'Common'
+    else:
+        location = ASSET_SSYS.render(url=url(systems[0]), name=systems[0])
 
-    # Finish the HTML output.
-    print('</body>\n</html>', file=out)
+    about = []
+    if asset.description:
+        about.append(ASSET_DESCRIPTION.render(description=asset.description))
+    if asset.virtual:
+        about.append(ASSET_VIRTUAL)
+    for purpose, image in sorted(asset.gfx.items()):
+        about.append(ASSET_GFX.render(purpose=purpose.title(), image=image))
+
+    commodities = asset.services.commodities
+    return ASSET_PAGE.render(
+        asset=asset, services=asset.services, location=location,
+        about=Markup(''.join(about)),
+        commodities=('None' if commodities is None else
+                     ', '.join(sorted(commodities))))
 
 def assetdesc(asset, systems, out):
     '''Write a description of an asset to an output file.
 
-    The output is in HTML format and includes a hyperlink to the system.
-    TODO: No it doesn't. Not yet.
+    The output is the page given by assetpage(), written all at once.
 
     Keyword arguments:
         assset -- The asset to describe. An instance of Asset.
@@ -156,115 +452,945 @@ def assetdesc(asset, systems, out):
         out -- A file or file-like object, already opened for writing.
 
     '''
-    # Start the HTML output.
-    print('''<!DOCTYPE html>
-<html lang="en">''', file=out)
-
-    # Set metadata.
-    print('<head>\n<title>{0.name} - Naev Atlas</title>\n'
-          '</head>'.format(asset), file=out)
-
-    # Describe the asset.
-    print('<body>', file=out)
-    print('<hgroup>\n<h1>{0.name}</h1>'.format(asset), file=out)
-    print('<h2>(' + ('None' if len(systems) == 0 else
-                     'Common' if len(systems) > 1 else
-                     '<a href="../ssys/{0}.html">{0}</a>'.format(systems[0])) +
-          ')</h2>\n</hgroup>', file=out)
+    out.write(assetpage(asset, systems))
 
-    if asset.description:
-        print('<p>{0.description}</p>'.format(asset), file=out)
-    if asset.virtual:
-        print('<p>Virtual asset.</p>', file=out)
-    for purpose, image in asset.gfx.items():
-        print('<p>{} image: {}</p>'.format(purpose.title(), image), file=out)
+INDEX_PAGE = Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Naev Atlas</title>
+<script src="search.js" defer></script>
+</head>
+<body>
+<h1>Naev Atlas</h1>
+<p>This atlas describes {ssys_count} star systems and {asset_count} assets.
+  Search for a system, an asset, or the factions and commodities to be
+  found there.</p>
+<form role="search">
+  <input type="search" id="search" autocomplete="off"
+         placeholder="Search the atlas" aria-label="Search the atlas">
+</form>
+<noscript><p>Searching the atlas requires JavaScript.</p></noscript>
+<p id="status"></p>
+<ul id="results">
+</ul>
+</body>
+</html>
+''')
 
-    # Provide data on this asset.
-    print('''<h2>Key data</h2>
-  <dl>
-    <dt>Coordinates</dt> <dd>({0.pos.x}, {0.pos.y})</dd>
-    <dt>Faction</dt> <dd>{0.presence.faction}
-                         ({0.presence.value}, range {0.presence.range})</dd>
-    <dt>Class</dt> <dd>{0.world_class}</dd>
-    <dt>Population</dt> <dd>{0.population}</dd>
-    <dt>Hide value</dt> <dd>{0.hide}</dd>
-  </dl>'''.format(asset), file=out)
-
-    # Describe services available here.
-    print('''<h2>Services</h2>
-  <dl>
-    <dt>Landing rights</dt> <dd>{0.land}</dd>
-    <dt>Spaceport bar</dt> <dd>{0.bar}</dd>
-    <dt>Commodities</dt> <dd>{1}</dd>
-    <dt>Refueling</dt> <dd>{0.refuel}</dd>
-    <dt>Missions</dt> <dd>{0.missions}</dd>
-    <dt>Shipyard</dt> <dd>{0.shipyard}</dd>
-    <dt>Outfits</dt> <dd>{0.outfits}</dd>
-  </dl>'''.format(asset.services,
-                  'None' if asset.services.commodities is None else
-                  ', '.join(asset.services.commodities)), file=out)
-
-    # Finish the HTML output.
-    print('</body>\n</html>', file=out)
-
-def make_index(out):
+# The number of leading characters of a search term that decide which shard
+# of the search index it goes into. This must match KEY_LENGTH in the
+# search script.
+SEARCH_KEY_LENGTH = 2
+
+# The most search results to show at once.
+SEARCH_LIMIT = 50
+
+SEARCH_SCRIPT = Markup('''// Search the Naev Atlas.
+(function () {
+  "use strict";
+  var KEY_LENGTH = %d, LIMIT = %d;
+  var shards = {};
+  var input, status, results;
+
+  function normalise(text) {
+    return text.toLowerCase().replace(/[^a-z0-9]/g, "_");
+  }
+
+  function show(query, entries) {
+    var matches = entries.filter(function (entry) {
+      return entry[0].indexOf(query) === 0;
+    });
+    matches.sort(function (a, b) {
+      return a[1] < b[1] ? -1 : a[1] > b[1] ? 1 : 0;
+    });
+    results.textContent = "";
+    matches.slice(0, LIMIT).forEach(function (entry) {
+      var item = document.createElement("li");
+      var link = document.createElement("a");
+      link.href = entry[3];
+      link.textContent = entry[1];
+      item.appendChild(link);
+      item.appendChild(document.createTextNode(" (" + entry[2] + ")"));
+      results.appendChild(item);
+    });
+    status.textContent = (matches.length === 0 ?
+                          (query.length < KEY_LENGTH ? "Keep typing..." :
+                           "Nothing found.") :
+                          matches.length > LIMIT ?
+                          "Showing " + LIMIT + " of " + matches.length +
+                          " results." : "");
+  }
+
+  function search() {
+    var query = normalise(input.value.trim());
+    var key = query.slice(0, KEY_LENGTH);
+    if (!query) {
+      results.textContent = status.textContent = "";
+    } else if (shards.hasOwnProperty(key)) {
+      show(query, shards[key]);
+    } else {
+      fetch("search/" + key + ".json").then(function (response) {
+        return response.ok ? response.json() : [];
+      }, function () {
+        return [];
+      }).then(function (entries) {
+        shards[key] = entries;
+        // Only show the results if the query hasn't changed meanwhile.
+        if (normalise(input.value.trim()) === query) {
+          show(query, entries);
+        }
+      });
+    }
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    input = document.getElementById("search");
+    status = document.getElementById("status");
+    results = document.getElementById("results");
+    input.addEventListener("input", search);
+    input.form.addEventListener("submit", function (event) {
+      event.preventDefault();
+    });
+  });
+})();
+''' % (SEARCH_KEY_LENGTH, SEARCH_LIMIT))
+
+def indexpage(ssys_count, asset_count):
+    '''Get the main HTML page of the atlas.
+
+    Keyword arguments:
+        ssys_count, asset_count -- The number of star systems and assets
+            in the atlas.
+
+    '''
+    return INDEX_PAGE.render(ssys_count=ssys_count, asset_count=asset_count)
+
+def make_index(out, ssys_count=0, asset_count=0):
     '''Write the main HTML page to an output file.
 
     Keyword arguments:
         out -- A file or file-like object, already opened for writing.
+        ssys_count, asset_count -- As for indexpage().
 
     '''
-    # Start the HTML output.
-    print('''<!DOCTYPE html>
-<html lang="en">''', file=out)
-
-    # Set metadata.
-    print('<head>\n<title>Naev Atlas</title>\n</head>')
-
-def main(dbfile):
-    '''Generate an atlas of the Naev universe.'''
-    atlasdir = os.path.join(os.curdir, 'atlas')
-    ssysdir = os.path.join(atlasdir, 'ssys')
-    assetdir = os.path.join(atlasdir, 'assets')
-    # An OSError will be raised if the directory already exists, thus
-    # preventing us from overwriting anything.
-    os.mkdir(atlasdir)
-    os.mkdir(ssysdir)
-    os.mkdir(assetdir)
-
-    # Create the main page of the atlas.
-    with open(os.path.join(atlasdir, 'index.html'), 'w') as f:
-        make_index(f)
-
-    with db.connect(dbfile) as conn:
-        ssystems = naevdb.get_ssystems(conn)
+    out.write(indexpage(ssys_count, asset_count))
+
+def search_term(text):
+    '''Normalise text for searching, as the search script does.'''
+    return re.sub('[^a-z0-9]', '_', text.lower())
+
+def search_index(ssystems, assets):
+    '''Build the search index of the atlas.
+
+    The index is split into shards by the first few characters of each
+    search term (see SEARCH_KEY_LENGTH), so that the search script only
+    has to load a small part of it for any one search. It is built in a
+    single pass over the star systems and assets.
+
+    Keyword arguments:
+        ssystems -- The star systems in the atlas.
+        assets -- A sequence of 2-tuples, each holding an asset and the
+            names of the star systems where it is present.
+    Returns:
+        A mapping object pairing the key of each shard with a list of
+        its entries. Each entry is a list holding the normalised search
+        term, the name of what was found, a short description, and the
+        URL of its page relative to the main page.
+
+    '''
+    shards = defaultdict(list)
+    def add(term, name, what, page):
+        term = search_term(term)
+        shards[term[:SEARCH_KEY_LENGTH]].append([term, name, what, page])
+
+    for ssys in ssystems:
+        add(ssys.name, ssys.name, 'system', 'ssys/' + url(ssys.name) + '.html')
+
+    for asset, systems in assets:
+        page = 'assets/' + url(asset.name) + '.html'
+        add(asset.name, asset.name,
+            ('virtual asset' if asset.virtual else
+             'asset in ' + systems[0] if len(systems) == 1 else 'asset'),
+            page)
+        if asset.presence.faction:
+            add(asset.presence.faction, asset.name,
+                'held by ' + asset.presence.faction, page)
+        for commodity in sorted(asset.services.commodities or ()):
+            add(commodity, asset.name, 'trades in ' + commodity, page)
 
-    assets = {}
-    for assetfile in datafiles('Assets'):
-        # Parse each XML file into an Asset object.
-        asset = Asset(assetfile)
-        assets[asset.name] = (asset, [])
+    return shards
 
+def search_pages(shards):
+    '''Generate the files of the search index.
+
+    Keyword arguments:
+        shards -- The search index, as returned by search_index().
+    Returns:
+        An iterator of 3-tuples, each holding the path of a file within
+        the atlas, its content, and the data it was made from.
+
+    '''
+    yield 'search.js', SEARCH_SCRIPT, SEARCH_SCRIPT
+    for key, entries in sorted(shards.items()):
+        yield ('search/' + key + '.json',
+               json.dumps(entries, separators=(',', ':'), ensure_ascii=False),
+               entries)
+
+def ssys_pages(ssystems, map_index=None):
+    '''Generate the pages describing star systems.
+
+    Keyword arguments:
+        ssystems -- An iterable of the star systems to describe.
+        map_index -- As for ssyspage().
+    Returns:
+        An iterator of 2-tuples, each holding the path of a page within
+        the atlas and its HTML.
+
+    '''
     for ssys in ssystems:
-        for asset in ssys.assets:
-            assets[asset][1].append(ssys.name)
+        yield ('ssys/' + page_filename(ssys.name) + '.html',
+               ssyspage(ssys, map_index))
 
-        with open(os.path.join(ssysdir, ssys.name + '.html'), 'w') as f:
-            ssysdesc(ssys, f)
+def asset_pages(assets):
+    '''Generate the pages describing assets.
 
-    for assetname in assets:
-        asset, systems = assets[assetname]
-        with open(os.path.join(assetdir, assetname + '.html'), 'w') as f:
-            assetdesc(asset, systems, f)
+    Keyword arguments:
+        assets -- A sequence of 2-tuples, each holding an asset and the
+            names of the star systems where it is present (as for the
+            arguments to assetpage()).
+    Returns:
+        As for ssys_pages().
 
-if __name__ == '__main__':
-    # Get the name of the database file.
+    '''
+    for asset, systems in assets:
+        yield ('assets/' + page_filename(asset.name) + '.html',
+               assetpage(asset, systems))
+
+class DirectorySink:
+    '''Writes the atlas pages as files in a directory.
+
+    Instance attributes:
+        root -- The directory holding the atlas.
+        precompress -- Whether or not each page is accompanied by a
+            gzip-compressed copy, with .gz added to its name, for web
+            servers that can send such files as they are.
+        parallel -- Always true, since many processes can write files
+            to the directory at once.
+
+    '''
+    parallel = True
+
+    def __init__(self, root, precompress=False, exist_ok=False):
+        '''Prepare the directory for the atlas.
+
+        Keyword arguments:
+            root, precompress -- As the instance attributes.
+            exist_ok -- If false (the default), an OSError is raised if
+                the directory already exists, thus preventing us from
+                overwriting anything.
+
+        '''
+        self.root = root
+        self.precompress = precompress
+        if not exist_ok:
+            os.mkdir(root)
+        for subdir in ('ssys', 'assets', 'search'):
+            os.makedirs(os.path.join(root, subdir), exist_ok=exist_ok)
+
+    def _path(self, page):
+        '''Get the filename of a page.'''
+        return os.path.join(self.root, *page.split('/'))
+
+    def write(self, page, html):
+        '''Write a page of the atlas.'''
+        data = html.encode('utf-8')
+        with open(self._path(page), 'wb') as f:
+            f.write(data)
+        if self.precompress:
+            # Leave out the timestamp, so the same page always compresses
+            # to the same file.
+            with open(self._path(page) + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, mtime=0))
+        else:
+            # A compressed copy left by an earlier run would now be out of
+            # date, and a web server might still send it.
+            try:
+                os.remove(self._path(page) + '.gz')
+            except FileNotFoundError:
+                pass
+
+    def exists(self, page):
+        '''Check whether a page of the atlas has been written.'''
+        return (os.path.exists(self._path(page)) and
+                (not self.precompress or
+                 os.path.exists(self._path(page) + '.gz')))
+
+    def remove(self, page):
+        '''Remove a page of the atlas, if it exists.'''
+        for filename in (self._path(page), self._path(page) + '.gz'):
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+    def read_manifest(self):
+        '''Read the manifest of the atlas (see read_manifest()).'''
+        return read_manifest(self.root)
+
+    def write_manifest(self, pages):
+        '''Write the manifest of the atlas (see write_manifest()).'''
+        write_manifest(self.root, pages)
+
+    def close(self):
+        '''Finish writing the atlas.'''
+        pass
+
+class ZipSink:
+    '''Writes the atlas pages into a single zip archive.
+
+    The pages are compressed and added to the archive as they are
+    written, without any temporary files. An archive can only be written
+    from one process, and cannot be updated incrementally.
+
+    Instance attributes:
+        parallel -- Always false, since only one process can write to
+            the archive.
+
+    '''
+    parallel = False
+
+    def __init__(self, filename):
+        '''Create the archive.
+
+        Keyword arguments:
+            filename -- The name of the archive file. An OSError is
+                raised if it already exists.
+
+        '''
+        self.zip = zipfile.ZipFile(filename, 'x', zipfile.ZIP_DEFLATED)
+
+    def write(self, page, html):
+        '''Write a page of the atlas.'''
+        # Use a fixed timestamp, so the same atlas always gives the same
+        # archive.
+        info = zipfile.ZipInfo(page, date_time=(1980, 1, 1, 0, 0, 0))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self.zip.writestr(info, html.encode('utf-8'))
+
+    def exists(self, page):
+        '''Check whether a page of the atlas has been written.'''
+        return False
+
+    def read_manifest(self):
+        '''Read the manifest of the atlas; always empty.'''
+        return {}
+
+    def write_manifest(self, pages):
+        '''Write the manifest of the atlas (see write_manifest()).'''
+        self.write(MANIFEST, json.dumps({'format': PAGE_FORMAT,
+                                         'pages': pages},
+                                        indent=0, sort_keys=True,
+                                        ensure_ascii=False))
+
+    def close(self):
+        '''Finish writing the atlas.'''
+        self.zip.close()
+
+# Each process in a pool of workers has its own connection to the database,
+# and its own copy of the map index.
+_worker_conn = None
+_worker_index = None
+
+def _init_worker(dbfile, map_index):
+    '''Prepare a worker process for writing pages.'''
+    global _worker_conn, _worker_index
+    _worker_conn = naevdb.open_db(dbfile, in_memory=False, readonly=True)
+    _worker_index = map_index
+
+def _worker_pages(kind, items, sink):
+    '''Write or return pages from a worker process.
+
+    Keyword arguments:
+        kind -- Either 'ssys' or 'assets', for the pages to write.
+        items -- The names of the star systems, or the assets and their
+            systems, to be described.
+        sink -- Where to write the pages. If None, the pages are
+            returned instead, to be written by the main process.
+
+    '''
+    pages = (ssys_pages((naevdb.get_ssys(_worker_conn, name)
+                         for name in items), _worker_index)
+             if kind == 'ssys' else
+             asset_pages(items))
+    if sink is None:
+        return list(pages)
+    for page, html in pages:
+        sink.write(page, html)
+    return []
+
+def _chunks(seq, count):
+    '''Split a sequence into (roughly) equal consecutive chunks.'''
+    size = max(1, -(-len(seq) // count))
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+def read_manifest(atlasdir):
+    '''Read the manifest of an existing atlas.
+
+    The manifest records a hash of the content of each page in the atlas
+    (see main()), keyed by the page\'s path relative to the atlas
+    directory. If the manifest is missing, or was written for a
+    different page layout, an empty mapping is returned.
+
+    '''
+    try:
+        with open(os.path.join(atlasdir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if manifest.get('format') != PAGE_FORMAT:
+        return {}
+    return manifest['pages']
+
+def write_manifest(atlasdir, pages):
+    '''Write the manifest of an atlas.'''
+    filename = os.path.join(atlasdir, MANIFEST)
+    # Write the new manifest in full before replacing the old one.
+    with open(filename + '.new', 'w') as f:
+        json.dump({'format': PAGE_FORMAT, 'pages': pages}, f, indent=0,
+                  sort_keys=True, ensure_ascii=False)
+    os.replace(filename + '.new', filename)
+
+def main(dbfile, jobs=1, incremental=False, archive=None, precompress=False):
+    '''Generate an atlas of the Naev universe.
+
+    Alongside the pages, a manifest is written recording a hash of the
+    data that went into each page. In an incremental update, this is
+    compared with the current data, and only the pages whose data has
+    changed are written again. Pages for star systems or assets that
+    no longer exist are deleted.
+
+    Keyword arguments:
+        dbfile -- The database file to read the Naev data from.
+        jobs -- The number of processes to write pages with. The
+            default is 1, meaning that all pages are written by this
+            process. The output is the same either way.
+        incremental -- If true, update an existing atlas. If false (the
+            default), the atlas must not already exist.
+        archive -- If given, the name of a zip archive to write the
+            atlas into, instead of the atlas/ subdirectory. This cannot
+            be combined with an incremental update.
+        precompress -- If true, write a gzip-compressed copy of every
+            page alongside it (see DirectorySink). The default is false.
+            This only applies when writing to a directory.
+
+    '''
+    if archive is not None:
+        if incremental:
+            raise ValueError('an archive cannot be updated incrementally')
+        sink = ZipSink(archive)
+    else:
+        sink = DirectorySink(os.path.join(os.curdir, 'atlas'), precompress,
+                             exist_ok=incremental)
+    old_pages = sink.read_manifest() if incremental else {}
+
+    conn = naevdb.open_db(dbfile)
     try:
-        dbfile = sys.argv[1]
-    except IndexError:
-        # Default name.
-        dbfile = 'naev.db'
-    if not os.path.exists(dbfile):
-        raise IOError("database file '{}' does not exist".format(dbfile))
-
-    main(dbfile)
+        ssystems = naevdb.get_ssystems(conn)
+        all_assets = list(naevdb.get_assets(conn).values())
+    finally:
+        conn.close()
+
+    # Index the whole map once, for drawing the map on each system page.
+    map_index = MapIndex.from_ssystems(ssystems, MINIMAP_RADIUS)
+
+    # Hash the data behind each page, and find the pages that need writing.
+    pages = {}
+    def is_stale(page, data):
+        pages[page] = content_hash(data)
+        return old_pages.get(page) != pages[page] or not sink.exists(page)
+
+    stale = [ssys for ssys in ssystems
+             if is_stale('ssys/' + page_filename(ssys.name) + '.html',
+                         [ssys, ssys_neighbourhood(map_index, ssys.name)])]
+    assets = [(asset, systems) for asset, systems in all_assets
+              if is_stale('assets/' + page_filename(asset.name) + '.html',
+                          [asset, systems])]
+
+    # Create the main page of the atlas, and the search index it uses.
+    if is_stale('index.html', [len(ssystems), len(all_assets)]):
+        sink.write('index.html', indexpage(len(ssystems), len(all_assets)))
+    for page, content, data in search_pages(search_index(ssystems,
+                                                         all_assets)):
+        if is_stale(page, data):
+            sink.write(page, content)
+
+    if jobs <= 1:
+        # Everything needed is already loaded.
+        for page, html in chain(ssys_pages(stale, map_index),
+                                asset_pages(assets)):
+            sink.write(page, html)
+    else:
+        # Share the work out among a pool of processes. Several chunks per
+        # process even out the load if some chunks take longer than others.
+        # If the workers can't write the pages themselves, they send them
+        # back here to be written in order. Only the names of the systems
+        # are sent; each process reads the systems it needs itself.
+        names = [ssys.name for ssys in stale]
+        worker_sink = sink if sink.parallel else None
+        with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                 initargs=(dbfile, map_index)) as pool:
+            tasks = [pool.submit(_worker_pages, 'ssys', chunk, worker_sink)
+                     for chunk in _chunks(names, 4 * jobs)]
+            tasks.extend(pool.submit(_worker_pages, 'assets', chunk,
+                                     worker_sink)
+                         for chunk in _chunks(assets, 4 * jobs))
+            for task in tasks:
+                # This also raises any exception from the worker.
+                for page, html in task.result():
+                    sink.write(page, html)
+
+    # Remove the pages of anything that has disappeared since last time.
+    for page in old_pages:
+        if page not in pages:
+            sink.remove(page)
+
+    sink.write_manifest(pages)
+    sink.close()
+
+# Maximum number of rendered pages kept in memory by the atlas server.
+SERVER_CACHE_SIZE = 1024
+
+# Maximum number of open database connections held by the atlas server.
+SERVER_POOL_SIZE = 4
+
+# Content types of the files in the atlas, by extension.
+CONTENT_TYPES = {'.html': 'text/html; charset=utf-8',
+                 '.js': 'text/javascript; charset=utf-8',
+                 '.json': 'application/json'}
+
+class PageCache:
+    '''A bounded cache of rendered pages, shared between threads.
+
+    Pages are kept in order of use, and the least recently used page is
+    dropped whenever the cache grows past its maximum size.
+
+    Every page is rendered from a particular generation of database
+    connections (see ConnectionPool.generation), and only pages from
+    the generation the cache was last cleared for are kept.
+
+    Instance attributes:
+        maxsize -- The maximum number of pages held.
+
+    '''
+    def __init__(self, maxsize=SERVER_CACHE_SIZE):
+        '''Create an empty cache.
+
+        Keyword arguments:
+            maxsize -- As the instance attribute.
+
+        '''
+        self.maxsize = maxsize
+        self._pages = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, page):
+        '''Get a cached page, or None if it is not in the cache.
+
+        Returns:
+            A 2-tuple holding the encoded content of the page and its
+            entity tag.
+
+        '''
+        with self._lock:
+            try:
+                self._pages.move_to_end(page)
+            except KeyError:
+                return None
+            return self._pages[page]
+
+    def put(self, page, content, generation):
+        '''Add a rendered page to the cache.
+
+        Keyword arguments:
+            page -- The path of the page within the atlas.
+            content -- The encoded content of the page.
+            generation -- The generation it was rendered from. If the
+                cache has since been cleared for a later one, the page
+                is out of date, and is not kept.
+        Returns:
+            As for get().
+
+        '''
+        entry = content, '"{}"'.format(hashlib.sha1(content).hexdigest())
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            self._pages[page] = entry
+            self._pages.move_to_end(page)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+        return entry
+
+    def clear(self, generation):
+        '''Empty the cache, keeping only pages from a new generation.'''
+        with self._lock:
+            self._pages.clear()
+            self._generation = generation
+
+class ConnectionPool:
+    '''A pool of read-only database connections, shared between threads.
+
+    Connections are opened only as they are needed, up to a maximum
+    number; beyond that, threads wait for a connection to be returned.
+
+    Instance attributes:
+        dbfile -- The database file to connect to.
+        maxsize -- The maximum number of connections held open.
+        generation -- A count of the times the pool has been reset.
+            A connection borrowed after reading this was opened in
+            that generation or a later one.
+
+    '''
+    def __init__(self, dbfile, maxsize=SERVER_POOL_SIZE):
+        '''Create an empty pool.
+
+        Keyword arguments:
+            dbfile, maxsize -- As the instance attributes.
+
+        '''
+        self.dbfile = dbfile
+        self.maxsize = maxsize
+        # Idle connections, most recently used last, each with the
+        # generation of the pool it was opened in (see reset()).
+        self._idle = []
+        self._opened = 0
+        self.generation = 0
+        # Notified whenever a connection is returned or closed, so that
+        # a thread waiting on a full pool can take it or open another.
+        self._available = threading.Condition()
+
+    def _open(self, generation):
+        '''Open a new connection, already counted as open.'''
+        try:
+            return naevdb.open_db(self.dbfile, in_memory=False,
+                                  readonly=True, threadsafe=True)
+        except BaseException:
+            with self._available:
+                self._opened -= 1
+                self._available.notify()
+            raise
+
+    def _discard(self, conn):
+        '''Close a connection and take it out of the pool.'''
+        conn.close()
+        with self._available:
+            self._opened -= 1
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        '''Borrow a connection from the pool, for use in a with statement.'''
+        with self._available:
+            while not self._idle and self._opened >= self.maxsize:
+                self._available.wait()
+            if self._idle:
+                generation, conn = self._idle.pop()
+            else:
+                # Count the connection now, so that no other thread can
+                # open one past the maximum while this one is opening.
+                self._opened += 1
+                generation, conn = self.generation, None
+        if conn is None:
+            conn = self._open(generation)
+
+        try:
+            yield conn
+        finally:
+            with self._available:
+                current = generation == self.generation
+                if current:
+                    self._idle.append((generation, conn))
+                    self._available.notify()
+            if not current:
+                # The pool was reset while this connection was in use.
+                self._discard(conn)
+
+    def reset(self):
+        '''Close every connection, so that new ones will be opened.
+
+        Connections in use at the time are closed when they are returned.
+
+        '''
+        with self._available:
+            self.generation += 1
+            idle, self._idle = self._idle, []
+        for generation, conn in idle:
+            self._discard(conn)
+
+class AtlasServer(ThreadingHTTPServer):
+    '''A web server rendering the atlas from the database on demand.
+
+    Nothing is read from the database until a page is asked for, so the
+    server starts at once however large the universe is. Each page is
+    rendered using a connection from a shared pool, then cached so that
+    it need not be rendered again. If the database file changes, the
+    cache is emptied and the connections are reopened. Pages and
+    indexes are tagged with the generation of the connections they
+    were read from, so that any still being rendered from the old file
+    are not kept.
+
+    Instance attributes:
+        dbfile -- The database file to read the Naev data from.
+        cache -- The cache of rendered pages (see PageCache).
+        pool -- The database connections (see ConnectionPool).
+
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, dbfile, cache_size=SERVER_CACHE_SIZE,
+                 pool_size=SERVER_POOL_SIZE):
+        '''Create the server.
+
+        Keyword arguments:
+            address -- The host and port to listen on, as a 2-tuple.
+            dbfile -- As the instance attribute.
+            cache_size -- The maximum number of pages to cache.
+            pool_size -- The maximum number of database connections.
+
+        '''
+        super().__init__(address, AtlasRequestHandler)
+        self.dbfile = dbfile
+        self.cache = PageCache(cache_size)
+        self.pool = ConnectionPool(dbfile, pool_size)
+        self._db_stamp = self._stat_db()
+        self._db_lock = threading.Lock()
+        self._shards = self._map_index = None
+        self._shards_lock = threading.Lock()
+        self._map_lock = threading.Lock()
+
+    def _stat_db(self):
+        '''Get the modification time and size of the database file.
+
+        An OSError is raised if the file can't be found, as happens
+        while the database is being rebuilt.
+
+        '''
+        stat = os.stat(self.dbfile)
+        return stat.st_mtime_ns, stat.st_size
+
+    def check_db(self):
+        '''Forget everything read from the database if it has changed.'''
+        stamp = self._stat_db()
+        with self._db_lock:
+            if stamp == self._db_stamp:
+                return
+            self._db_stamp = stamp
+            # Reset the pool first, so that anything read from it under
+            # the new generation comes from the new file.
+            self.pool.reset()
+            self._shards = self._map_index = None
+            self.cache.clear(self.pool.generation)
+
+    def _search_shards(self, conn, generation):
+        '''Get the search index, building it if need be.
+
+        Unlike any other page, a shard of the index needs the whole
+        universe, so the index is only built once the search script
+        first asks for part of it, and then kept until the database
+        changes. One built from an older generation of connections than
+        the one given is built again.
+
+        '''
+        with self._shards_lock:
+            if self._shards is None or self._shards[0] < generation:
+                self._shards = generation, search_index(
+                    naevdb.get_ssystems(conn),
+                    naevdb.get_assets(conn).values())
+            return self._shards[1]
+
+    def _get_map_index(self, conn, generation):
+        '''Get the index of the map, building it if need be.
+
+        As with the search index, this covers the whole universe, but
+        it only needs the positions of systems and the jumps between
+        them, so it is quick to build.
+
+        '''
+        with self._map_lock:
+            if self._map_index is None or self._map_index[0] < generation:
+                self._map_index = generation, MapIndex(
+                    naevdb.get_ssys_positions(conn),
+                    ((origin, dest) for origin, dest, exit_only
+                     in naevdb.get_jump_pairs(conn)),
+                    MINIMAP_RADIUS)
+            return self._map_index[1]
+
+    def render(self, page, generation):
+        '''Render a page of the atlas.
+
+        Keyword arguments:
+            page -- The path of the page within the atlas.
+            generation -- The generation of the connection pool, read
+                before borrowing the connection to render it with.
+        Returns:
+            The content of the page as a string, or None if there is no
+            such page.
+
+        '''
+        if page == 'search.js':
+            return SEARCH_SCRIPT
+        folder, _, stem = page.rpartition('/')
+        stem, ext = os.path.splitext(stem)
+        name = unquote(stem)
+
+        with self.pool.connection() as conn:
+            if page == 'index.html':
+                cur = conn.cursor()
+                cur.execute('''SELECT
+                                 (SELECT COUNT(*) FROM SSystems)
+                               , (SELECT COUNT(*) FROM Assets)
+                               + (SELECT COUNT(*) FROM VirtualAssets)''')
+                return indexpage(*cur.fetchone())
+            elif folder == 'ssys' and ext == '.html':
+                if naevdb.get_ssys_id(conn, name) is None:
+                    return None
+                return ssyspage(naevdb.get_ssys(conn, name),
+                                self._get_map_index(conn, generation))
+            elif folder == 'assets' and ext == '.html':
+                found = naevdb.get_asset(conn, name)
+                return None if found is None else assetpage(*found)
+            elif folder == 'search' and ext == '.json':
+                entries = self._search_shards(conn, generation).get(name)
+                if entries is None:
+                    return None
+                return json.dumps(entries, separators=(',', ':'),
+                                  ensure_ascii=False)
+        return None
+
+    def get_page(self, page):
+        '''Get a page of the atlas, rendering it if it is not cached.
+
+        Returns:
+            As for PageCache.get(), or None if there is no such page.
+            An OSError is raised if the database file can't be read.
+
+        '''
+        self.check_db()
+        entry = self.cache.get(page)
+        if entry is None:
+            generation = self.pool.generation
+            content = self.render(page, generation)
+            if content is None:
+                return None
+            entry = self.cache.put(page, content.encode('utf-8'),
+                                   generation)
+        return entry
+
+class AtlasRequestHandler(BaseHTTPRequestHandler):
+    '''Handles requests to the atlas server (see AtlasServer).'''
+    def do_GET(self, send_body=True):
+        '''Send a page of the atlas.'''
+        page = unquote(urlsplit(self.path).path).lstrip('/') or 'index.html'
+        try:
+            entry = self.server.get_page(page)
+        except OSError:
+            # The database is missing, most likely while being rebuilt.
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE)
+            return
+        if entry is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        content, etag = entry
+
+        if etag in self.headers.get('If-None-Match', '').split(', '):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type',
+                         CONTENT_TYPES[os.path.splitext(page)[1]])
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        # Browsers may keep pages, but must check with us before reusing them.
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content)
+
+    def do_HEAD(self):
+        '''Send the headers for a page of the atlas.'''
+        self.do_GET(send_body=False)
+
+def serve(dbfile, host='localhost', port=8000, cache_size=SERVER_CACHE_SIZE,
+          pool_size=SERVER_POOL_SIZE):
+    '''Serve the atlas from a local web server until interrupted.
+
+    Keyword arguments:
+        dbfile -- The database file to read the Naev data from.
+        host, port -- The address to listen on. The default is port 8000
+            on this computer only.
+        cache_size, pool_size -- As for AtlasServer.
+
+    '''
+    with AtlasServer((host, port), dbfile, cache_size, pool_size) as server:
+        print('Serving the atlas at http://{}:{}/'.format(host, port),
+              file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+def _serve_main(args):
+    '''Serve the atlas from the command line.'''
+    parser = argparse.ArgumentParser(prog='atlas.py serve',
+                                     description='Serve an atlas of the Naev '
+                                     'universe from a local web server.')
+    parser.add_argument('dbfile', nargs='?', default='naev.db',
+                        help='the database to read (default: %(default)s)')
+    parser.add_argument('--host', default='localhost',
+                        help='the address to listen on '
+                        '(default: %(default)s)')
+    parser.add_argument('--port', '-p', type=int, default=8000,
+                        help='the port to listen on (default: %(default)s)')
+    parser.add_argument('--cache', type=int, default=SERVER_CACHE_SIZE,
+                        help='the number of rendered pages to keep in memory '
+                        '(default: %(default)s)')
+    args = parser.parse_args(args)
+
+    if not os.path.exists(args.dbfile):
+        raise IOError("database file '{}' does not exist".format(args.dbfile))
+
+    serve(args.dbfile, args.host, args.port, args.cache)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        _serve_main(sys.argv[2:])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description='Generate an atlas of the '
+                                     'Naev universe.')
+    parser.add_argument('dbfile', nargs='?', default='naev.db',
+                        help='the database to read (default: %(default)s)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='the number of processes to write pages with '
+                        '(default: %(default)s)')
+    parser.add_argument('--incremental', '-i', action='store_true',
+                        help='update an existing atlas, rewriting only the '
+                        'pages that have changed')
+    parser.add_argument('--zip', metavar='ARCHIVE', dest='archive',
+                        help='write the atlas into a zip archive instead of '
+                        'the atlas/ directory')
+    parser.add_argument('--gzip', action='store_true', dest='precompress',
+                        help='write a gzip-compressed copy of every page '
+                        'alongside it')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dbfile):
+        raise IOError("database file '{}' does not exist".format(args.dbfile))
+
+    main(args.dbfile, args.jobs, args.incremental, args.archive,
+         args.precompress)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+'''Time jumpmap.mapdata() on synthetic universes of different sizes.
+
+The mapdata() from before jumps were given integer keys is kept here as
+old_mapdata(), taking the same arguments, so that the two can be timed
+side by side on the same map. Both are checked to give the same jumps.
+The universes come from synthverse.jump_graph(), with and without one
+very busy hub system (the case that made the old code quadratic). With
+the default five jumps per system, the 20000-system universe has 100000
+jumps.
+
+Run it from anywhere; the results are printed to standard output.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+# Local imports.
+from jumpmap import mapdata
+from naevdata import Coords
+from synthverse import jump_graph
+
+def old_mapdata(positions, jumps):
+    '''Extract mappable data the old way, with lists of jumps.
+
+    Each two-way jump is found by looking for its origin in the list of
+    jumps out of its destination, and then removed from that list, so
+    a system with n jumps costs O(n ** 2). Arguments and return value
+    are as for jumpmap.mapdata(), except that a jump to an unknown
+    system raises a KeyError.
+
+    '''
+    syslocs = {}
+    jumps_by_name = {}
+    new_jumps = []
+    jumps_oneway = []
+    xmin = xmax = ymin = ymax = 0
+
+    for name, (x, y) in positions.items():
+        syslocs[name] = Coords(x, y)
+        jumps_by_name[name] = []
+        xmin = min(xmin, x)
+        xmax = max(xmax, x)
+        ymin = min(ymin, y)
+        ymax = max(ymax, y)
+    for origin, dest, exit_only in jumps:
+        if not exit_only:
+            jumps_by_name[origin].append(dest)
+
+    for origin in jumps_by_name:
+        for dest in jumps_by_name[origin]:
+            if dest in jumps_by_name and origin in jumps_by_name[dest]:
+                new_jumps.append((syslocs[origin], syslocs[dest]))
+                jumps_by_name[dest].remove(origin)
+            else:
+                jumps_oneway.append((syslocs[origin], syslocs[dest]))
+
+    return ((xmin, xmax, ymin, ymax), syslocs, new_jumps, jumps_oneway)
+
+def same_jumps(old, new):
+    '''Check that two results of mapdata() hold the same jumps.'''
+    def ends(jumps, ordered):
+        ends = ([start.coords, end.coords] for start, end in jumps)
+        return sorted(tuple(pair if ordered else sorted(pair))
+                      for pair in ends)
+    return (ends(old[2], False) == ends(new[2], False) and
+            ends(old[3], True) == ends(new[3], True))
+
+def best_time(func, repeat):
+    '''Time a function, returning its result and its best time.'''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main(args):
+    '''Run the benchmark from the command line.'''
+    parser = argparse.ArgumentParser(description='Time the old and new '
+                                     'jumpmap.mapdata() on synthetic '
+                                     'universes.')
+    parser.add_argument('sizes', type=int, nargs='*',
+                        default=[5000, 10000, 20000, 40000],
+                        metavar='SYSTEMS', help='the number of star systems '
+                        'in each universe (default: 5000 10000 20000 40000)')
+    parser.add_argument('--degree', type=int, default=5,
+                        help='the average number of jumps out of each '
+                        'system (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='take the best of this many runs (default: '
+                        '%(default)s)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='the random seed (default: %(default)s)')
+    args = parser.parse_args(args)
+
+    print('{:>8} {:>8} {:>4} {:>9} {:>9}'.format('systems', 'jumps', 'hub',
+                                                 'old (s)', 'new (s)'))
+    for count in args.sizes:
+        for hub in (False, True):
+            positions, jumps = jump_graph(count, args.degree, hub, args.seed)
+            old, old_time = best_time(lambda: old_mapdata(positions, jumps),
+                                      args.repeat)
+            new, new_time = best_time(lambda: mapdata(positions, jumps),
+                                      args.repeat)
+            if not same_jumps(old, new):
+                raise ValueError('old and new mapdata() disagree for '
+                                 '{} systems'.format(count))
+            print('{:>8} {:>8} {:>4} {:>9.3f} {:>9.3f}'.format(
+                count, len(jumps), 'yes' if hub else 'no', old_time,
+                new_time))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
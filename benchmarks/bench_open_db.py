@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+'''Time reading the Naev database with and without naevdb.open_db().
+
+A synthetic universe is written out by synthverse.write_datafiles() and
+compiled with naevdb.build_db(), and a second copy of the database is
+made without any indexes, like the files made before open_db() was
+added. Each is then read the way the atlas reads it: the star systems
+and assets as a whole, and then each system in turn with its
+presences, as its worker processes and server do. This is timed with a
+plain connection, as the tools used to open it, and with open_db(). A
+whole atlas run is timed last, for comparison.
+
+Run it from anywhere; the results are printed to standard output.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+import os
+import shutil
+import sqlite3 as db
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+# Local imports.
+import atlas
+import naevdb
+from synthverse import write_datafiles
+
+def plain_connection(filename):
+    '''Open a database the way the tools did before open_db().'''
+    conn = db.connect(filename, detect_types=db.PARSE_DECLTYPES)
+    conn.row_factory = db.Row
+    return conn
+
+def drop_indexes(filename):
+    '''Remove all the indexes from a database file.'''
+    conn = db.connect(filename)
+    try:
+        cur = conn.cursor()
+        cur.execute('''SELECT name FROM sqlite_master
+                       WHERE type = 'index' AND sql IS NOT NULL''')
+        for (name,) in cur.fetchall():
+            cur.execute('DROP INDEX "{}"'.format(name))
+        conn.commit()
+    finally:
+        conn.close()
+
+def read_all(opener, filename):
+    '''Open a database and read everything the atlas needs from it.'''
+    conn = opener(filename)
+    try:
+        ssystems = naevdb.get_ssystems(conn)
+        naevdb.get_assets(conn)
+        for ssys in ssystems:
+            naevdb.get_ssys(conn, ssys.name)
+            naevdb.get_ssys_presence(conn, ssys.name)
+    finally:
+        conn.close()
+
+def best_time(func, repeat):
+    '''Time a function, returning its best time.'''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(args):
+    '''Run the benchmark from the command line.'''
+    parser = argparse.ArgumentParser(description='Time reading a synthetic '
+                                     'Naev database with and without '
+                                     'naevdb.open_db().')
+    parser.add_argument('--systems', '-n', type=int, default=2000,
+                        help='the number of star systems (default: '
+                        '%(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='take the best of this many runs (default: '
+                        '%(default)s)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='the random seed (default: %(default)s)')
+    args = parser.parse_args(args)
+
+    workdir = tempfile.mkdtemp()
+    olddir = os.getcwd()
+    try:
+        # build_db() reads the data files from the current directory.
+        os.chdir(workdir)
+        write_datafiles(workdir, args.systems, args.seed)
+        naevdb.build_db('naev.db')
+        shutil.copyfile('naev.db', 'noindex.db')
+        drop_indexes('noindex.db')
+
+        print('{} star systems; best of {} runs'.format(args.systems,
+                                                        args.repeat))
+        for label, opener, filename in (
+                ('file without indexes, plain connection', plain_connection,
+                 'noindex.db'),
+                ('file without indexes, open_db()', naevdb.open_db,
+                 'noindex.db'),
+                ('file with indexes, plain connection', plain_connection,
+                 'naev.db'),
+                ('file with indexes, open_db()', naevdb.open_db, 'naev.db')):
+            elapsed = best_time(lambda: read_all(opener, filename),
+                                args.repeat)
+            print('  {:<40} {:8.3f} s'.format(label, elapsed))
+
+        def whole_atlas():
+            shutil.rmtree('atlas', ignore_errors=True)
+            atlas.main('naev.db')
+        elapsed = best_time(whole_atlas, args.repeat)
+        print('  {:<40} {:8.3f} s'.format('whole atlas.main() run', elapsed))
+    finally:
+        os.chdir(olddir)
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+'''Time how many atlas pages can be made per second.
+
+The pages are made from a synthetic universe, written out by
+synthverse.write_datafiles() and compiled with naevdb.build_db(). The
+current templates (atlas.ssyspage() and atlas.assetpage()) are timed
+against the print()-based functions they replaced, which are kept here
+as old_ssysdesc() and old_assetdesc(). Each is timed building pages in
+memory and writing them to files.
+
+The old pages hold less than the new ones: they have no map, no links
+from assets to their systems, and nothing in them is escaped. The new
+system pages are therefore also timed without their map, which is the
+closest match to the old ones.
+
+Run it from anywhere; the results are printed to standard output.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+# Local imports.
+from atlas import (MINIMAP_RADIUS, DirectorySink, assetpage, scale_term,
+                   ssyspage)
+from jumpmap import MapIndex
+import naevdb
+from synthverse import write_datafiles
+
+def old_ssysdesc(ssys, out):
+    '''Write a system page the old way, with a print() per fragment.'''
+    print('''<!DOCTYPE html>
+<html lang="en">''', file=out)
+    print('''<head>
+<title>{0.name} system - Naev Atlas</title>
+</head>'''.format(ssys), file=out)
+    print('''<body>
+<h1>{0.name}</h1>
+<h2>Key data</h2>
+  <dl>
+    <dt>Coordinates</dt> <dd>({0.pos.x}, {0.pos.y})</dd>
+    <dt>Interference</dt> <dd>{0.interference} ({1})</dd>
+    <dt>Radius</dt> <dd>{0.radius} ({2})</dd>
+    <dt>Nebula</dt> <dd>Density {0.nebula.density} ({3}),
+                        volatility {0.nebula.volatility} ({4})</dd>
+    <dt>Stars</dt> <dd>{0.stars} ({5})</dd>
+  </dl>'''.format(ssys, scale_term(ssys.interference, 'interference'),
+                  scale_term(ssys.radius, 'radius'),
+                  scale_term(ssys.nebula.density, 'density'),
+                  scale_term(ssys.interference, 'volatility'),
+                  scale_term(ssys.stars, 'stars')),
+          file=out)
+
+    print('<h2>Assets</h2>', file=out)
+    print('  <ul>', file=out)
+    for asset in sorted(ssys.assets):
+        print('    <li><a href="../assets/{0}.html">'
+              '{0}</a></li>'.format(asset), file=out)
+    print('  </ul>', file=out)
+
+    print('<h2>Jumps</h2>', file=out)
+    print('  <ul>', file=out)
+    for jumpname, jump in sorted(ssys.jumps.items()):
+        print('    <li><a href="{0}.html">{0}</a>'.format(jumpname),
+              file=out)
+        if jump.x is not None:
+            print('        @ ({0.x}, {0.y})'.format(jump), file=out)
+        if jump.autopos:
+            print('        (auto-positioned)', file=out)
+        if jump.exit_only:
+            print('        (exit-only)', file=out)
+        print('    </li>', file=out)
+    print('  </ul>', file=out)
+
+    print('</body>\n</html>', file=out)
+
+def old_assetdesc(asset, systems, out):
+    '''Write an asset page the old way, with a print() per fragment.'''
+    print('''<!DOCTYPE html>
+<html lang="en">''', file=out)
+    print('<head>\n<title>{0.name} - Naev Atlas</title>\n'
+          '</head>'.format(asset), file=out)
+
+    print('<body>', file=out)
+    print('<hgroup>\n<h1>{0.name}</h1>'.format(asset), file=out)
+    print('<h2>(' + ('None' if len(systems) == 0 else
+                     'Common' if len(systems) > 1 else
+                     '<a href="../ssys/{0}.html">{0}</a>'.format(systems[0])) +
+          ')</h2>\n</hgroup>', file=out)
+
+    if asset.description:
+        print('<p>{0.description}</p>'.format(asset), file=out)
+    if asset.virtual:
+        print('<p>Virtual asset.</p>', file=out)
+    for purpose, image in asset.gfx.items():
+        print('<p>{} image: {}</p>'.format(purpose.title(), image), file=out)
+
+    print('''<h2>Key data</h2>
+  <dl>
+    <dt>Coordinates</dt> <dd>({0.pos.x}, {0.pos.y})</dd>
+    <dt>Faction</dt> <dd>{0.presence.faction}
+                         ({0.presence.value}, range {0.presence.range})</dd>
+    <dt>Class</dt> <dd>{0.world_class}</dd>
+    <dt>Population</dt> <dd>{0.population}</dd>
+    <dt>Hide value</dt> <dd>{0.hide}</dd>
+  </dl>'''.format(asset), file=out)
+
+    print('''<h2>Services</h2>
+  <dl>
+    <dt>Landing rights</dt> <dd>{0.land}</dd>
+    <dt>Spaceport bar</dt> <dd>{0.bar}</dd>
+    <dt>Commodities</dt> <dd>{1}</dd>
+    <dt>Refueling</dt> <dd>{0.refuel}</dd>
+    <dt>Missions</dt> <dd>{0.missions}</dd>
+    <dt>Shipyard</dt> <dd>{0.shipyard}</dd>
+    <dt>Outfits</dt> <dd>{0.outfits}</dd>
+  </dl>'''.format(asset.services,
+                  'None' if asset.services.commodities is None else
+                  ', '.join(sorted(asset.services.commodities))), file=out)
+
+    print('</body>\n</html>', file=out)
+
+def old_pages(describe, items, outdir):
+    '''Make pages the old way, in memory or (with outdir) to files.'''
+    for i, item in enumerate(items):
+        if outdir is None:
+            describe(item, io.StringIO())
+        else:
+            with open(os.path.join(outdir, '{}.html'.format(i)),
+                      'w') as out:
+                describe(item, out)
+
+def new_pages(render, items, outdir):
+    '''Make pages from templates, in memory or (with outdir) to files.'''
+    sink = None if outdir is None else DirectorySink(outdir, exist_ok=True)
+    for i, item in enumerate(items):
+        html = render(item)
+        if sink is not None:
+            sink.write('{}.html'.format(i), html)
+
+def pages_per_second(make, describe, items, outdir, repeat):
+    '''Time making a set of pages, taking the best of several runs.'''
+    best = None
+    for _ in range(repeat):
+        if outdir is not None:
+            shutil.rmtree(outdir, ignore_errors=True)
+            os.mkdir(outdir)
+        start = time.perf_counter()
+        make(describe, items, outdir)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+def main(args):
+    '''Run the benchmark from the command line.'''
+    parser = argparse.ArgumentParser(description='Time making atlas pages '
+                                     'with the old print() calls and the '
+                                     'new templates.')
+    parser.add_argument('--systems', '-n', type=int, default=2000,
+                        help='the number of star systems (default: '
+                        '%(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='take the best of this many runs (default: '
+                        '%(default)s)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='the random seed (default: %(default)s)')
+    args = parser.parse_args(args)
+
+    workdir = tempfile.mkdtemp()
+    olddir = os.getcwd()
+    try:
+        # build_db() reads the data files from the current directory.
+        os.chdir(workdir)
+        write_datafiles(workdir, args.systems, args.seed)
+        naevdb.build_db('naev.db')
+        conn = naevdb.open_db('naev.db')
+        try:
+            ssystems = naevdb.get_ssystems(conn)
+            assets = list(naevdb.get_assets(conn).values())
+        finally:
+            conn.close()
+        map_index = MapIndex.from_ssystems(ssystems, MINIMAP_RADIUS)
+
+        cases = (
+            ('systems, old', old_pages, old_ssysdesc, ssystems),
+            ('systems, new without map', new_pages, ssyspage, ssystems),
+            ('systems, new with map', new_pages,
+             lambda ssys: ssyspage(ssys, map_index), ssystems),
+            ('assets, old', old_pages,
+             lambda item, out: old_assetdesc(item[0], item[1], out),
+             assets),
+            ('assets, new', new_pages, lambda item: assetpage(*item),
+             assets))
+
+        print('{} star systems, {} assets; pages per second, best of {} '
+              'runs'.format(len(ssystems), len(assets), args.repeat))
+        print('  {:<26} {:>10} {:>10}'.format('', 'in memory', 'to files'))
+        outdir = os.path.join(workdir, 'pages')
+        for label, make, describe, items in cases:
+            print('  {:<26} {:>10.0f} {:>10.0f}'.format(
+                label,
+                pages_per_second(make, describe, items, None, args.repeat),
+                pages_per_second(make, describe, items, outdir,
+                                 args.repeat)))
+    finally:
+        os.chdir(olddir)
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
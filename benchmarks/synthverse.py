@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+'''Make up synthetic Naev universes for benchmarking.
+
+The real universe is too small to show how the tools scale, so this
+module invents bigger ones. It can write them out as data files, laid
+out like the dat/ directory of the Naev source tree, for building a
+database with naevdb.py; or return just the map, for benchmarking the
+map code without going through any files.
+
+The same arguments always give the same universe.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+import os
+import random
+import sys
+from xml.sax.saxutils import escape, quoteattr
+
+FACTIONS = ('Empire', 'Dvaered', 'Sirius', 'Pirate')
+SERVICES = ('refuel', 'missions', 'outfits', 'shipyard', 'commodity')
+
+# How far from the centre of the map systems are placed.
+MAP_RADIUS = 1000.0
+
+# The proportion of jumps that only go one way.
+ONE_WAY = 0.05
+
+def ssys_name(i):
+    '''Get the name of the ith star system.'''
+    return 'Sys{}'.format(i)
+
+def jump_graph(count, degree=5, hub=False, seed=1):
+    '''Make up the map of a universe.
+
+    Keyword arguments:
+        count -- The number of star systems.
+        degree -- The average number of jumps out of each system. The
+            whole map has about count * degree jumps.
+        hub -- If true, one system in four jumps is to or from one hub
+            system, as with the busiest systems of the real map but far
+            more so. The default is false.
+        seed -- The random seed. The default is 1.
+    Returns:
+        A 2-tuple containing:
+        * a mapping object pairing the name of each star system with
+          its coordinates, as a 2-tuple, in no particular order
+        * a list of 3-tuples, one for each jump, holding the names of
+          the origin and destination systems and whether the jump is
+          exit-only, also in no particular order
+
+    '''
+    rng = random.Random(seed)
+    names = [ssys_name(i) for i in range(count)]
+    rng.shuffle(names)
+    positions = dict((name, (rng.uniform(-MAP_RADIUS, MAP_RADIUS),
+                             rng.uniform(-MAP_RADIUS, MAP_RADIUS)))
+                     for name in names)
+
+    jumps = []
+    linked = set()
+    hub = rng.choice(names) if hub else None
+    while len(jumps) < count * degree:
+        origin = (hub if hub is not None and rng.random() < 0.25 else
+                  rng.choice(names))
+        dest = rng.choice(names)
+        # A system has at most one jump to any other.
+        if origin == dest or (origin, dest) in linked:
+            continue
+        linked.update(((origin, dest), (dest, origin)))
+        jumps.append((origin, dest, False))
+        # Most jumps can be taken both ways. The rest have an exit-only
+        # end, as in the real data files.
+        jumps.append((dest, origin, rng.random() < ONE_WAY))
+    rng.shuffle(jumps)
+    return positions, jumps
+
+def _asset_xml(name, rng):
+    '''Make up the data file of an asset.'''
+    services = ''.join('<{}/>'.format(service) for service in SERVICES
+                       if rng.random() < 0.5)
+    if rng.random() < 0.8:
+        services = '<land/>' + services
+    return '''<?xml version="1.0"?>
+<asset name={name}>
+ <pos><x>{x:f}</x><y>{y:f}</y></pos>
+ <GFX><space>{gfx}.png</space><exterior>{gfx}.png</exterior></GFX>
+ <presence>
+  <faction>{faction}</faction><value>{value:f}</value><range>{range}</range>
+ </presence>
+ <general>
+  <class>{world_class}</class><population>{population}</population>
+  <hide>{hide:f}</hide><services>{services}</services>
+  <commodities><commodity>Food</commodity><commodity>Ore</commodity>
+  </commodities>
+  <description>The world of {text}.</description><bar>A bar.</bar>
+ </general>
+ <tech><item>Basic</item></tech>
+</asset>
+'''.format(name=quoteattr(name), text=escape(name),
+           x=rng.uniform(-5000, 5000), y=rng.uniform(-5000, 5000),
+           gfx=rng.choice(('rock', 'ice', 'station')),
+           faction=rng.choice(FACTIONS), value=rng.uniform(0, 200),
+           range=rng.randrange(3), world_class=rng.choice('MKLO0'),
+           population=rng.randrange(10 ** 6), hide=rng.uniform(0, 2),
+           services=services)
+
+def _vasset_xml(name, faction):
+    '''Make up the data file of a virtual asset.'''
+    return '''<?xml version="1.0"?>
+<asset name={}>
+ <virtual/>
+ <presence><faction>{}</faction><value>50</value><range>1</range></presence>
+</asset>
+'''.format(quoteattr(name), faction)
+
+def _ssys_xml(name, pos, assets, jumps, rng):
+    '''Make up the data file of a star system.'''
+    jump_xml = []
+    for dest, exit_only in jumps:
+        if rng.random() < 0.5:
+            where = '<autopos/>'
+        else:
+            where = '<pos x="{:f}" y="{:f}"/>'.format(
+                rng.uniform(-9000, 9000), rng.uniform(-9000, 9000))
+        jump_xml.append('  <jump target={}>{}<hide>{:f}</hide>{}</jump>\n'
+                        .format(quoteattr(dest), where,
+                                rng.choice((0.5, 1.25, 2.0)),
+                                '<exitonly/>' if exit_only else ''))
+    return '''<?xml version="1.0"?>
+<ssys name={name}>
+ <general>
+  <radius>{radius:f}</radius><stars>{stars}</stars>
+  <interference>{interference:f}</interference>
+  <nebula volatility="{volatility:f}">{density:f}</nebula>
+ </general>
+ <pos><x>{x:f}</x><y>{y:f}</y></pos>
+ <assets>{assets}</assets>
+ <jumps>
+{jumps} </jumps>
+</ssys>
+'''.format(name=quoteattr(name), x=pos[0], y=pos[1],
+           radius=rng.uniform(3000, 30000), stars=rng.randrange(800),
+           interference=rng.choice((0, 0, 200, 600)),
+           volatility=rng.choice((0, 0, 80)),
+           density=rng.choice((0, 0, 300)),
+           assets=''.join('<asset>{}</asset>'.format(escape(asset))
+                          for asset in assets),
+           jumps=''.join(jump_xml))
+
+def write_datafiles(naevroot, count, seed=1):
+    '''Write out the data files of a made-up universe.
+
+    Each system has up to two assets, and three virtual assets are
+    spread over a few systems each. Each system has jumps to about four
+    others.
+
+    Keyword arguments:
+        naevroot -- The directory to write the files under, as dat/ssys/
+            and dat/assets/. It is created if need be.
+        count -- The number of star systems.
+        seed -- The random seed. The default is 1.
+
+    '''
+    rng = random.Random(seed)
+    positions, jumps = jump_graph(count, degree=4, seed=seed)
+    ssys_jumps = dict((name, {}) for name in positions)
+    for origin, dest, exit_only in jumps:
+        ssys_jumps[origin][dest] = exit_only
+
+    ssysdir = os.path.join(naevroot, 'dat', 'ssys')
+    assetdir = os.path.join(naevroot, 'dat', 'assets')
+    os.makedirs(ssysdir, exist_ok=True)
+    os.makedirs(assetdir, exist_ok=True)
+
+    ssys_assets = dict((name, []) for name in positions)
+    for i in range(count):
+        for j in range(rng.randrange(3)):
+            name = 'Planet {}-{}'.format(i, j)
+            ssys_assets[ssys_name(i)].append(name)
+            with open(os.path.join(assetdir, name + '.xml'), 'w') as f:
+                f.write(_asset_xml(name, rng))
+    for i, faction in enumerate(FACTIONS[:3]):
+        name = 'Virtual{}'.format(i)
+        for ssys in rng.sample(sorted(positions), min(count, 5)):
+            ssys_assets[ssys].append(name)
+        with open(os.path.join(assetdir, name + '.xml'), 'w') as f:
+            f.write(_vasset_xml(name, faction))
+
+    for name in sorted(positions):
+        with open(os.path.join(ssysdir, name + '.xml'), 'w') as f:
+            f.write(_ssys_xml(name, positions[name], ssys_assets[name],
+                              sorted(ssys_jumps[name].items()), rng))
+
+def main(args):
+    '''Write out a made-up universe from the command line.'''
+    parser = argparse.ArgumentParser(description='Write the data files of '
+                                     'a synthetic Naev universe.')
+    parser.add_argument('naevroot', help='the directory to write the data '
+                        'files under (in dat/)')
+    parser.add_argument('--systems', '-n', type=int, default=2000,
+                        help='the number of star systems (default: '
+                        '%(default)s)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='the random seed (default: %(default)s)')
+    args = parser.parse_args(args)
+
+    if os.path.exists(os.path.join(args.naevroot, 'dat')):
+        parser.error("'{}' already holds data "
+                     "files".format(args.naevroot))
+    write_datafiles(args.naevroot, args.systems, args.seed)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
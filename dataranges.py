@@ -3,9 +3,13 @@
 '''Data range checker for Naev.
 
 Run this script from the root directory of your Naev source tree. It
-reads the XML files in dat/ssys/ and gives details of the ranges of
-values for certain key statistics. Example usage:
+reads the XML files in dat/ssys/ and dat/assets/ and gives details of
+the ranges of values for certain key statistics. With the --db option,
+it reads a database made by naevdb.py instead, and can also draw
+histograms and break the statistics down by faction, nebula or world
+class. Example usage:
     user@home:~/naev/$ dataranges
+    user@home:~/anywhere/$ dataranges --db naev.db --group-by faction
 
 '''
 
@@ -25,20 +29,520 @@ values for certain key statistics. Example usage:
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # Standard library imports.
+import argparse
+from bisect import bisect_right, insort
+from collections import namedtuple
 import math
+from operator import attrgetter
+import sys
 
 # Local imports.
 from dataloader import datafiles
-from naevdata import SSystem
+from naevdata import Asset, SSystem
+import naevdb
 
-def stats(iterable):
-    '''Find the mean and standard deviation of a data set.'''
-    mean = sum(iterable) / len(iterable)
-    sq_dists = list((i - mean) ** 2 for i in iterable)
-    variance = sum(sq_dists) / len(sq_dists)
-    std_dev = math.sqrt(variance)
+# The percentiles estimated for every statistic.
+PERCENTILES = (0.5, 0.9)
 
-    return mean, std_dev
+# How many values a percentile estimate keeps exactly, before it starts
+# estimating.
+EXACT_QUANTILE_LIMIT = 100
+
+def _population(asset):
+    '''Get the population of an asset, or None if it is virtual.'''
+    return None if asset.virtual else asset.population
+
+def _hide(asset):
+    '''Get how hidden an asset is, or None if it is virtual.'''
+    return None if asset.virtual else asset.hide
+
+def _presence(asset):
+    '''Get the faction presence at an asset, or None if there is none.'''
+    return None if asset.presence.faction is None else asset.presence.value
+
+# The statistics to gather. Each is a 6-tuple of: the data files it is
+# taken from (as for dataloader.datafiles()); its name; a function that
+# gets its value from one star system or asset, or None where it doesn't
+# apply; the column of the statistics table holding it in a database (see
+# DB_TABLES); and how to describe where its highest and lowest values are
+# found, or None to leave that out.
+METRICS = (('SSystems', 'Radius', attrgetter('radius'), 'Radius',
+            'The largest system radius ({}) is found in {}.',
+            'The smallest system radius ({}) is found in {}.'),
+           ('SSystems', 'Nebula density', attrgetter('nebula.density'),
+            'NebulaDensity',
+            'The densest nebula ({}) is in {}.', None),
+           ('SSystems', 'Nebula volatility', attrgetter('nebula.volatility'),
+            'NebulaVolatility',
+            'The nebula is at its most volatile ({}) in {}.', None),
+           ('SSystems', 'Interference', attrgetter('interference'),
+            'Interference',
+            'Interference is at its peak ({}) in {}.', None),
+           ('SSystems', 'Stars', attrgetter('stars'), 'Stars',
+            'The most starry skies ({}) are found in {}.',
+            'The least starry skies ({}) are found in {}.'),
+           ('Assets', 'Population', _population, 'Population',
+            'The most populous world ({}) is {}.',
+            'The least populous world ({}) is {}.'),
+           ('Assets', 'Hide', _hide, 'Hide',
+            'The best hidden asset ({}) is {}.',
+            'The most conspicuous asset ({}) is {}.'),
+           ('Assets', 'Faction presence', _presence, 'Presence',
+            'The strongest faction presence ({}) is at {}.', None))
+
+# The class of object read from each kind of data file.
+DATA_CLASSES = {'SSystems': SSystem, 'Assets': Asset}
+
+class Quantile:
+    '''An estimate of one quantile of a stream of values.
+
+    This is the P-squared algorithm of Jain and Chlamtac (1985). Instead
+    of keeping every value, it keeps just five markers: the minimum, the
+    maximum, the quantile wanted, and two points halfway to it on
+    either side. As each value arrives, the markers are moved along a
+    parabola fitted through their neighbours, so that they stay near
+    where they should be. The estimate takes constant memory and time
+    per value, and is usually within a few percent of the true value.
+
+    Five markers are too few for a good estimate from only a few
+    values, though, so the first EXACT_QUANTILE_LIMIT values are kept,
+    giving the exact quantile; the markers are then set from them.
+
+    Instance attributes:
+        p -- The quantile to estimate, between 0 and 1 (e.g. 0.5 for
+            the median).
+        count -- The number of values seen.
+
+    '''
+    def __init__(self, p):
+        '''Start estimating a quantile.
+
+        Keyword arguments:
+            p -- As the instance attribute.
+
+        '''
+        self.p = p
+        self.count = 0
+        self._values = []
+        self._steps = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _start(self):
+        '''Set the markers from the values kept so far.'''
+        last = len(self._values) - 1
+        self._desired = [1 + last * step for step in self._steps]
+        ranks = [round(last * step) for step in self._steps]
+        # No two markers may share a place.
+        for i in (1, 2, 3):
+            ranks[i] = min(max(ranks[i], ranks[i - 1] + 1), last - 4 + i)
+        self._heights = [self._values[rank] for rank in ranks]
+        self._positions = [rank + 1 for rank in ranks]
+        self._values = None
+
+    def add(self, value):
+        '''Take another value into account.'''
+        self.count += 1
+        if self._values is not None:
+            # Keep the first few values in order.
+            insort(self._values, value)
+            if self.count == EXACT_QUANTILE_LIMIT:
+                self._start()
+            return
+        heights = self._heights
+
+        # Find the markers the value falls between, moving the end markers
+        # out if it falls beyond them.
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = bisect_right(heights, value) - 1
+
+        positions = self._positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._steps[i]
+
+        # Move the middle markers one place towards where they should be,
+        # if they have fallen behind or got ahead.
+        for i in (1, 2, 3):
+            offset = self._desired[i] - positions[i]
+            if ((offset >= 1 and positions[i + 1] - positions[i] > 1) or
+                (offset <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = (heights[i] + step *
+                              (heights[i + step] - heights[i]) /
+                              (positions[i + step] - positions[i]))
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        '''Get the new height of a marker moved along a parabola.'''
+        heights, positions = self._heights, self._positions
+        below = positions[i] - positions[i - 1]
+        above = positions[i + 1] - positions[i]
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (below + step) * (heights[i + 1] - heights[i]) / above +
+            (above - step) * (heights[i] - heights[i - 1]) / below)
+
+    @property
+    def value(self):
+        '''The estimated quantile, or None if there are no values yet.'''
+        values = self._values
+        if self.count == 0:
+            return None
+        elif values is not None:
+            # Interpolate between the values themselves.
+            rank = self.p * (self.count - 1)
+            low = math.floor(rank)
+            high = min(low + 1, self.count - 1)
+            return values[low] + (rank - low) * (values[high] - values[low])
+        else:
+            return self._heights[2]
+
+class Statistic:
+    '''Summary statistics of a stream of values.
+
+    Every figure is updated as each value arrives, and the values are
+    not kept, so a statistic takes the same small amount of memory
+    however many values there are. The mean and standard deviation are
+    found with Welford's method, which (unlike summing the values and
+    their squares) doesn't lose precision when the deviation is small
+    compared to the mean.
+
+    Instance attributes:
+        name -- The name of the statistic.
+        count -- The number of values seen.
+        mean -- The mean of the values (0 if there are none).
+        highest, lowest -- The highest and lowest values seen, or None
+            if there are none.
+        highest_at, lowest_at -- Lists of the names of the items having
+            the highest and lowest values, in the order seen.
+        quantiles -- A list of estimates of quantiles of the values
+            (see Quantile), one for each of PERCENTILES.
+
+    Class attributes:
+        estimated -- True, since the percentiles are estimates.
+
+    '''
+    estimated = True
+
+    def __init__(self, name):
+        '''Start a new statistic.
+
+        Keyword arguments:
+            name -- As the instance attribute.
+
+        '''
+        self.name = name
+        self.count = 0
+        self.mean = 0.0
+        self._sq_dists = 0.0
+        self.highest = self.lowest = None
+        self.highest_at, self.lowest_at = [], []
+        self.quantiles = [Quantile(p) for p in PERCENTILES]
+
+    def add(self, name, value):
+        '''Take another value into account.
+
+        Keyword arguments:
+            name -- The name of the item having this value.
+            value -- The value.
+
+        '''
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._sq_dists += delta * (value - self.mean)
+
+        if self.highest is None or value > self.highest:
+            self.highest, self.highest_at = value, [name]
+        elif value == self.highest:
+            self.highest_at.append(name)
+        if self.lowest is None or value < self.lowest:
+            self.lowest, self.lowest_at = value, [name]
+        elif value == self.lowest:
+            self.lowest_at.append(name)
+
+        for quantile in self.quantiles:
+            quantile.add(value)
+
+    @property
+    def std_dev(self):
+        '''The (population) standard deviation of the values.'''
+        return (math.sqrt(self._sq_dists / self.count) if self.count
+                else 0.0)
+
+    @property
+    def percentiles(self):
+        '''The percentiles, as a list of 2-tuples of quantile and value.'''
+        return [(quantile.p, quantile.value) for quantile in self.quantiles]
+
+def read_data(dataset, naevroot=None):
+    '''Read data files one at a time.
+
+    Keyword arguments:
+        dataset -- The kind of data files to read, as for
+            dataloader.datafiles().
+        naevroot -- The root of the Naev source tree. If omitted, the
+            current directory is used.
+    Returns:
+        A generator of star systems or assets (instances of
+        naevdata.SSystem or naevdata.Asset).
+
+    '''
+    cls = DATA_CLASSES[dataset]
+    for filename in datafiles(dataset, naevroot):
+        yield cls(filename)
+
+def gather(metrics=METRICS, naevroot=None):
+    '''Gather statistics from the data files, in one pass over each kind.
+
+    Keyword arguments:
+        metrics -- The statistics to gather, as for METRICS.
+        naevroot -- As for read_data().
+    Returns:
+        A list of the statistics gathered (instances of Statistic), in
+        the same order as the metrics.
+
+    '''
+    results = [Statistic(metric[1]) for metric in metrics]
+    datasets = []
+    for metric in metrics:
+        if metric[0] not in datasets:
+            datasets.append(metric[0])
+
+    for dataset in datasets:
+        wanted = [(metric[2], stat) for metric, stat
+                  in zip(metrics, results) if metric[0] == dataset]
+        for item in read_data(dataset, naevroot):
+            for getter, stat in wanted:
+                value = getter(item)
+                if value is not None:
+                    stat.add(item.name, value)
+    return results
+
+# The tables of statistics built from a database, for each kind of data,
+# and the queries that fill them. Each has a Name column, a column for each
+# statistic (as named in METRICS), and columns to group the items by (see
+# DB_GROUPS). A system's faction is the one with the most presence there.
+DB_TABLES = {
+    'SSystems': ('SSysStats',
+                 '''SELECT
+                      s.SSysName AS Name
+                    , s.SSysRadius AS Radius
+                    , s.SSysNebulaDensity AS NebulaDensity
+                    , s.SSysNebulaVolatility AS NebulaVolatility
+                    , s.SSysInterference AS Interference
+                    , s.SSysStars AS Stars
+                    , d.Faction AS Faction
+                    , CASE WHEN s.SSysNebulaDensity > 0 THEN 'nebula'
+                        ELSE 'clear' END AS Nebula
+                    FROM
+                      SSystems s LEFT JOIN
+                      (SELECT
+                         SSysID
+                       , Faction
+                       , ROW_NUMBER() OVER (
+                           PARTITION BY SSysID
+                           ORDER BY SUM(Value) DESC, Faction) AS Rank
+                       FROM ({})
+                       GROUP BY SSysID, Faction
+                       HAVING SUM(Value) > 0) d
+                        ON d.SSysID = s.SSysID AND d.Rank = 1
+                    ORDER BY s.SSysID'''.format(naevdb.PRESENCE_ROWS)),
+    'Assets': ('AssetStats',
+               '''SELECT
+                    a.AssetName AS Name
+                  , a.AssetPopulation AS Population
+                  , a.AssetHide AS Hide
+                  , CASE WHEN a.AssetFaction IS NULL THEN NULL
+                      ELSE a.AssetPresence END AS Presence
+                  , a.AssetFaction AS Faction
+                  , CASE WHEN s.SSysNebulaDensity > 0 THEN 'nebula'
+                      ELSE 'clear' END AS Nebula
+                  , a.AssetClass AS Class
+                  FROM
+                    Assets a JOIN
+                    SSystems s ON s.SSysID = a.SSysID
+                  UNION ALL
+                  SELECT
+                    VAssetName, NULL, NULL, VAssetPresence, VAssetFaction
+                  , NULL, NULL
+                  FROM VirtualAssets''')}
+
+# The ways that statistics from a database can be broken down, and the
+# kinds of data that each applies to. Each is a 2-tuple of the column of
+# the statistics table to group by, and the kinds of data that have it.
+DB_GROUPS = {'faction': ('Faction', ('SSystems', 'Assets')),
+             'nebula': ('Nebula', ('SSystems', 'Assets')),
+             'class': ('Class', ('Assets',))}
+
+# Statistics found from a database. These have the same attributes as a
+# Statistic, but the percentiles are exact.
+Summary = namedtuple('Summary', 'name count mean std_dev highest highest_at '
+                     'lowest lowest_at percentiles estimated')
+
+# The longest bar drawn in a histogram.
+HISTOGRAM_WIDTH = 40
+
+def _db_table(conn, dataset):
+    '''Get the name of the statistics table, building it if need be.
+
+    The table is a temporary one, so it lasts only as long as the
+    connection (even a read-only one), but every statistic can then be
+    found from it without going back to the original tables.
+
+    '''
+    table, query = DB_TABLES[dataset]
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS {} AS {}'.format(table,
+                                                                    query))
+    return table
+
+def db_statistic(conn, metric):
+    '''Find one statistic from a database.
+
+    Keyword arguments:
+        conn -- An open database connection (see naevdb.open_db()).
+        metric -- The statistic to find, as one of METRICS.
+    Returns:
+        The statistic, as a Summary.
+
+    '''
+    dataset, name, getter, column, high, low = metric
+    table = _db_table(conn, dataset)
+    cur = conn.cursor()
+    values = '''(SELECT Name, {0} AS Value FROM {1}
+                 WHERE {0} IS NOT NULL)'''.format(column, table)
+
+    cur.execute('''SELECT COUNT(*), AVG(Value), MAX(Value), MIN(Value)
+                   FROM {}'''.format(values))
+    count, mean, highest, lowest = cur.fetchone()
+    if count == 0:
+        return Summary(name, 0, 0.0, 0.0, None, [], None, [],
+                       [(p, None) for p in PERCENTILES], False)
+
+    # Work out the variance from the mean, rather than from the sum of
+    # squares, so as not to lose precision.
+    cur.execute('SELECT AVG((Value - ?) * (Value - ?)) FROM {}'.format(values),
+                (mean, mean))
+    std_dev = math.sqrt(cur.fetchone()[0])
+
+    places = []
+    for extreme in (highest, lowest):
+        cur.execute('SELECT Name FROM {} WHERE Value = ?'.format(values),
+                    (extreme,))
+        places.append([row[0] for row in cur])
+
+    percentiles = []
+    for p in PERCENTILES:
+        # Interpolate between the values either side of the percentile.
+        rank = p * (count - 1)
+        cur.execute('''SELECT Value FROM {}
+                       ORDER BY Value LIMIT 2 OFFSET ?'''.format(values),
+                    (math.floor(rank),))
+        nearest = [row[0] for row in cur]
+        low_value = nearest[0]
+        high_value = nearest[-1]
+        fraction = rank - math.floor(rank)
+        percentiles.append((p, low_value + fraction *
+                            (high_value - low_value)))
+
+    return Summary(name, count, mean, std_dev, highest, places[0],
+                   lowest, places[1], percentiles, False)
+
+def db_gather(conn, metrics=METRICS):
+    '''Find statistics from a database.
+
+    Keyword arguments:
+        conn -- An open database connection (see naevdb.open_db()).
+        metrics -- The statistics to find, as for METRICS.
+    Returns:
+        A list of the statistics (as Summary objects), in the same order
+        as the metrics.
+
+    '''
+    return [db_statistic(conn, metric) for metric in metrics]
+
+def db_histogram(conn, metric, bins=10):
+    '''Count the values of a statistic in a database, in equal ranges.
+
+    Keyword arguments:
+        conn -- An open database connection (see naevdb.open_db()).
+        metric -- The statistic, as one of METRICS.
+        bins -- The number of ranges to split the values into.
+    Returns:
+        A list of 3-tuples, each holding the lower and upper bounds of a
+        range, and the number of values in it. Each range includes its
+        lower bound, and the last also includes its upper bound. If all
+        values are the same, there is just one range.
+
+    '''
+    dataset, name, getter, column, high, low = metric
+    table = _db_table(conn, dataset)
+    cur = conn.cursor()
+    cur.execute('SELECT MIN({0}), MAX({0}) FROM {1}'.format(column, table))
+    lowest, highest = cur.fetchone()
+    if lowest is None:
+        return []
+    elif lowest == highest:
+        cur.execute('SELECT COUNT({0}) FROM {1}'.format(column, table))
+        return [(lowest, highest, cur.fetchone()[0])]
+
+    width = (highest - lowest) / bins
+    counts = [0] * bins
+    cur.execute('''SELECT
+                     MIN(CAST(({0} - ?) / ? AS INTEGER), ?) AS Bin
+                   , COUNT(*)
+                   FROM {1}
+                   WHERE {0} IS NOT NULL
+                   GROUP BY Bin'''.format(column, table),
+                (lowest, width, bins - 1))
+    for bin_, count in cur:
+        counts[bin_] = count
+    return [(lowest + i * width, lowest + (i + 1) * width, count)
+            for i, count in enumerate(counts)]
+
+def db_groups(conn, metric, group):
+    '''Break down a statistic in a database by some grouping.
+
+    Keyword arguments:
+        conn -- An open database connection (see naevdb.open_db()).
+        metric -- The statistic, as one of METRICS.
+        group -- How to group the items, as one of the keys of
+            DB_GROUPS.
+    Returns:
+        A list of 6-tuples, one for each group in order, each holding
+        the group (None for items not in any), and the count, mean,
+        standard deviation, lowest and highest of its values; or None,
+        if the grouping doesn't apply to this statistic.
+
+    '''
+    dataset, name, getter, column, high, low = metric
+    group_column, datasets = DB_GROUPS[group]
+    if dataset not in datasets:
+        return None
+    table = _db_table(conn, dataset)
+    cur = conn.cursor()
+    cur.execute('''SELECT
+                     v.Grp, COUNT(*), AVG(v.Value)
+                   , AVG((v.Value - m.Mean) * (v.Value - m.Mean))
+                   , MIN(v.Value), MAX(v.Value)
+                   FROM
+                     (SELECT {0} AS Grp, {1} AS Value FROM {2}
+                      WHERE {1} IS NOT NULL) v JOIN
+                     (SELECT {0} AS Grp, AVG({1}) AS Mean FROM {2}
+                      WHERE {1} IS NOT NULL
+                      GROUP BY {0}) m ON m.Grp IS v.Grp
+                   GROUP BY v.Grp
+                   ORDER BY v.Grp'''.format(group_column, column, table))
+    return [(row[0], row[1], row[2], math.sqrt(row[3]), row[4], row[5])
+            for row in cur]
 
 def liststr(items):
     '''Format a list with commas and 'and'.'''
@@ -48,91 +552,110 @@ def liststr(items):
         return (', '.join(str(item) for item in items[:-1]) +
                 ' and ' + str(items[-1]))
 
-def main():
-    ssystems = []
-    for ssysfile in datafiles('SSystems'):
-        # Parse each XML file into a SSystem object.
-        ssystems.append(SSystem(ssysfile))
-
-    neb_densest_at, neb_density, neb_densities = [], 0.0, []
-    neb_worst_at, neb_volatility, neb_volatilities = [], 0.0, []
-    int_worst_at, interference, interferences = [], 0.0, []
-
-    largest_system, hi_radius, radii = [], 0.0, []
-    smallest_system, lo_radius = [], float('Inf')
-
-    most_stars_at, most_stars, stars = [], 0, []
-    least_stars_at, least_stars = [], float('Inf')
-
-    for ssys in ssystems:
-        neb_densities.append(ssys.nebula.density)
-        if ssys.nebula.density > neb_density:
-            neb_densest_at, neb_density = [ssys.name], ssys.nebula.density
-        elif ssys.nebula.density == neb_density:
-            neb_densest_at.append(ssys.name)
-        # ...else this isn't a candidate for the densest nebula.
-
-        neb_volatilities.append(ssys.nebula.volatility)
-        if ssys.nebula.volatility > neb_volatility:
-            neb_worst_at, neb_volatility = [ssys.name], ssys.nebula.volatility
-        elif ssys.nebula.volatility == neb_volatility:
-            neb_worst_at.append(ssys.name)
-        # ...else this isn't a candidate for the most dangerous nebula.
-
-        interferences.append(ssys.interference)
-        if ssys.interference > interference:
-            int_worst_at, interference = [ssys.name], ssys.interference
-        elif ssys.interference == interference:
-            int_worst_at.append(ssys.name)
-        # ...else this isn't a candidate for the highest interference.
-
-        radii.append(ssys.radius)
-        if ssys.radius > hi_radius:
-            largest_system, hi_radius = [ssys.name], ssys.radius
-        elif ssys.radius == hi_radius:
-            largest_system.append(ssys.name)
-        # ...else this isn't a candidate for the largest system.
-        if ssys.radius < lo_radius:
-            smallest_system, lo_radius = [ssys.name], ssys.radius
-        elif ssys.radius == lo_radius:
-            smallest_system.append(ssys.name)
-        # ...else this isn't a candidate for the smallest system.
-
-        stars.append(ssys.stars)
-        if ssys.stars > most_stars:
-            most_stars_at, most_stars = [ssys.name], ssys.stars
-        elif ssys.stars == most_stars:
-            most_stars_at.append(ssys.name)
-        # ...else this isn't a candidate for the starriest system.
-        if ssys.stars < least_stars:
-            least_stars_at, least_stars = [ssys.name], ssys.stars
-        elif ssys.stars == least_stars:
-            least_stars_at.append(ssys.name)
-        # ...else this isn't a candidate for the least starry system.
-
-    print('Radius: μ={}, σ={}'.format(*stats(radii)))
-    print('The largest system radius',
-          '({}) is found in {}.'.format(hi_radius, liststr(largest_system)))
-    print('The smallest system radius',
-          '({}) is found in {}.'.format(lo_radius, liststr(smallest_system)))
-    print()
-    print('Nebula density: μ={}, σ={}'.format(*stats(neb_densities)))
-    print('The densest nebula ({}) is in {}.'.format(neb_density,
-                                                     liststr(neb_densest_at)))
-    print()
-    print('Nebula volatility: μ={}, σ={}'.format(*stats(neb_volatilities)))
-    print('The nebula is at its most volatile',
-          '({}) in {}.'.format(neb_volatility, liststr(neb_worst_at)))
-    print()
-    print('Interference: μ={}, σ={}'.format(*stats(interferences)))
-    print('Interference is at its peak',
-          '({}) in {}.'.format(interference, liststr(int_worst_at)))
-    print()
-    print('Stars: μ={}, σ={}'.format(*stats(stars)))
-    print('The most starry skies',
-          '({}) are found in {}.'.format(most_stars, liststr(most_stars_at)))
-    print('The least starry skies',
-          '({}) are found in {}.'.format(least_stars, liststr(least_stars_at)))
+def report(metrics, results):
+    '''Print out the statistics gathered.
+
+    Keyword arguments:
+        metrics -- The statistics gathered, as for METRICS.
+        results -- The statistics, as returned by gather() or
+            db_gather().
+
+    '''
+    for (dataset, name, getter, column, high, low), stat in zip(metrics,
+                                                                results):
+        if stat.count == 0:
+            print('{}: no data'.format(name))
+            print()
+            continue
+        print('{}: μ={}, σ={}'.format(name, stat.mean, stat.std_dev))
+        print('Percentiles{}: {}'.format(
+            ' (estimated)' if stat.estimated else '',
+            ', '.join('{:g}%={}'.format(100 * p, value)
+                      for p, value in stat.percentiles)))
+        if high is not None:
+            print(high.format(stat.highest, liststr(stat.highest_at)))
+        if low is not None:
+            print(low.format(stat.lowest, liststr(stat.lowest_at)))
+        print()
+
+def report_histograms(metrics, histograms):
+    '''Print out histograms of statistics.
+
+    Keyword arguments:
+        metrics -- The statistics, as for METRICS.
+        histograms -- The histograms, as returned by db_histogram().
+
+    '''
+    for metric, histogram in zip(metrics, histograms):
+        print('{} histogram:'.format(metric[1]))
+        most = max((count for low, high, count in histogram), default=0)
+        for low, high, count in histogram:
+            bar = '#' * math.ceil(HISTOGRAM_WIDTH * count / most)
+            print('  {:>12g} to {:<12g} {:>7} {}'.format(low, high, count,
+                                                         bar))
+        print()
+
+def report_groups(metrics, group, breakdowns):
+    '''Print out breakdowns of statistics by some grouping.
+
+    Keyword arguments:
+        metrics -- The statistics, as for METRICS.
+        group -- The grouping, as one of the keys of DB_GROUPS.
+        breakdowns -- The breakdowns, as returned by db_groups().
+
+    '''
+    for metric, breakdown in zip(metrics, breakdowns):
+        if breakdown is None:
+            continue
+        print('{} by {}:'.format(metric[1], group))
+        for name, count, mean, std_dev, lowest, highest in breakdown:
+            print('  {}: n={}, μ={:g}, σ={:g}, range {:g} to {:g}'.format(
+                '(none)' if name is None else name, count, mean, std_dev,
+                lowest, highest))
+        print()
+
+def main(args):
+    '''Report on the ranges of values from the command line.
+
+    Unless a database is given with the --db option, the data files are
+    assumed to be in ./dat/, relative to the current path, so this
+    should be run from the root of the Naev source directory.
+
+    '''
+    parser = argparse.ArgumentParser(description='Get statistics on the '
+                                     'ranges of values in the Naev data.')
+    parser.add_argument('--db', metavar='FILE',
+                        help='find the statistics from this database (made '
+                        'by naevdb.py), instead of from the data files')
+    parser.add_argument('--histogram', type=int, metavar='BINS',
+                        help='also show a histogram of each statistic, with '
+                        'this many bars (needs --db)')
+    parser.add_argument('--group-by', choices=sorted(DB_GROUPS),
+                        help='also break down each statistic by this '
+                        '(needs --db)')
+    args = parser.parse_args(args)
+    if args.db is None and (args.histogram or args.group_by):
+        parser.error('--histogram and --group-by need a database (--db)')
+    if args.histogram is not None and args.histogram < 1:
+        parser.error('a histogram needs at least one bar')
+
+    if args.db is None:
+        report(METRICS, gather(METRICS))
+        return
+
+    conn = naevdb.open_db(args.db, in_memory=False, readonly=True)
+    try:
+        report(METRICS, db_gather(conn, METRICS))
+        if args.histogram:
+            report_histograms(METRICS, [db_histogram(conn, metric,
+                                                     args.histogram)
+                                        for metric in METRICS])
+        if args.group_by:
+            report_groups(METRICS, args.group_by,
+                          [db_groups(conn, metric, args.group_by)
+                           for metric in METRICS])
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1:])
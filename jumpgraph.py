@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+
+'''Routes through the Naev universe.
+
+This module treats the star systems and the jumps between them as a
+directed graph, for working out how travellers can get from one system
+to another. A jump can be taken from its origin to its destination
+unless it is exit-only; some jumps therefore only go one way, and can
+lead into regions of the map that can never be left again.
+
+Run as a script, it checks the map for such trap regions, and for
+systems that can't be reached at all. Given a cache directory, it keeps
+the results there by the content of the map, so checking an unchanged
+map again is cheap.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+from collections import deque, namedtuple
+import hashlib
+import json
+import os
+import sys
+import textwrap
+
+# Local imports.
+from dataloader import datafiles
+from naevdata import SSystem
+
+class JumpGraph:
+    '''The star systems, and the jumps that travellers can take.
+
+    Systems are numbered in the order given, and the jumps are held as
+    lists of system numbers, so that searches over the graph don't
+    have to hash names at every step.
+
+    Instance attributes:
+        names -- A list of the system names, in order of number.
+        index -- A mapping object pairing each system name with its
+            number.
+        successors -- A list holding, for each system, a list of the
+            numbers of the systems that can be reached from it in one
+            jump.
+        predecessors -- As above, but for the systems from which it can
+            be reached in one jump.
+
+    '''
+    def __init__(self, names, jumps):
+        '''Build the graph.
+
+        Keyword arguments:
+            names -- An iterable of the names of the star systems.
+            jumps -- An iterable of 3-tuples, each holding the names of
+                the origin and destination systems of a jump, and
+                whether it is exit-only (as from ssystem_graph() in
+                jumpmap.py, or naevdb.get_jump_pairs()). Exit-only
+                jumps, jumps involving unknown systems, and duplicates
+                are left out.
+
+        '''
+        self.names = list(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.successors = [[] for name in self.names]
+        self.predecessors = [[] for name in self.names]
+        seen = set()
+        for origin, dest, exit_only in jumps:
+            if exit_only:
+                continue
+            try:
+                edge = self.index[origin], self.index[dest]
+            except KeyError:
+                continue
+            if edge not in seen:
+                seen.add(edge)
+                self.successors[edge[0]].append(edge[1])
+                self.predecessors[edge[1]].append(edge[0])
+        # Searches then visit systems in the same order, whatever order
+        # the jumps came in.
+        for numbers in self.successors + self.predecessors:
+            numbers.sort()
+
+    def edges(self):
+        '''Iterate over the jumps that can be taken, by system number.
+
+        Returns:
+            An iterator of 2-tuples, each holding the numbers of the
+            origin and destination systems of a jump.
+
+        '''
+        for i, successors in enumerate(self.successors):
+            for j in successors:
+                yield i, j
+
+    def components(self):
+        '''Split the graph into its strongly connected components.
+
+        Within a component, every system can be reached from every
+        other. This is Tarjan's algorithm, with an explicit stack in
+        place of recursion, so that long chains of systems can't
+        overflow the Python call stack.
+
+        Returns:
+            A list of the components, each a list of system numbers.
+            The components come in reverse topological order: every
+            jump from one component to another leads to a component
+            earlier in the list.
+
+        '''
+        successors = self.successors
+        order = [None] * len(self.names)
+        lowlink = [0] * len(self.names)
+        on_stack = [False] * len(self.names)
+        stack = []
+        components = []
+        count = 0
+        for root in range(len(self.names)):
+            if order[root] is not None:
+                continue
+            order[root] = lowlink[root] = count
+            count += 1
+            stack.append(root)
+            on_stack[root] = True
+            # Each entry is a system being searched, and an iterator over
+            # the jumps from it that have yet to be followed.
+            work = [(root, iter(successors[root]))]
+            while work:
+                i, jumps = work[-1]
+                for j in jumps:
+                    if order[j] is None:
+                        # Search from j next, then come back to i.
+                        order[j] = lowlink[j] = count
+                        count += 1
+                        stack.append(j)
+                        on_stack[j] = True
+                        work.append((j, iter(successors[j])))
+                        break
+                    elif on_stack[j] and order[j] < lowlink[i]:
+                        lowlink[i] = order[j]
+                else:
+                    # Every jump from i has been followed.
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        if lowlink[i] < lowlink[parent]:
+                            lowlink[parent] = lowlink[i]
+                    if lowlink[i] == order[i]:
+                        # i is the first system found in its component,
+                        # which is everything above it on the stack.
+                        component = []
+                        while True:
+                            j = stack.pop()
+                            on_stack[j] = False
+                            component.append(j)
+                            if j == i:
+                                break
+                        components.append(component)
+        return components
+
+    def condensation(self):
+        '''Reduce the graph to the jumps between its components.
+
+        Returns:
+            A 2-tuple. The first item is a list of the strongly
+            connected components (see components()), each a sorted list
+            of system names, in topological order: every jump from one
+            component to another leads to a component later in the
+            list. The second is a sorted list of 2-tuples, each holding
+            the positions in that list of two components that are joined
+            by at least one jump. Together, these form a directed
+            acyclic graph.
+
+        '''
+        components = self.components()
+        components.reverse()
+        belongs = [None] * len(self.names)
+        for c, component in enumerate(components):
+            for i in component:
+                belongs[i] = c
+        edges = set((belongs[i], belongs[j]) for i, j in self.edges()
+                    if belongs[i] != belongs[j])
+        names = self.names
+        return ([sorted(names[i] for i in component)
+                 for component in components], sorted(edges))
+
+    def nearest(self, targets):
+        '''Find the nearest target from every system, in jumps.
+
+        This is a breadth-first search backwards along the jumps,
+        starting from all of the targets at once, so each system is
+        visited only once however many targets there are: it takes
+        time proportional to the size of the universe, where searching
+        from each system in turn would take time proportional to its
+        square.
+
+        Keyword arguments:
+            targets -- A mapping object pairing the names of the systems
+                to look for with a value to report for each (such as the
+                asset found there). Where two targets are equally near,
+                the one listed first in this mapping is reported.
+        Returns:
+            A mapping object pairing the name of each system from which
+            a target can be reached with a 2-tuple of the number of
+            jumps to the nearest target, and the value for that target.
+
+        '''
+        found = {}
+        queue = deque()
+        for name, value in targets.items():
+            i = self.index.get(name)
+            if i is not None and i not in found:
+                found[i] = (0, value)
+                queue.append(i)
+
+        predecessors = self.predecessors
+        while queue:
+            i = queue.popleft()
+            distance, value = found[i]
+            step = (distance + 1, value)
+            for j in predecessors[i]:
+                if j not in found:
+                    found[j] = step
+                    queue.append(j)
+
+        names = self.names
+        return dict((names[i], result) for i, result in found.items())
+
+# The results of analysing the map. The components are the strongly
+# connected components, and the edges the jumps between them, as given by
+# JumpGraph.condensation(). The traps are the positions in that list of the
+# components that can be entered from elsewhere, but have no way out.
+Analysis = namedtuple('Analysis', 'components edges traps')
+
+# The version of the format of cached analyses.
+CACHE_FORMAT = 1
+
+# The most system names listed at once in a report.
+LIST_LIMIT = 20
+
+def analyse(graph):
+    '''Analyse the connections between the parts of the map.
+
+    Keyword arguments:
+        graph -- The map to analyse, as a JumpGraph.
+    Returns:
+        The results, as an Analysis.
+
+    '''
+    components, edges = graph.condensation()
+    entries = set(dest for origin, dest in edges)
+    exits = set(origin for origin, dest in edges)
+    return Analysis(components, edges, sorted(entries - exits))
+
+def fingerprint(names, jumps):
+    '''Get a hash identifying the systems and jumps of a map.
+
+    The systems and jumps are hashed in the order given, which saves
+    sorting them; the data files and the database each give them in the
+    same order every time, so the same map read the same way gives the
+    same hash. This is much quicker to work out than
+    naevdata.content_hash(), which would take longer than the analysis
+    it is meant to save.
+
+    Keyword arguments:
+        names, jumps -- The map, as for JumpGraph().
+    Returns:
+        The hash, as a string of hexadecimal digits.
+
+    '''
+    digest = hashlib.sha1('\0'.join(names).encode('utf-8'))
+    digest.update(repr(list(jumps)).encode('utf-8'))
+    return digest.hexdigest()
+
+def cached_analysis(names, jumps, cachedir):
+    '''Analyse a map, or get the results of analysing it before.
+
+    The results are kept in a JSON file in the cache directory, named
+    for the fingerprint of the map (see fingerprint()). If they are
+    there, the map is not even built.
+
+    Keyword arguments:
+        names, jumps -- The map, as for JumpGraph().
+        cachedir -- The directory to keep the results in. It is created
+            if need be.
+    Returns:
+        The results, as an Analysis.
+
+    '''
+    names = list(names)
+    jumps = list(jumps)
+    filename = os.path.join(cachedir, fingerprint(names, jumps) + '.json')
+    try:
+        with open(filename, encoding='utf-8') as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        cached = {}
+    if cached.get('format') == CACHE_FORMAT:
+        return Analysis(cached['components'],
+                        [tuple(edge) for edge in cached['edges']],
+                        cached['traps'])
+
+    analysis = analyse(JumpGraph(sorted(names), jumps))
+    os.makedirs(cachedir, exist_ok=True)
+    # Write the new file in full before putting it in place.
+    with open(filename + '.new', 'w', encoding='utf-8') as f:
+        json.dump({'format': CACHE_FORMAT, 'components': analysis.components,
+                   'edges': analysis.edges, 'traps': analysis.traps}, f,
+                  separators=(',', ':'), ensure_ascii=False)
+    os.replace(filename + '.new', filename)
+    return analysis
+
+def main_component(analysis):
+    '''Find the largest component of the map.
+
+    Returns:
+        The position of the largest component in the analysis, or the
+        first of them if more than one is the largest.
+
+    '''
+    return max(range(len(analysis.components)),
+               key=lambda c: (len(analysis.components[c]), -c))
+
+def reachable(analysis, start):
+    '''Find the components of the map that can be reached from one.
+
+    Since the components are in topological order, every jump into a
+    component comes from one earlier in the list, so one pass over the
+    (sorted) edges is enough.
+
+    Keyword arguments:
+        analysis -- The results of analysing the map, as an Analysis.
+        start -- The position of the component to start from.
+    Returns:
+        A set of the positions of the components that can be reached,
+        including the starting one.
+
+    '''
+    reached = set([start])
+    for origin, dest in analysis.edges:
+        if origin in reached:
+            reached.add(dest)
+    return reached
+
+def _component_name(analysis, c):
+    '''Name a component after its first system.'''
+    component = analysis.components[c]
+    if len(component) == 1:
+        return component[0]
+    return '{} (and {} more)'.format(component[0], len(component) - 1)
+
+def _namelist(names, limit=LIST_LIMIT):
+    '''List system names, indented and wrapped, up to a limit.'''
+    text = ', '.join(names[:limit])
+    if len(names) > limit:
+        text += ' and {} more'.format(len(names) - limit)
+    return textwrap.fill(text, initial_indent='  ', subsequent_indent='  ')
+
+def report(analysis, origin=None, file=sys.stdout):
+    '''Print out the results of analysing the map.
+
+    Keyword arguments:
+        analysis -- The results, as an Analysis.
+        origin -- The name of the system to find the unreachable systems
+            from. If omitted, the first system of the largest component
+            is used.
+        file -- The file to print to. The default is standard output.
+
+    '''
+    components = analysis.components
+    if origin is None:
+        start = main_component(analysis)
+        origin = components[start][0]
+    else:
+        start = next(c for c, component in enumerate(components)
+                     if origin in component)
+
+    print('{} systems in {} strongly connected components, with {} '
+          'links between them.'.format(sum(len(component)
+                                           for component in components),
+                                       len(components), len(analysis.edges)),
+          file=file)
+    print(file=file)
+
+    print('Trap regions (can be entered, but not left): {}'.format(
+        len(analysis.traps)), file=file)
+    for c in analysis.traps:
+        print(_namelist(components[c]), file=file)
+    print(file=file)
+
+    reached = reachable(analysis, start)
+    unreachable = sorted(name for c, component in enumerate(components)
+                         if c not in reached for name in component)
+    print('Unreachable from {}: {}'.format(origin, len(unreachable)),
+          file=file)
+    if unreachable:
+        print(_namelist(unreachable), file=file)
+    print(file=file)
+
+    print('Components, and the components they lead to:', file=file)
+    leads = [[] for component in components]
+    for c, d in analysis.edges:
+        leads[c].append(str(d))
+    for c, dests in enumerate(leads):
+        line = '  {}: {}'.format(c, _component_name(analysis, c))
+        if dests:
+            line += ' -> ' + ', '.join(dests)
+        print(line, file=file)
+
+def main(args):
+    '''Check the map for trap regions and unreachable systems.
+
+    Unless a database is given with the --db option, the data files are
+    assumed to be in ./dat/, relative to the current path, so this
+    should be run from the root of the Naev source directory.
+
+    '''
+    parser = argparse.ArgumentParser(description='Check the Naev map for '
+                                     'regions that can be entered but not '
+                                     'left, and for unreachable systems.')
+    parser.add_argument('--db', metavar='FILE',
+                        help='read the map from this database (made by '
+                        'naevdb.py), instead of from the data files')
+    parser.add_argument('--from', dest='origin', metavar='SYSTEM',
+                        help='find the systems that can\'t be reached from '
+                        'this one (default: the first system in the largest '
+                        'region)')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='keep the results in this directory, and use '
+                        'them again if the map has not changed (default: '
+                        'don\'t cache them)')
+    args = parser.parse_args(args)
+
+    if args.db is not None:
+        # naevdb uses this module to build the database, so it is only
+        # imported here, where it is needed, rather than at the top.
+        import naevdb
+        conn = naevdb.open_db(args.db, in_memory=False, readonly=True)
+        try:
+            names = naevdb.get_ssys_positions(conn)
+            jumps = naevdb.get_jump_pairs(conn)
+        finally:
+            conn.close()
+    else:
+        ssystems = [SSystem(ssysfile) for ssysfile in datafiles('SSystems')]
+        names = [ssys.name for ssys in ssystems]
+        jumps = [(ssys.name, dest, jump.exit_only) for ssys in ssystems
+                 for dest, jump in ssys.jumps.items()]
+
+    if args.origin is not None and args.origin not in names:
+        parser.error("no star system named '{}'".format(args.origin))
+    if args.cache is None:
+        analysis = analyse(JumpGraph(sorted(names), jumps))
+    else:
+        analysis = cached_analysis(names, jumps, args.cache)
+    report(analysis, args.origin)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
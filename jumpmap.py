@@ -3,9 +3,16 @@
 '''Universe mapping tool for Naev.
 
 Run this script from the root directory of your Naev source tree. It
-reads the XML files in dat/ssys/ and outputs an SVG map to standard
-output. Example usage:
+reads the XML files in dat/ssys/ (or, with the --db option, a database
+made by naevdb.py) and outputs an SVG map to standard output, or to a
+file with the --output option (compressed, if its name ends in .svgz).
+For a large universe, the --tiles option instead writes the map as a
+pyramid of small tiles, with a web page for viewing them. Example
+usage:
     user@home:~/naev/$ jumpmap > map.svg
+    user@home:~/naev/$ jumpmap -o map.svgz
+    user@home:~/naev/$ jumpmap --tiles map/ --jobs 4
+    user@home:~/anywhere/$ jumpmap --db naev.db > map.svg
 
 '''
 
@@ -25,74 +32,677 @@ output. Example usage:
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # Standard library imports.
+import argparse
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+import gzip
+import io
+import math
+import os
 import sys
+from xml.sax.saxutils import escape as xml_escape
 
 # Local imports.
-from naevdata import SSystem
+from naevdata import Coords, SSystem
 from dataloader import datafiles
+import maplayout
+import naevdb
+import sensors
 
-def mapdata(ssystems):
-    '''Extract mappable data from a list of star systems.
+def ssystem_graph(ssystems):
+    '''Get the positions of star systems and the jumps between them.
 
     Keyword arguments:
-        ssystems -- A sequence object containing the star systems to be
-            mapped (instances of naevdata.SSystem).
+        ssystems -- An iterable of the star systems to be mapped
+            (instances of naevdata.SSystem).
+    Returns:
+        A 2-tuple holding the positions and jumps of the systems, in the
+        form taken by mapdata(). (naevdb.get_ssys_positions() and
+        naevdb.get_jump_pairs() give the same from a database.)
+
+    '''
+    positions = {}
+    jumps = []
+    for ssys in ssystems:
+        positions[ssys.name] = ssys.pos.coords
+        jumps.extend((ssys.name, dest, jump.exit_only)
+                     for dest, jump in ssys.jumps.items())
+    return positions, jumps
+
+def mapdata(positions, jumps, report=sys.stderr):
+    '''Extract mappable data from the star systems and their jumps.
+
+    Each system is numbered, and each jump is keyed by the ordered pair
+    of numbers of its two ends, packed into one integer. A jump is then
+    matched with the one coming back the other way by a set lookup, so
+    the whole map is sorted out in time proportional to the number of
+    jumps.
+
+    Keyword arguments:
+        positions -- A mapping object pairing the name of each star
+            system to be mapped with its coordinates, as a 2-tuple.
+            These are normally the real positions (see ssystem_graph()),
+            but may come from elsewhere, such as
+            maplayout.force_layout().
+        jumps -- An iterable of 3-tuples, each holding the names of the
+            origin and destination systems of a jump, and whether it is
+            exit-only.
+        report -- A file-like object to report problems to, such as
+            jumps to systems that aren't in the map. These jumps are
+            left out. Defaults to standard error; if None, nothing is
+            reported.
     Returns:
         A 4-tuple containing:
         * the map boundaries (a 4-tuple of x-minimum, x-maximum,
           y-minimum and y-maximum)
         * the system locations (a mapping object of system names to
-          coordinates, given as 2-tuple x-y pairs)
+          coordinates, given as naevdata.Coords objects)
         * the two-way jumps between systems (a sequence object of
-          2-tuples holding the coordinates of the two ends, themselves
-          given as 2-tuple x-y pairs)
+          2-tuples holding the coordinates of the two ends)
         * the one-way jumps between systems (as above, but note that
           the two ends are ordered as origin then destination)
 
     '''
     syslocs = {}
-    jumps_by_name = {}
-    jumps = []
-    jumps_oneway = []
+    ids = {}
     xmin = xmax = ymin = ymax = 0
 
-    # Extract the data.
-    for ssys in ssystems:
+    # Extract the data, numbering each system as we go.
+    for name, (x, y) in positions.items():
         # Note down the system name and location.
-        syslocs[ssys.name] = ssys.pos
-        # Note down any jumps it has. Ignore any that can't be entered from
-        # here; they'll be recorded in the system at the other end.
-        jumps_by_name[ssys.name] = list(dest for dest in ssys.jumps
-                                        if not ssys.jumps[dest].exit_only)
+        syslocs[name] = Coords(x, y)
+        ids[name] = len(ids)
         # Track the outermost systems.
-        xmin = min(xmin, ssys.pos.x)
-        xmax = max(xmax, ssys.pos.x)
-        ymin = min(ymin, ssys.pos.y)
-        ymax = max(ymax, ssys.pos.y)
+        xmin = min(xmin, x)
+        xmax = max(xmax, x)
+        ymin = min(ymin, y)
+        ymax = max(ymax, y)
+
+    # Note down every jump, keyed by its ends as (origin * count + dest).
+    # Ignore any that can't be entered from their origin; they'll be
+    # recorded in the system at the other end.
+    count = len(ids)
+    locs = list(syslocs.values())
+    edges = []
+    for origin, dest, exit_only in jumps:
+        if exit_only:
+            continue
+        try:
+            edges.append(ids[origin] * count + ids[dest])
+        except KeyError:
+            if report is not None:
+                print("warning: jump from '{}' to unknown system "
+                      "'{}'".format(origin, dest), file=report)
+    edge_set = set(edges)
 
     # Convert the jump data to a series of coordinates.
-    for origin in jumps_by_name:
-        for dest in jumps_by_name[origin]:
-            if dest in jumps_by_name and origin in jumps_by_name[dest]:
-                # Two-way jump.
-                jumps.append((syslocs[origin], syslocs[dest]))
-                # Don't duplicate jumps.
-                jumps_by_name[dest].remove(origin)
-            else:
-                # One-way jump.
-                jumps_oneway.append((syslocs[origin], syslocs[dest]))
+    jumps = []
+    jumps_oneway = []
+    for edge in edges:
+        origin, dest = divmod(edge, count)
+        if dest * count + origin in edge_set:
+            # Two-way jump. Record it from whichever end was numbered first,
+            # so as not to duplicate it.
+            if origin <= dest:
+                jumps.append((locs[origin], locs[dest]))
+        else:
+            # One-way jump.
+            jumps_oneway.append((locs[origin], locs[dest]))
 
     return ((xmin, xmax, ymin, ymax), syslocs, jumps, jumps_oneway)
 
-def makemap(ssystems, margin=10, sys_size=5, ssystem_colour="orange",
+def svg_point(x, y):
+    '''Project a point in Naev coordinates into SVG coordinates.
+
+    The two differ only in the direction of the y axis: up in Naev, but
+    down in SVG.
+
+    '''
+    return x, -y
+
+def svg_viewbox(bounds, margin=0, extra_width=0):
+    '''Get the SVG viewBox showing a region of the map.
+
+    Keyword arguments:
+        bounds -- The region to show, in Naev coordinates (a 4-tuple of
+            x-minimum, x-maximum, y-minimum and y-maximum, as returned
+            by mapdata()).
+        margin -- The margin width to put around the region.
+        extra_width -- Extra space to leave on the right (for labels).
+    Returns:
+        A 4-tuple holding the x and y coordinates of the top-left
+        corner, and the width and height.
+
+    '''
+    xmin, xmax, ymin, ymax = bounds
+    left, top = svg_point(xmin, ymax)
+    return (left - margin, top - margin,
+            xmax - xmin + 2 * margin + extra_width,
+            ymax - ymin + 2 * margin)
+
+class MapIndex:
+    '''An index of star system positions and the jumps between them.
+
+    Finding the neighbours of one system by checking every other system
+    takes time proportional to the size of the universe, so finding
+    them for every system in turn would take quadratic time. Instead,
+    this index is built once, and then answers each query in time
+    proportional to the size of the neighbourhood.
+
+    Systems are located with a uniform grid: each system is filed under
+    the grid cell it lies in, so a radius search only has to look in the
+    few cells that the search circle overlaps. Jumps are stored as an
+    adjacency mapping, and searched breadth-first.
+
+    The index holds only plain data, so it can be sent to other
+    processes cheaply.
+
+    Instance attributes:
+        positions -- A mapping object pairing the name of each system
+            with its coordinates, as a 2-tuple.
+        links -- A mapping object pairing the name of each system with
+            the set of systems it is connected to by a jump in either
+            direction.
+
+    '''
+    def __init__(self, positions, jumps, cell_size=100):
+        '''Build the index.
+
+        Keyword arguments:
+            positions -- As the instance attribute.
+            jumps -- An iterable of 2-tuples, each holding the names of
+                the origin and destination of a jump. Jumps to or from
+                unknown systems are ignored.
+            cell_size -- The width and height of each grid cell. Radius
+                searches are quickest when this is close to the radius.
+
+        '''
+        self.positions = dict(positions)
+        self.cell_size = cell_size
+        self._grid = defaultdict(list)
+        for name, (x, y) in self.positions.items():
+            self._grid[self._cell(x, y)].append(name)
+
+        self.links = dict((name, set()) for name in self.positions)
+        for origin, dest in jumps:
+            if origin in self.links and dest in self.links:
+                self.links[origin].add(dest)
+                self.links[dest].add(origin)
+
+    @classmethod
+    def from_ssystems(cls, ssystems, cell_size=100):
+        '''Build the index from a sequence of SSystem instances.'''
+        ssystems = list(ssystems)
+        return cls(((ssys.name, ssys.pos.coords) for ssys in ssystems),
+                   ((ssys.name, dest) for ssys in ssystems
+                    for dest in ssys.jumps),
+                   cell_size)
+
+    def _cell(self, x, y):
+        '''Get the grid cell containing a point.'''
+        return (math.floor(x / self.cell_size),
+                math.floor(y / self.cell_size))
+
+    def within_radius(self, name, radius):
+        '''Find the systems within a given distance of a system.
+
+        Returns:
+            A set of system names, including the given system.
+
+        '''
+        x, y = self.positions[name]
+        (xmin, ymin), (xmax, ymax) = (self._cell(x - radius, y - radius),
+                                      self._cell(x + radius, y + radius))
+        found = set()
+        for cx in range(xmin, xmax + 1):
+            for cy in range(ymin, ymax + 1):
+                for other in self._grid.get((cx, cy), ()):
+                    ox, oy = self.positions[other]
+                    if (ox - x) ** 2 + (oy - y) ** 2 <= radius ** 2:
+                        found.add(other)
+        return found
+
+    def within_jumps(self, name, jumps):
+        '''Find the systems within a given number of jumps of a system.
+
+        Jumps are counted in either direction, so that a one-way jump
+        still makes its two ends neighbours.
+
+        Returns:
+            A mapping object pairing the name of each system found
+            (including the given system) with its distance in jumps.
+
+        '''
+        found = {name: 0}
+        queue = deque([name])
+        while queue:
+            current = queue.popleft()
+            distance = found[current] + 1
+            if distance > jumps:
+                break
+            for other in self.links[current]:
+                if other not in found:
+                    found[other] = distance
+                    queue.append(other)
+        return found
+
+    def neighbourhood(self, name, jumps=2, radius=0):
+        '''Find the neighbourhood of a system.
+
+        Keyword arguments:
+            name -- The name of the system.
+            jumps -- Include every system within this many jumps.
+            radius -- Also include every system within this distance.
+        Returns:
+            A 3-tuple holding the map bounds of the neighbourhood (as
+            for mapdata()), a sorted list of the systems in it (each
+            given as a 3-tuple of name and x and y coordinates), and a
+            sorted list of the connections between them (each given as
+            a 2-tuple of names, in sorted order).
+
+        '''
+        names = set(self.within_jumps(name, jumps))
+        if radius > 0:
+            names |= self.within_radius(name, radius)
+
+        systems = sorted((other,) + tuple(self.positions[other])
+                         for other in names)
+        links = sorted((origin, dest) for origin in names
+                       for dest in self.links[origin]
+                       if origin < dest and dest in names)
+        xs = [x for other, x, y in systems]
+        ys = [y for other, x, y in systems]
+        return (min(xs), max(xs), min(ys), max(ys)), systems, links
+
+def svg_defs(ssystem_colour, jump_colour, label_colour, label_font,
+             stroke_width=1):
+    '''Get the lines of SVG that define the appearance of a map.
+
+    Keyword arguments:
+        ssystem_colour, jump_colour, label_colour, label_font -- As for
+            makemap().
+        stroke_width -- The width of the jump lines, in map units.
+
+    '''
+    return ['<defs>',
+            '<marker id="arrow" orient="auto" viewBox="-1 -2 4 4"',
+            '        markerWidth="8" markerHeight="8">',
+            '    <path d="M 0,0 -1,-2 3,0 -1,2 Z" '
+            'fill="{}"/>'.format(jump_colour),
+            '</marker>',
+            '<style type="text/css"><![CDATA[',
+            '    g#jumps > path {{stroke: {}; '
+            'stroke-width: {}}}'.format(jump_colour, stroke_width),
+            '    g#jumps > path.oneway {{stroke-dasharray: {},{};'.format(
+                2 * stroke_width, stroke_width),
+            '                           marker-mid: url(#arrow)}',
+            '    g#systems > circle {{stroke: none; '
+            'fill: {}}}'.format(ssystem_colour),
+            '    g#systems > text {{stroke: none; '
+            'fill: {}; font-family: {}}}'.format(label_colour, label_font),
+            ']]></style>',
+            '</defs>']
+
+# How much SVG text (in characters) an SVGWriter collects before writing.
+SVG_BUFFER_SIZE = 64 * 1024
+
+class SVGWriter:
+    '''Streams an SVG document to a file, a chunk at a time.
+
+    Writing a large map line by line means a write call (and, for a
+    compressed file, a trip through the compressor) for every line.
+    Instead, the writer collects lines in a buffer and writes them out
+    together once the buffer is full, and when it is closed.
+
+    Numbers are written rounded to a fixed number of decimal places,
+    without trailing zeros or a leading zero before the point, so that
+    the same map always gives the same bytes, and as few of them as
+    possible.
+
+    The writer can be used in a with statement, which closes it (but
+    not the file it writes to) at the end.
+
+    Instance attributes:
+        file -- The file-like object to write to. It may be opened in
+            either text or binary mode; binary files (including gzip
+            files and io.BytesIO objects) are written in UTF-8.
+        precision -- The number of decimal places to round numbers to.
+        buffer_size -- How many characters to collect before writing.
+
+    '''
+    def __init__(self, file, precision=2, buffer_size=SVG_BUFFER_SIZE):
+        '''Create the writer.
+
+        Keyword arguments:
+            file, precision, buffer_size -- As the instance attributes.
+                The default precision is 2 decimal places.
+
+        '''
+        self.file = file
+        self.precision = precision
+        self.buffer_size = buffer_size
+        self._binary = not isinstance(file, io.TextIOBase)
+        self._format = '{{:.{}f}}'.format(precision).format
+        self._chunks = []
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def number(self, value):
+        '''Format a number compactly.'''
+        text = self._format(value)
+        if self.precision > 0:
+            text = text.rstrip('0').rstrip('.')
+        if text[0] == '0':
+            return text[1:] or '0'
+        elif text[:2] == '-0':
+            return '-' + text[2:] if len(text) > 2 else '0'
+        return text
+
+    def point(self, x, y):
+        '''Format a pair of coordinates compactly, as "x,y".'''
+        return self.number(x) + ',' + self.number(y)
+
+    def write(self, text):
+        '''Add some text to the document.'''
+        self._chunks.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def line(self, text=''):
+        '''Add a line of text to the document.'''
+        self.write(text + '\n')
+
+    def lines(self, lines):
+        '''Add several lines of text to the document.'''
+        for text in lines:
+            self.write(text + '\n')
+
+    def flush(self):
+        '''Write out everything collected so far.'''
+        if not self._chunks:
+            return
+        text = ''.join(self._chunks)
+        self._chunks = []
+        self._buffered = 0
+        self.file.write(text.encode('utf-8') if self._binary else text)
+
+    def close(self):
+        '''Write out everything collected, and flush the file.'''
+        self.flush()
+        self.file.flush()
+
+def open_svg(filename):
+    '''Open a file to write an SVG map into.
+
+    A filename ending in .svgz gives a gzip-compressed file. Its header
+    records no modification time, so the same map always gives the same
+    bytes.
+
+    Returns:
+        A file object, opened in binary mode.
+
+    '''
+    if filename.endswith('.svgz'):
+        return gzip.GzipFile(filename, 'wb', mtime=0)
+    return open(filename, 'wb')
+
+# Approximate width of a character of label text, and the heights above
+# and below the baseline that the text takes up, relative to the font size.
+CHAR_WIDTH = 0.6
+TEXT_ASCENT = 0.8
+TEXT_DESCENT = 0.2
+
+# The places a system label may go, in order of preference. Each is given
+# as the text anchor and the position of the text, in multiples of the
+# system marker radius, relative to the centre of the marker. The label
+# font size is three times the radius.
+LABEL_CANDIDATES = (('start', 2, 1),        # Right.
+                    ('end', -2, 1),         # Left.
+                    ('start', 1.5, -1.5),   # Above right.
+                    ('start', 1.5, 4),      # Below right.
+                    ('end', -1.5, -1.5),    # Above left.
+                    ('end', -1.5, 4),       # Below left.
+                    ('middle', 0, -2),      # Above.
+                    ('middle', 0, 4))       # Below.
+
+def text_box(x, y, text, font_size, anchor='start'):
+    '''Estimate the box taken up by a line of text.
+
+    Keyword arguments:
+        x, y -- The position of the text (its anchor point, on the
+            baseline), in SVG coordinates.
+        text -- The text.
+        font_size -- The font size, in SVG units.
+        anchor -- The SVG text-anchor: 'start' (the default), 'middle'
+            or 'end'.
+    Returns:
+        The box, as a 4-tuple of x-minimum, y-minimum, x-maximum and
+        y-maximum.
+
+    '''
+    width = CHAR_WIDTH * font_size * len(text)
+    left = (x if anchor == 'start' else
+            x - width / 2 if anchor == 'middle' else
+            x - width)
+    return (left, y - TEXT_ASCENT * font_size,
+            left + width, y + TEXT_DESCENT * font_size)
+
+def boxes_overlap(box1, box2):
+    '''Check whether two boxes (as for text_box()) overlap.'''
+    return (box1[0] < box2[2] and box2[0] < box1[2] and
+            box1[1] < box2[3] and box2[1] < box1[3])
+
+class BoxGrid:
+    '''A uniform spatial hash of boxes, for finding overlaps quickly.
+
+    Each box is filed under every grid cell it touches, so a new box
+    only has to be checked against the boxes in the few cells it
+    touches, not against every box so far.
+
+    Instance attributes:
+        cell_size -- The width and height of each grid cell.
+
+    '''
+    def __init__(self, cell_size):
+        '''Create an empty grid.'''
+        self.cell_size = cell_size
+        self._cells = defaultdict(list)
+
+    def _cells_for(self, box):
+        '''Get the keys of the grid cells that a box touches.'''
+        xmin, ymin, xmax, ymax = (math.floor(coord / self.cell_size)
+                                  for coord in box)
+        return [(x, y) for x in range(xmin, xmax + 1)
+                for y in range(ymin, ymax + 1)]
+
+    def add(self, box):
+        '''Add a box to the grid.'''
+        for cell in self._cells_for(box):
+            self._cells[cell].append(box)
+
+    def overlaps(self, box):
+        '''Check whether a box overlaps any box in the grid.'''
+        cells = self._cells
+        for cell in self._cells_for(box):
+            for other in cells.get(cell, ()):
+                if boxes_overlap(box, other):
+                    return True
+        return False
+
+def place_labels(systems, sys_size, priority=None):
+    '''Find places for system labels where they don't overlap.
+
+    Labels are placed one at a time, most important first, each in the
+    first of LABEL_CANDIDATES that overlaps neither a system marker nor
+    a label already placed. A label with no such place is left out. As
+    overlaps are found with a BoxGrid, this takes time roughly in
+    proportion to the number of systems.
+
+    Keyword arguments:
+        systems -- An iterable of the systems to label, as 3-tuples of
+            name, x and y (in SVG coordinates).
+        sys_size -- The radius of the system markers, in SVG units.
+        priority -- A mapping object pairing system names with their
+            importance (a number; higher is more important). Systems
+            not included have an importance of zero. If omitted, all
+            are equally important, and labelled in alphabetical order.
+    Returns:
+        A 2-tuple holding a mapping object pairing the name of each
+        labelled system with the position of its label (a 3-tuple of
+        anchor, x and y, as for text_box()), and a sorted list of the
+        names of the systems left unlabelled.
+
+    '''
+    systems = list(systems)
+    priority = priority or {}
+    font_size = 3 * sys_size
+    # Labels of a typical length should touch only a few cells each.
+    if systems:
+        mean_length = sum(len(name) for name, x, y in systems) / len(systems)
+    else:
+        mean_length = 0
+    grid = BoxGrid(max(CHAR_WIDTH * font_size * mean_length, font_size))
+
+    # Labels may not cover any marker.
+    for name, x, y in systems:
+        grid.add((x - sys_size, y - sys_size, x + sys_size, y + sys_size))
+
+    placed = {}
+    hidden = []
+    for name, x, y in sorted(systems,
+                             key=lambda system: (-priority.get(system[0], 0),
+                                                 system[0])):
+        for anchor, dx, dy in LABEL_CANDIDATES:
+            label_x, label_y = x + dx * sys_size, y + dy * sys_size
+            box = text_box(label_x, label_y, name, font_size, anchor)
+            if not grid.overlaps(box):
+                grid.add(box)
+                placed[name] = (anchor, label_x, label_y)
+                break
+        else:
+            hidden.append(name)
+
+    return placed, sorted(hidden)
+
+# The most hidden labels to name in a report.
+MAX_REPORTED = 10
+
+def jump_counts(jumps):
+    '''Get the number of jumps from each system, as a label priority.
+
+    Keyword arguments:
+        jumps -- The jumps, as for mapdata().
+
+    '''
+    counts = defaultdict(int)
+    for origin, dest, exit_only in jumps:
+        counts[origin] += 1
+    return dict(counts)
+
+# Colours given in turn to the regions of a territory overlay.
+TERRITORY_COLOURS = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                     '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf')
+
+# Colours given in turn to the routes highlighted on a map.
+ROUTE_COLOURS = ('crimson', 'royalblue', 'forestgreen', 'darkorchid',
+                 'goldenrod')
+
+# Colours for a sensor coverage overlay (see sensors.SensorTable.coverage()).
+SENSOR_COLOURS = dict(zip(sensors.COVERAGE, ('#2ca02c', '#ff7f0e', '#d62728')))
+
+# Radius of the territory overlay around each system, relative to the
+# radius of the system marker.
+TERRITORY_SIZE = 3
+
+def dominant_factions(presences):
+    '''Find the faction with the most presence in each system.
+
+    Keyword arguments:
+        presences -- A mapping object pairing system names with the
+            faction presences in them, as given for the whole universe
+            by naevdb.get_all_presences().
+    Returns:
+        A mapping object pairing system names with the dominant faction
+        in each, for use as a territory overlay (see makemap()). Systems
+        where no faction has a positive presence are left out; ties go
+        to the faction that comes first alphabetically.
+
+    '''
+    dominant = {}
+    for name, presence in presences.items():
+        totals = defaultdict(float)
+        for (faction, range_), value in presence.items():
+            totals[faction] += value
+        # max() gives the first of equals, so sort the factions first.
+        faction = max(sorted(totals), key=totals.get)
+        if totals[faction] > 0:
+            dominant[name] = faction
+    return dominant
+
+def overlay_colours(territory, palette=TERRITORY_COLOURS):
+    '''Choose a colour for each region of a territory overlay.
+
+    The regions are given colours from the palette in turn, largest
+    region first (and alphabetically among regions of the same size),
+    starting again from the beginning if there are more regions than
+    colours.
+
+    Keyword arguments:
+        territory -- A mapping object pairing system names with the
+            region each belongs to.
+        palette -- A sequence of colours to use.
+    Returns:
+        A mapping object pairing each region with its colour.
+
+    '''
+    sizes = defaultdict(int)
+    for region in territory.values():
+        sizes[region] += 1
+    regions = sorted(sizes, key=lambda region: (-sizes[region], region))
+    return dict((region, palette[i % len(palette)])
+                for i, region in enumerate(regions))
+
+def route_highlights(routes, palette=ROUTE_COLOURS):
+    '''Get the jumps to highlight along some routes.
+
+    Keyword arguments:
+        routes -- An iterable of routes, each a sequence of the names of
+            the systems along it, in order.
+        palette -- A sequence of colours to give the routes in turn.
+    Returns:
+        A mapping object pairing each leg of the routes (a 2-tuple of
+        system names) with its colour, for use as highlights (see
+        makemap()). Where routes share a leg, the later one's colour is
+        used.
+
+    '''
+    highlights = {}
+    for i, route in enumerate(routes):
+        colour = palette[i % len(palette)]
+        for leg in zip(route, route[1:]):
+            highlights[leg] = colour
+    return highlights
+
+def makemap(positions, jumps, margin=10, sys_size=5, ssystem_colour="orange",
             jump_colour="grey", label_colour="black", label_font="serif",
-            file=sys.stdout):
-    '''Create an SVG map from a list of star systems.
+            priority=None, file=sys.stdout, report=sys.stderr,
+            map_date=None, territory=None, territory_colours=None,
+            highlights=None, labels=None):
+    '''Create an SVG map of the star systems and their jumps.
+
+    Labels are placed automatically (see place_labels()), and the map is
+    made big enough to hold them.
 
     Keyword arguments:
-        ssystems -- A sequence object containing the star systems to be
-            mapped (instances of naevdata.SSystem).
+        positions, jumps -- The systems and jumps to map, as for
+            mapdata(). The jumps must be a sequence object.
         margin -- The margin width (in pixels) to put around the edges
             of the map. The default value is 10.
         sys_size -- The radius of the dot representing each star system.
@@ -100,94 +710,700 @@ def makemap(ssystems, margin=10, sys_size=5, ssystem_colour="orange",
         ssystem_colour, jump_colour, label_colour, label_font -- Control
             the appearance of the SVG output. The default appearance has
             orange star systems, grey jumps, and labels in black serif.
-        file -- A file-like object to output the SVG to. Defaults to
-            standard output.
-
-    '''
-    (xmin, xmax, ymin, ymax), systems, jumps, jumps_oneway = mapdata(ssystems)
-    # Pad the bounds of the map and convert to SVG viewBox specs.
-    LABEL_SPACE = 200
-    svg_bounds = (xmin - margin, -ymax - margin,
-                  xmax - xmin + 2 * margin + LABEL_SPACE,
-                  ymax - ymin + 2 * margin)
-
-    # Output the SVG file.
-    print('<?xml version="1.0"?>')
-    print('<svg xmlns="http://www.w3.org/2000/svg" version="1.2" '
-          'baseProfile="tiny" width="{2}px" height="{3}px" '
-          'viewBox="{0} {1} {2} {3}">'.format(*svg_bounds), file=file)
-    print('<title>Naev universe map {}</title>'.format(date.today()),
-          file=file)
-##    print('<!-- {} -->'.format((xmin, xmax, ymin, ymax)))
-
-    # Style the map.
-    print('<defs>', file=file)
-    print('<marker id="arrow" orient="auto" viewBox="-1 -2 4 4"', file=file)
-    print('        markerWidth="8" markerHeight="8">', file=file)
-    print('    <path d="M 0,0 -1,-2 3,0 -1,2 Z" '
-          'fill="{}"/>'.format(jump_colour), file=file)
-    print('</marker>', file=file)
-    print('<style type="text/css"><![CDATA[', file=file)
-    print('    g#jumps > path {{stroke: {}; '
-          'stroke-width: 1}}'.format(jump_colour), file=file)
-    print('    g#jumps > path.oneway {stroke-dasharray: 2,1;', file=file)
-    print('                           marker-mid: url(#arrow)}', file=file)
-    print('    g#systems > circle {{stroke: none; '
-          'fill: {}}}'.format(ssystem_colour), file=file)
-    print('    g#systems > text {{stroke: none; '
-          'fill: {}; font-family: {}}}'.format(label_colour, label_font),
-          file=file)
-    print(']]></style>', file=file)
-    print('</defs>', file=file)
-    print(file=file)
-
-    # Output the jumps first, so they're underneath the system markers.
-    print('<g id="jumps">', file=file)
-    for jump in jumps:
-        print('    <path d="M{},{} {},{}"/>'.format(jump[0].x, -jump[0].y,
-                                                    jump[1].x, -jump[1].y),
-              file=file)
-    for jump in jumps_oneway:
-        print('    <path class="oneway"', file=file)
-        print('          d="M{0},{1} l{2},{3} {2},{3}"'
-              '/>'.format(jump[0].x,
-                          -jump[0].y,
-                          (jump[1].x - jump[0].x) // 2,
-                          -(jump[1].y - jump[0].y) // 2),
-              file=file)
-    print('</g>', file=file)
-    print(file=file)
-
-    # Output the system markers.
-    print('<g id="systems">', file=file)
-    for name in systems:
-        x, y = systems[name].coords
-        print('    <circle cx="{}" cy="{}" r="{}"/>'.format(x, -y, sys_size),
-              file=file)
-        print('    <text x="{}" y="{}" font-size="{}"'.format(x + 2 * sys_size,
-                                                              -y + sys_size,
-                                                              3 * sys_size),
-              file=file)
-        print('    >{}</text>'.format(name), file=file)
-    print('</g>', file=file)
-    print(file=file)
-
-    # And we're done!
-    print('</svg>', file=file)
-
-def main():
-    '''Generate an SVG map and print it to standard output.
-
-    The data files are assumed to be in ./dat/ssys/, relative to the
-    current path, so this should be run from the root of the Naev
-    source directory.
-
-    '''
-    ssystems = []
-    for ssysfile in datafiles('SSystems'):
+        priority -- A mapping object pairing system names with the
+            importance of their labels (as for place_labels()). If
+            omitted, systems with more jumps are more important.
+        file -- A file-like object to output the SVG to, in text or
+            binary mode (see SVGWriter). Defaults to standard output.
+        report -- A file-like object to report problems to, such as
+            labels that could not be placed (as for mapdata()).
+        map_date -- The date to give in the title of the map. Defaults
+            to today.
+        territory -- A mapping object pairing system names with the
+            region (such as the dominant faction; see
+            dominant_factions()) that each belongs to. If given, each
+            region is shaded in its own colour under its systems.
+        territory_colours -- A mapping object pairing each region with
+            its colour. If omitted, colours are chosen with
+            overlay_colours().
+        highlights -- A mapping object pairing pairs of system names
+            with colours. A line in that colour is drawn over the jump
+            from the first system of each pair to the second (see
+            route_highlights()). Pairs with no such jump are reported
+            and left out.
+        labels -- The positions of the system labels, as returned by an
+            earlier call. Placing the labels takes most of the time, so
+            when drawing several maps of the same systems with the same
+            labels (such as with different overlays), pass this to skip
+            placing them again.
+    Returns:
+        The positions of the system labels (as for place_labels()).
+
+    '''
+    if priority is None and labels is None:
+        priority = jump_counts(jumps)
+    if highlights:
+        # The legs that can actually be travelled, for checking routes.
+        legs = set((origin, dest) for origin, dest, exit_only in jumps
+                   if not exit_only)
+    (xmin, xmax, ymin, ymax), systems, jumps, jumps_oneway = mapdata(
+        positions, jumps, report)
+    if labels is None:
+        labels, hidden = place_labels(((name,) + svg_point(*loc.coords)
+                                       for name, loc in systems.items()),
+                                      sys_size, priority)
+    else:
+        hidden = None
+    if hidden and report is not None:
+        print('warning: no room for {} labels: {}{}'.format(
+            len(hidden), ', '.join(hidden[:MAX_REPORTED]),
+            ', ...' if len(hidden) > MAX_REPORTED else ''), file=report)
+
+    # Make room for the labels, then pad the bounds of the map and convert
+    # to SVG viewBox specs.
+    for name, (anchor, label_x, label_y) in labels.items():
+        left, top, right, bottom = text_box(label_x, label_y, name,
+                                            3 * sys_size, anchor)
+        xmin, xmax = min(xmin, left), max(xmax, right)
+        ymin, ymax = min(ymin, -bottom), max(ymax, -top)
+    if territory:
+        # And for the territory shading.
+        spread = TERRITORY_SIZE * sys_size
+        xmin, xmax = xmin - spread, xmax + spread
+        ymin, ymax = ymin - spread, ymax + spread
+    svg_bounds = svg_viewbox((xmin, xmax, ymin, ymax), margin)
+
+    # Sort out the overlays.
+    regions = defaultdict(list)
+    for name, region in (territory or {}).items():
+        if name in systems:
+            regions[region].append(name)
+    if regions and territory_colours is None:
+        territory_colours = overlay_colours(territory)
+    highlighted = defaultdict(list)
+    for (origin, dest), colour in (highlights or {}).items():
+        if origin not in systems or dest not in systems:
+            problem = 'unknown system'
+        elif (origin, dest) not in legs:
+            problem = 'no jump from one to the other'
+        else:
+            highlighted[colour].append((systems[origin].coords,
+                                        systems[dest].coords))
+            continue
+        if report is not None:
+            print("warning: can't highlight '{}' to '{}': {}".format(
+                origin, dest, problem), file=report)
+
+    # Output the SVG file. Systems and jumps are drawn in a fixed order,
+    # so the same universe always gives the same map.
+    with SVGWriter(file) as out:
+        out.line('<?xml version="1.0"?>')
+        out.line('<svg xmlns="http://www.w3.org/2000/svg" version="1.2" '
+                 'baseProfile="tiny" width="{2}px" height="{3}px" '
+                 'viewBox="{0} {1} {2} {3}">'.format(
+                     *(out.number(n) for n in svg_bounds)))
+        out.line('<title>Naev universe map {}</title>'.format(
+            map_date or date.today()))
+
+        # Style the map.
+        out.lines(svg_defs(ssystem_colour, jump_colour, label_colour,
+                           label_font))
+        out.line()
+
+        # Shade the territories underneath everything else.
+        if regions:
+            out.line('<g id="territory" fill-opacity="0.3">')
+            for region in sorted(regions):
+                out.line('  <g fill="{}">'.format(territory_colours[region]))
+                out.line('    <title>{}</title>'.format(xml_escape(region)))
+                for name in sorted(regions[region]):
+                    x, y = systems[name].coords
+                    out.line('    <circle cx="{}" cy="{}" r="{}"/>'.format(
+                        out.number(x), out.number(-y),
+                        out.number(TERRITORY_SIZE * sys_size)))
+                out.line('  </g>')
+            out.line('</g>')
+            out.line()
+
+        # Output the jumps first, so they're underneath the system markers.
+        out.line('<g id="jumps">')
+        for start, end in sorted(tuple(sorted((jump[0].coords,
+                                               jump[1].coords)))
+                                 for jump in jumps):
+            out.line('    <path d="M{} {}"/>'.format(
+                out.point(*svg_point(*start)), out.point(*svg_point(*end))))
+        for (x1, y1), (x2, y2) in sorted((jump[0].coords, jump[1].coords)
+                                         for jump in jumps_oneway):
+            half = out.point((x2 - x1) / 2, (y1 - y2) / 2)
+            out.line('    <path class="oneway" d="M{} l{} {}"/>'.format(
+                out.point(x1, -y1), half, half))
+        out.line('</g>')
+        out.line()
+
+        # Highlight jumps over the top of the others.
+        if highlighted:
+            out.line('<g id="highlights" fill="none" stroke-width="3" '
+                     'stroke-linecap="round">')
+            for colour in sorted(highlighted):
+                out.line('  <g stroke="{}">'.format(colour))
+                for start, end in sorted(highlighted[colour]):
+                    out.line('    <path d="M{} {}"/>'.format(
+                        out.point(*svg_point(*start)),
+                        out.point(*svg_point(*end))))
+                out.line('  </g>')
+            out.line('</g>')
+            out.line()
+
+        # Output the system markers.
+        out.line('<g id="systems">')
+        for name in sorted(systems):
+            x, y = systems[name].coords
+            out.line('    <circle cx="{}" cy="{}" r="{}"/>'.format(
+                out.number(x), out.number(-y), out.number(sys_size)))
+            if name not in labels:
+                continue
+            anchor, label_x, label_y = labels[name]
+            out.line('    <text x="{}" y="{}" font-size="{}"{}>{}</text>'
+                     ''.format(out.number(label_x), out.number(label_y),
+                               out.number(3 * sys_size),
+                               '' if anchor == 'start' else
+                               ' text-anchor="{}"'.format(anchor),
+                               xml_escape(name)))
+        out.line('</g>')
+        out.line()
+
+        # And we're done!
+        out.line('</svg>')
+    return labels
+
+# The width and height of each map tile, in pixels.
+TILE_SIZE = 256
+
+def segment_hits_box(x1, y1, x2, y2, box):
+    '''Check whether a line segment crosses a box.
+
+    This uses the Liang-Barsky line clipping algorithm: the segment is
+    clipped against each edge of the box in turn, and misses the box if
+    nothing is left of it.
+
+    Keyword arguments:
+        x1, y1, x2, y2 -- The coordinates of the two ends of the segment.
+        box -- The box, as a 4-tuple of x-minimum, y-minimum, x-maximum
+            and y-maximum.
+
+    '''
+    xmin, ymin, xmax, ymax = box
+    dx, dy = x2 - x1, y2 - y1
+    t_in, t_out = 0, 1
+    for p, q in ((-dx, x1 - xmin), (dx, xmax - x1),
+                 (-dy, y1 - ymin), (dy, ymax - y1)):
+        if p == 0:
+            # Parallel to this edge, so either wholly inside or outside it.
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                if t > t_out:
+                    return False
+                t_in = max(t_in, t)
+            else:
+                if t < t_in:
+                    return False
+                t_out = min(t_out, t)
+    return True
+
+class TilePyramid:
+    '''The layout of a map split into a pyramid of square tiles.
+
+    At zoom level z, the map is split into 2**z by 2**z tiles, numbered
+    from the top-left corner, each drawn at TILE_SIZE pixels square. All
+    measurements are in SVG coordinates (see svg_point()).
+
+    Instance attributes:
+        left, top -- The top-left corner of the whole map.
+        side -- The width and height of the whole map.
+        max_zoom -- The highest zoom level.
+
+    '''
+    def __init__(self, bounds, max_zoom, margin=0):
+        '''Lay out the tiles.
+
+        Keyword arguments:
+            bounds -- The boundaries of the map, in Naev coordinates (as
+                returned by mapdata()).
+            max_zoom -- As the instance attribute.
+            margin -- The margin width to put around the map.
+
+        '''
+        self.left, self.top, width, height = svg_viewbox(bounds, margin)
+        self.side = max(width, height, 1)
+        self.max_zoom = max_zoom
+
+    def tile_side(self, zoom):
+        '''Get the width and height of each tile at a zoom level.'''
+        return self.side / 2 ** zoom
+
+    def tile_box(self, zoom, x, y):
+        '''Get the box covered by a tile (as for segment_hits_box()).'''
+        side = self.tile_side(zoom)
+        left, top = self.left + x * side, self.top + y * side
+        return left, top, left + side, top + side
+
+    def tile_range(self, zoom, box):
+        '''Find the tiles at a zoom level that a box overlaps.
+
+        Returns:
+            An iterator of the x and y numbers of each tile, as 2-tuples.
+
+        '''
+        side = self.tile_side(zoom)
+        last = 2 ** zoom - 1
+        xmin, ymin, xmax, ymax = box
+        x_first = max(0, math.floor((xmin - self.left) / side))
+        x_last = min(last, math.floor((xmax - self.left) / side))
+        y_first = max(0, math.floor((ymin - self.top) / side))
+        y_last = min(last, math.floor((ymax - self.top) / side))
+        for x in range(x_first, x_last + 1):
+            for y in range(y_first, y_last + 1):
+                yield x, y
+
+def tile_geometry(syslocs, jumps, jumps_oneway):
+    '''Convert the map data to SVG coordinates, ready for tiling.
+
+    Keyword arguments:
+        syslocs, jumps, jumps_oneway -- The map data, as returned by
+            mapdata().
+    Returns:
+        A 2-tuple. The first item is a list of the systems, as 3-tuples
+        of name, x and y. The second is a 2-tuple of lists of the
+        two-way and one-way jumps, as 4-tuples of x and y for each end.
+
+    '''
+    systems = [(name,) + svg_point(*loc.coords)
+               for name, loc in syslocs.items()]
+    segments = tuple([svg_point(*a.coords) + svg_point(*b.coords)
+                      for a, b in jump_list]
+                     for jump_list in (jumps, jumps_oneway))
+    return systems, segments
+
+def tile_contents(systems, segments, pyramid, sys_size=5, label_zoom=2,
+                  priority=None, zooms=None):
+    '''Sort the contents of a map into tiles.
+
+    Labels are placed afresh at each zoom level (see place_labels()), so
+    that more of them fit in as the map is zoomed in. Systems are filed
+    under every tile their marker (and label, if shown) overlaps. Each
+    jump is first matched with the tiles its bounding box overlaps, and
+    then culled from any of those that it does not actually cross.
+
+    Keyword arguments:
+        systems, segments -- The map data, as returned by
+            tile_geometry().
+        pyramid -- The tile layout (a TilePyramid instance).
+        sys_size -- The radius of the system markers, in pixels. Markers
+            and labels stay the same size on screen at every zoom level.
+        label_zoom -- The lowest zoom level at which labels are shown.
+        priority -- The importance of each label (as for makemap()).
+        zooms -- An iterable of the zoom levels to sort out. Each is
+            independent of the others, so they can be shared out. By
+            default, every level in the pyramid is sorted out.
+    Returns:
+        A mapping object pairing the zoom level, x and y numbers of each
+        non-empty tile (as a 3-tuple) with a 3-tuple of lists: the
+        systems (as 4-tuples of name, x and y, in SVG coordinates, and
+        the position of the label as given by place_labels(), or None
+        if it has no label), the two-way jumps and the one-way jumps
+        (as 4-tuples of x and y for each end, in SVG coordinates) to
+        draw there.
+
+    '''
+    if zooms is None:
+        zooms = range(pyramid.max_zoom + 1)
+    tiles = defaultdict(lambda: ([], [], []))
+    for zoom in zooms:
+        # Convert on-screen sizes to map units at this zoom level.
+        side = pyramid.tile_side(zoom)
+        scale = side / TILE_SIZE
+        size = sys_size * scale
+        if zoom >= label_zoom:
+            labels = place_labels(systems, size, priority)[0]
+        else:
+            labels = {}
+        for name, x, y in systems:
+            box = (x - size, y - size, x + size, y + size)
+            label = labels.get(name)
+            if label is not None:
+                anchor, label_x, label_y = label
+                label_box = text_box(label_x, label_y, name, 3 * size,
+                                     anchor)
+                box = (min(box[0], label_box[0]), min(box[1], label_box[1]),
+                       max(box[2], label_box[2]), max(box[3], label_box[3]))
+            for tile_x, tile_y in pyramid.tile_range(zoom, box):
+                tiles[zoom, tile_x, tile_y][0].append((name, x, y, label))
+
+        for kind, segment_list in enumerate(segments, 1):
+            for segment in segment_list:
+                x1, y1, x2, y2 = segment
+                bbox = (min(x1, x2) - scale, min(y1, y2) - scale,
+                        max(x1, x2) + scale, max(y1, y2) + scale)
+                for tile_x, tile_y in pyramid.tile_range(zoom, bbox):
+                    # Allow for the width of the line.
+                    left = pyramid.left + tile_x * side - scale
+                    top = pyramid.top + tile_y * side - scale
+                    if segment_hits_box(x1, y1, x2, y2,
+                                        (left, top, left + side + 2 * scale,
+                                         top + side + 2 * scale)):
+                        tiles[zoom, tile_x, tile_y][kind].append(segment)
+    return tiles
+
+def write_tile(file, key, contents, pyramid, sys_size=5,
+               ssystem_colour="orange", jump_colour="grey",
+               label_colour="black", label_font="serif"):
+    '''Write the SVG image of one map tile.
+
+    Keyword arguments:
+        file -- A file-like object to write the tile to, in text or
+            binary mode (see SVGWriter).
+        key -- The zoom level, x and y numbers of the tile, as a 3-tuple.
+        contents -- The systems and jumps to draw in the tile, as given
+            by tile_contents().
+        pyramid, sys_size -- As for tile_contents().
+        ssystem_colour, jump_colour, label_colour, label_font -- As for
+            makemap().
+
+    '''
+    zoom, x, y = key
+    systems, jumps, jumps_oneway = contents
+    scale = pyramid.tile_side(zoom) / TILE_SIZE
+    size = sys_size * scale
+    left, top, right, bottom = pyramid.tile_box(zoom, x, y)
+
+    with SVGWriter(file) as out:
+        out.line('<?xml version="1.0"?>')
+        out.line('<svg xmlns="http://www.w3.org/2000/svg" version="1.2" '
+                 'baseProfile="tiny" width="{0}px" height="{0}px" '
+                 'viewBox="{1} {2} {3} {3}">'.format(
+                     TILE_SIZE, out.number(left), out.number(top),
+                     out.number(right - left)))
+        out.lines(svg_defs(ssystem_colour, jump_colour, label_colour,
+                           label_font, scale))
+        out.line('<g id="jumps">')
+        for x1, y1, x2, y2 in jumps:
+            out.line('    <path d="M{} {}"/>'.format(out.point(x1, y1),
+                                                     out.point(x2, y2)))
+        for x1, y1, x2, y2 in jumps_oneway:
+            half = out.point((x2 - x1) / 2, (y2 - y1) / 2)
+            out.line('    <path class="oneway" d="M{} l{} {}"/>'.format(
+                out.point(x1, y1), half, half))
+        out.line('</g>')
+        out.line('<g id="systems">')
+        for name, sys_x, sys_y, label in systems:
+            out.line('    <circle cx="{}" cy="{}" r="{}"/>'.format(
+                out.number(sys_x), out.number(sys_y), out.number(size)))
+            if label is not None:
+                anchor, label_x, label_y = label
+                out.line('    <text x="{}" y="{}" font-size="{}"{}>{}'
+                         '</text>'.format(out.number(label_x),
+                                          out.number(label_y),
+                                          out.number(3 * size),
+                                          '' if anchor == 'start' else
+                                          ' text-anchor="{}"'.format(anchor),
+                                          xml_escape(name)))
+        out.line('</g>')
+        out.line('</svg>')
+
+TILE_VIEWER = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Naev universe map</title>
+<style>
+  html, body {{margin: 0; height: 100%; overflow: hidden; background: white}}
+  #map {{position: absolute; inset: 0; cursor: move}}
+  #map img {{position: absolute; width: {size}px; height: {size}px}}
+  #zoom {{position: absolute; top: 8px; left: 8px; z-index: 1}}
+</style>
+</head>
+<body>
+<div id="zoom"><button id="in">+</button> <button id="out">-</button></div>
+<div id="map"></div>
+<script>
+(function () {{
+  var SIZE = {size}, MAX_ZOOM = {max_zoom};
+  var map = document.getElementById('map');
+  // The map position is the pixel offset of the top-left corner of the
+  // whole map from the top-left corner of the window.
+  var zoom = 0, offsetX = 0, offsetY = 0;
+
+  function draw() {{
+    var count = 1 << zoom, html = [];
+    var first_x = Math.max(0, Math.floor(-offsetX / SIZE));
+    var first_y = Math.max(0, Math.floor(-offsetY / SIZE));
+    var last_x = Math.min(count - 1,
+                          Math.floor((map.clientWidth - offsetX) / SIZE));
+    var last_y = Math.min(count - 1,
+                          Math.floor((map.clientHeight - offsetY) / SIZE));
+    for (var x = first_x; x <= last_x; x++) {{
+      for (var y = first_y; y <= last_y; y++) {{
+        html.push('<img src="' + zoom + '/' + x + '/' + y + '.svg" ' +
+                  'style="left:' + (offsetX + x * SIZE) + 'px;top:' +
+                  (offsetY + y * SIZE) + 'px" alt="" ' +
+                  'onerror="this.style.display=\\'none\\'">');
+      }}
+    }}
+    map.innerHTML = html.join('');
+  }}
+
+  function setZoom(newZoom, centreX, centreY) {{
+    newZoom = Math.max(0, Math.min(MAX_ZOOM, newZoom));
+    var factor = Math.pow(2, newZoom - zoom);
+    offsetX = centreX - (centreX - offsetX) * factor;
+    offsetY = centreY - (centreY - offsetY) * factor;
+    zoom = newZoom;
+    draw();
+  }}
+
+  var dragging = null;
+  map.addEventListener('mousedown', function (event) {{
+    dragging = [event.clientX - offsetX, event.clientY - offsetY];
+    event.preventDefault();
+  }});
+  window.addEventListener('mousemove', function (event) {{
+    if (dragging) {{
+      offsetX = event.clientX - dragging[0];
+      offsetY = event.clientY - dragging[1];
+      draw();
+    }}
+  }});
+  window.addEventListener('mouseup', function () {{ dragging = null; }});
+  map.addEventListener('wheel', function (event) {{
+    setZoom(zoom + (event.deltaY < 0 ? 1 : -1), event.clientX,
+            event.clientY);
+    event.preventDefault();
+  }});
+  document.getElementById('in').onclick = function () {{
+    setZoom(zoom + 1, map.clientWidth / 2, map.clientHeight / 2);
+  }};
+  document.getElementById('out').onclick = function () {{
+    setZoom(zoom - 1, map.clientWidth / 2, map.clientHeight / 2);
+  }};
+  window.addEventListener('resize', draw);
+  draw();
+}})();
+</script>
+</body>
+</html>
+'''
+
+def _sort_tiles(geometry, pyramid, sys_size, label_zoom, priority,
+                zooms=None):
+    '''Sort out the tiles of some zoom levels (possibly in a worker process).
+
+    Keyword arguments:
+        geometry -- The systems and jumps to draw, as returned by
+            tile_geometry().
+        pyramid, sys_size, label_zoom, priority, zooms -- As for
+            tile_contents().
+    Returns:
+        A sorted list of the tiles, as 2-tuples of the key and contents
+        of each (as given by tile_contents()).
+
+    '''
+    return sorted(tile_contents(*geometry, pyramid=pyramid,
+                                sys_size=sys_size, label_zoom=label_zoom,
+                                priority=priority, zooms=zooms).items())
+
+def _write_tiles(tiledir, tiles, pyramid, options):
+    '''Write a share of the map tiles (possibly in a worker process).
+
+    Keyword arguments:
+        tiledir -- The directory to write the tiles into.
+        tiles -- A list of the tiles to write, as 2-tuples of the key
+            and contents of each (as given by tile_contents()).
+        pyramid -- The tile layout (a TilePyramid instance).
+        options -- A mapping object of keyword arguments for write_tile().
+    Returns:
+        The number of tiles written.
+
+    '''
+    for key, contents in tiles:
+        zoom, x, y = key
+        folder = os.path.join(tiledir, str(zoom), str(x))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, '{}.svg'.format(y)), 'wb') as f:
+            write_tile(f, key, contents, pyramid, **options)
+    return len(tiles)
+
+def maketiles(positions, jumps, tiledir, max_zoom=4, label_zoom=2, jobs=1,
+              margin=10, sys_size=5, ssystem_colour="orange",
+              jump_colour="grey", label_colour="black", label_font="serif",
+              priority=None):
+    '''Create a tiled map of the star systems and their jumps.
+
+    The map is written as a pyramid of SVG tiles, named ZOOM/X/Y.svg,
+    along with an HTML page (index.html) for viewing them. Only the
+    tiles with something in them are written. Each tile holds only the
+    systems and jumps it shows, so even a huge universe can be viewed
+    smoothly.
+
+    Keyword arguments:
+        positions, jumps -- As for makemap().
+        tiledir -- The directory to write the tiles into. An OSError is
+            raised if it already exists.
+        max_zoom -- The highest zoom level to draw. The default is 4,
+            at which the map is 16 tiles across.
+        label_zoom -- The lowest zoom level at which system labels are
+            shown. The default is 2.
+        jobs -- The number of processes to write tiles with. The
+            default is 1, meaning that all tiles are written by this
+            process.
+        margin -- The margin width to put around the edges of the map.
+        sys_size -- The radius of the dot representing each star
+            system, in pixels. The default is 5.
+        ssystem_colour, jump_colour, label_colour, label_font,
+            priority -- As for makemap(). Labels that don't fit at a
+            zoom level are left out without comment.
+    Returns:
+        The number of tiles written.
+
+    '''
+    if priority is None:
+        priority = jump_counts(jumps)
+    bounds, syslocs, jumps, jumps_oneway = mapdata(positions, jumps)
+    geometry = tile_geometry(syslocs, jumps, jumps_oneway)
+    pyramid = TilePyramid(bounds, max_zoom, margin)
+    options = {'sys_size': sys_size, 'ssystem_colour': ssystem_colour,
+               'jump_colour': jump_colour, 'label_colour': label_colour,
+               'label_font': label_font}
+
+    os.mkdir(tiledir)
+    with open(os.path.join(tiledir, 'index.html'), 'w',
+              encoding='utf-8') as f:
+        f.write(TILE_VIEWER.format(size=TILE_SIZE, max_zoom=max_zoom))
+
+    if jobs <= 1:
+        tiles = _sort_tiles(geometry, pyramid, sys_size, label_zoom,
+                            priority)
+        return _write_tiles(tiledir, tiles, pyramid, options)
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            # First, each zoom level is sorted out by one process, so
+            # that the labels are placed and the jumps matched to tiles
+            # only once for each level. The highest levels, which take
+            # longest, are started first.
+            levels = [pool.submit(_sort_tiles, geometry, pyramid, sys_size,
+                                  label_zoom, priority, (zoom,))
+                      for zoom in range(max_zoom, -1, -1)]
+            tiles = sorted(tile for level in levels
+                           for tile in level.result())
+            # Then each process writes every jobs-th tile, so that each
+            # gets a share of the busy tiles at every zoom level.
+            tasks = [pool.submit(_write_tiles, tiledir, tiles[part::jobs],
+                                 pyramid, options)
+                     for part in range(jobs)]
+            # This also raises any exception from the workers.
+            return sum(task.result() for task in tasks)
+
+def main(args):
+    '''Generate an SVG map from the command line.
+
+    Unless a database is given with the --db option, the data files
+    are assumed to be in ./dat/ssys/, relative to the current path, so
+    this should be run from the root of the Naev source directory.
+
+    '''
+    parser = argparse.ArgumentParser(description='Create a map of the Naev '
+                                     'universe.')
+    parser.add_argument('--db', metavar='FILE',
+                        help='read the systems and jumps from this database '
+                        '(made by naevdb.py), instead of from the data '
+                        'files')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='write the map to this file instead of to '
+                        'standard output; if it ends in .svgz, the map is '
+                        'compressed')
+    parser.add_argument('--tiles', metavar='DIR',
+                        help='write a pyramid of map tiles into this '
+                        'directory, instead of one map to standard output')
+    parser.add_argument('--max-zoom', type=int, default=4,
+                        help='the highest zoom level of the tiles '
+                        '(default: %(default)s)')
+    parser.add_argument('--label-zoom', type=int, default=2,
+                        help='the lowest zoom level of the tiles to show '
+                        'labels at (default: %(default)s)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='the number of processes to write tiles with '
+                        '(default: %(default)s)')
+    parser.add_argument('--layout', choices=('real', 'force'),
+                        default='real',
+                        help='put the systems at their real positions, or '
+                        'space them out along their jumps with a '
+                        'force-directed layout (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=30,
+                        help='the number of steps of the force-directed '
+                        'layout (default: %(default)s)')
+    parser.add_argument('--territory', action='store_true',
+                        help='shade each system by its dominant faction '
+                        '(needs --db)')
+    parser.add_argument('--sensors', type=float, metavar='STRENGTH',
+                        help='shade each system by how much of it a sensor '
+                        'of this strength detects (needs --db)')
+    parser.add_argument('--route', nargs='+', action='append', default=[],
+                        metavar='SYSTEM',
+                        help='highlight the jumps along a route through '
+                        'these systems; may be given more than once')
+    args = parser.parse_args(args)
+    if (args.territory or args.sensors is not None) and args.db is None:
+        parser.error('--territory and --sensors need a database (--db)')
+    if args.territory and args.sensors is not None:
+        parser.error('--territory and --sensors cannot be used together')
+    if args.tiles is not None and (args.territory or args.route or
+                                   args.sensors is not None):
+        parser.error('--territory, --sensors and --route are not available '
+                     'for tiles')
+
+    territory = None
+    territory_colours = None
+    if args.db is not None:
+        # Only the names, positions and jumps are needed, so read just
+        # those, not whole systems.
+        if not os.path.exists(args.db):
+            raise IOError("database file '{}' does not exist".format(args.db))
+        conn = naevdb.open_db(args.db, in_memory=False, readonly=True)
+        try:
+            positions = naevdb.get_ssys_positions(conn)
+            jumps = naevdb.get_jump_pairs(conn)
+            if args.territory:
+                territory = dominant_factions(
+                    naevdb.get_all_presences(conn))
+            elif args.sensors is not None:
+                territory = sensors.SensorTable.from_db(conn).coverage(
+                    args.sensors)
+                territory_colours = SENSOR_COLOURS
+        finally:
+            conn.close()
+    else:
         # Parse each XML file into a SSystem object.
-        ssystems.append(SSystem(ssysfile))
-    makemap(ssystems)
+        positions, jumps = ssystem_graph(SSystem(ssysfile) for ssysfile
+                                         in datafiles('SSystems'))
+    if args.layout == 'force':
+        positions = maplayout.force_layout(
+            positions, ((origin, dest) for origin, dest, exit_only in jumps),
+            args.iterations)
+
+    if args.tiles is not None:
+        maketiles(positions, jumps, args.tiles, args.max_zoom,
+                  args.label_zoom, args.jobs)
+    else:
+        overlays = {'territory': territory,
+                    'territory_colours': territory_colours,
+                    'highlights': route_highlights(args.route)}
+        if args.output is not None:
+            with open_svg(args.output) as f:
+                makemap(positions, jumps, file=f, **overlays)
+        else:
+            makemap(positions, jumps, **overlays)
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1:])
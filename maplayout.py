@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+'''Schematic layouts of the Naev universe.
+
+The real positions of star systems can make a cluttered map: systems
+bunch up in some places, and long jumps cross over everything else.
+This module computes an alternative layout from the jump graph alone,
+by simulating the systems as particles that push each other apart while
+the jumps between them pull them together. The simulation starts from
+the real positions, so the overall shape of the universe is kept. Use
+it through jumpmap.py, with the --layout option.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import math
+
+# Quadtree cells holding this many particles or fewer are not split any
+# further, and the forces from their particles are worked out one by one
+# when they are close.
+LEAF_SIZE = 8
+
+# Nor are quadtree cells narrower than this (relative to the whole tree),
+# so that systems in the same place can't make the tree infinitely deep.
+MIN_CELL = 1e-9
+
+class QuadTree:
+    '''A Barnes-Hut quadtree of particles.
+
+    Each cell of the tree records the total mass and the centre of mass
+    of the particles within it. The force from a distant cell can then
+    be worked out as if it were a single particle, so the forces on all
+    particles can be found in time proportional to n log n, instead of
+    checking every pair of particles.
+
+    The cells are held in a flat list, indexed by cell number, rather
+    than as objects; the root is cell 0. Each cell is a 7-tuple of the x
+    and y coordinates of its centre of mass, its mass, the x and y
+    coordinates of its lower-left corner, its width, and either a list
+    of the cell numbers of its non-empty quarters or, for a leaf, a
+    tuple of the particles in it.
+
+    '''
+    def __init__(self, xs, ys):
+        '''Build the tree.
+
+        Keyword arguments:
+            xs, ys -- Sequences of the x and y coordinates of each
+                particle. Every particle has a mass of 1.
+
+        '''
+        self.cells = []
+        self.xs, self.ys = xs, ys
+        if xs:
+            left, bottom = min(xs), min(ys)
+            width = max(max(xs) - left, max(ys) - bottom) or 1
+            self._build(list(range(len(xs))), left, bottom, width,
+                        width * MIN_CELL)
+
+    def _build(self, particles, left, bottom, width, min_width):
+        '''Build the cell holding some particles, and those within it.
+
+        Returns:
+            The cell number.
+
+        '''
+        cell = len(self.cells)
+        self.cells.append(None)
+        xs, ys = self.xs, self.ys
+        mass = len(particles)
+
+        if mass <= LEAF_SIZE or width < min_width:
+            self.cells[cell] = (sum(xs[p] for p in particles) / mass,
+                                sum(ys[p] for p in particles) / mass,
+                                mass, left, bottom, width, tuple(particles))
+            return cell
+
+        half = width / 2
+        mid_x, mid_y = left + half, bottom + half
+        quarters = ([], [], [], [])
+        for p in particles:
+            quarters[(xs[p] >= mid_x) + 2 * (ys[p] >= mid_y)].append(p)
+
+        children = []
+        total_x = total_y = 0
+        for i, quarter in enumerate(quarters):
+            if quarter:
+                child = self._build(quarter, left + half * (i & 1),
+                                    bottom + half * (i >> 1), half,
+                                    min_width)
+                children.append(child)
+                child_x, child_y, child_mass = self.cells[child][:3]
+                total_x += child_x * child_mass
+                total_y += child_y * child_mass
+        self.cells[cell] = (total_x / mass, total_y / mass, mass,
+                            left, bottom, width, children)
+        return cell
+
+    def repulsion(self, x, y, strength, theta=1.0):
+        '''Find the total repulsion on a point from all particles.
+
+        Each particle pushes the point away with a force of strength / d,
+        where d is the distance between them. Particles at the point
+        itself are ignored.
+
+        Keyword arguments:
+            x, y -- The point.
+            strength -- The strength of the repulsion.
+            theta -- The accuracy of the approximation. A cell is
+                treated as a single particle if its width divided by its
+                distance from the point is less than this, unless the
+                point is inside the cell. Smaller values are more
+                accurate, but slower.
+        Returns:
+            The force, as a 2-tuple of its x and y components.
+
+        '''
+        cells, xs, ys = self.cells, self.xs, self.ys
+        theta_sq = theta * theta
+        force_x = force_y = 0
+        stack = [0] if cells else []
+        while stack:
+            (centre_x, centre_y, mass, left, bottom, width,
+             contents) = cells[stack.pop()]
+            dx, dy = x - centre_x, y - centre_y
+            dist_sq = dx * dx + dy * dy
+            # A cell holding the point can pass the width test when its
+            # mass lies away from the point, especially with theta > 1,
+            # but the point's own mass must not be counted, so always
+            # look inside such a cell.
+            if (width * width < theta_sq * dist_sq and
+                    not (left <= x <= left + width and
+                         bottom <= y <= bottom + width)):
+                # Far enough away to treat as one particle. A force of
+                # strength / d along the unit vector (dx, dy) / d, from each
+                # particle in the cell.
+                scale = mass / dist_sq
+                force_x += dx * scale
+                force_y += dy * scale
+            elif type(contents) is tuple:
+                # A nearby leaf, so take its particles one by one.
+                for p in contents:
+                    dx, dy = x - xs[p], y - ys[p]
+                    dist_sq = dx * dx + dy * dy
+                    if dist_sq > 0:
+                        force_x += dx / dist_sq
+                        force_y += dy / dist_sq
+            else:
+                stack.extend(contents)
+        return force_x * strength, force_y * strength
+
+def force_layout(positions, jumps, iterations=30, theta=1.2,
+                 edge_length=None):
+    '''Lay out the star systems by their jumps, with a force simulation.
+
+    This is the Fruchterman-Reingold algorithm: every pair of systems
+    repels with a force of k**2 / d, and each pair of systems joined by
+    a jump attracts with a force of d**2 / k, where d is the distance
+    between them and k is the ideal jump length. The repulsion between
+    all pairs is approximated with a Barnes-Hut quadtree (see QuadTree),
+    so each iteration takes time proportional to n log n. Each system
+    may only move a limited distance in each iteration, and this limit
+    shrinks steadily to nothing, so the layout settles down within the
+    given number of iterations. The result depends only on the input.
+
+    Keyword arguments:
+        positions -- A mapping object pairing the name of each system
+            with its starting coordinates, as a 2-tuple; normally the
+            real positions.
+        jumps -- An iterable of 2-tuples, each holding the names of the
+            two systems at the ends of a jump. Jumps involving unknown
+            systems are ignored, as are duplicates (in either direction).
+        iterations -- The number of steps of the simulation. The default
+            is 30; since the simulation starts from the real positions,
+            which are already a reasonable layout, it need not be long.
+        theta -- The accuracy of the repulsion (see
+            QuadTree.repulsion()). The default is 1.2.
+        edge_length -- The ideal jump length. If omitted, the median
+            length of the jumps in the starting layout is used.
+    Returns:
+        A mapping object pairing the name of each system with its new
+        coordinates, as a 2-tuple.
+
+    '''
+    names = list(positions)
+    index = dict((name, i) for i, name in enumerate(names))
+    xs = [float(positions[name][0]) for name in names]
+    ys = [float(positions[name][1]) for name in names]
+
+    edges = set()
+    for origin, dest in jumps:
+        if origin in index and dest in index and origin != dest:
+            i, j = index[origin], index[dest]
+            edges.add((i, j) if i < j else (j, i))
+    edges = sorted(edges)
+
+    if edge_length is None:
+        lengths = sorted(math.hypot(xs[i] - xs[j], ys[i] - ys[j])
+                         for i, j in edges)
+        edge_length = lengths[len(lengths) // 2] if lengths else 1
+    edge_length = edge_length or 1
+    strength = edge_length ** 2
+
+    # Systems in exactly the same place would never be pushed apart, so
+    # nudge them out of the way, by an amount that depends only on their
+    # order.
+    seen = set()
+    for i in range(len(names)):
+        while (xs[i], ys[i]) in seen:
+            xs[i] += edge_length * 0.01 * math.cos(i)
+            ys[i] += edge_length * 0.01 * math.sin(i)
+        seen.add((xs[i], ys[i]))
+
+    for step in range(iterations):
+        # The furthest any system may move in this step.
+        limit = edge_length * (iterations - step) / iterations
+
+        tree = QuadTree(xs, ys)
+        moves = [tree.repulsion(x, y, strength, theta)
+                 for x, y in zip(xs, ys)]
+        move_x = [move[0] for move in moves]
+        move_y = [move[1] for move in moves]
+        for i, j in edges:
+            dx, dy = xs[i] - xs[j], ys[i] - ys[j]
+            # A force of d**2 / k along the unit vector (dx, dy) / d.
+            scale = math.hypot(dx, dy) / edge_length
+            move_x[i] -= dx * scale
+            move_y[i] -= dy * scale
+            move_x[j] += dx * scale
+            move_y[j] += dy * scale
+
+        for i in range(len(xs)):
+            dist = math.hypot(move_x[i], move_y[i])
+            if dist > limit:
+                move_x[i] *= limit / dist
+                move_y[i] *= limit / dist
+            xs[i] += move_x[i]
+            ys[i] += move_y[i]
+
+    return dict((name, (xs[i], ys[i])) for i, name in enumerate(names))
@@ -17,12 +17,52 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+import json
+import math
 import xml.dom.minidom
 
 # Shortcut function to extract the text content from an element.
 nodetext = lambda elem: ''.join(c.data for c in elem.childNodes
                                 if c.nodeType == c.TEXT_NODE)
 
+def canonical(obj):
+    '''Reduce Naev data to a canonical form.
+
+    The canonical form uses only dictionaries, lists, strings, numbers,
+    booleans and None, so it can be serialised as JSON. The objects in
+    this module become dictionaries of their attributes, and sets become
+    sorted lists, so two objects with the same content always give the
+    same canonical form.
+
+    Keyword arguments:
+        obj -- The data to convert. This may be an instance of any of
+            the classes in this module, or a set, mapping, or sequence
+            of them.
+
+    '''
+    if isinstance(obj, (set, frozenset)):
+        return sorted(canonical(item) for item in obj)
+    elif isinstance(obj, dict):
+        return dict((str(key), canonical(val)) for key, val in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return [canonical(item) for item in obj]
+    elif hasattr(obj, '__dict__'):
+        return canonical(vars(obj))
+    else:
+        return obj
+
+def content_hash(obj):
+    '''Get a hash identifying the content of some Naev data.
+
+    Objects with the same canonical form (see canonical()) have the same
+    hash. The result is a string of hexadecimal digits.
+
+    '''
+    text = json.dumps(canonical(obj), sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
 class Coords:
     '''Represents an x-y coordinate pair.
 
@@ -69,9 +109,15 @@ class Jump(Coords):
         hide -- The "hide" value of this jump point, which controls its
             visibility in-game.
         exit_only -- Whether or not this jump point forbids entry.
+        autopos -- Whether or not this jump point is "autopositioned",
+            meaning it is located at a point calculated from the two
+            systems' relative positions in space. The coordinates of an
+            autopositioned jump point are None until calculated (see
+            autoposition_jumps()).
 
     '''
-    def __init__(self, pos, hide=1.25, exit_only=False, dest='ignored'):
+    def __init__(self, pos, hide=1.25, exit_only=False, dest='ignored',
+                 autopos=None):
         '''Construct the jump point.
 
         Keyword arguments:
@@ -80,11 +126,14 @@ class Jump(Coords):
             hide, exit_only -- As the instance attributes. If omitted,
                 they default to 1.25 and False, respectively.
             dest -- This argument is not used and may be omitted.
+            autopos -- As the instance attribute. If omitted, the jump
+                point is autopositioned if its coordinates are None.
 
         '''
         super().__init__(*pos)
         self.hide = float(hide)
         self.exit_only = bool(exit_only)
+        self.autopos = self.x is None if autopos is None else bool(autopos)
 
 
 class Nebula:
@@ -195,6 +244,8 @@ class Asset:
             Presence.
         services -- The services available at this location. An instance
             of Services.
+        techs -- A set of the names of the technology groups (which
+            determine the goods for sale) available at this location.
         virtual -- Whether or not this asset is virtual, as described
             above.
         world_class -- A broad classification of this world's physical
@@ -216,10 +267,12 @@ class Asset:
             self.description = ''
             self.gfx = {}
             self.hide = 0.0
+            self.name = ''
             self.population = 0
             self.pos = Coords()
             self.presence = Presence()
             self.services = Services()
+            self.techs = set()
             self.virtual = True
             self.world_class = None
         else:
@@ -300,6 +353,12 @@ class Asset:
                             except KeyError:
                                 # An absent <land> tag means no-one can land.
                                 pass
+                            # Likewise, an empty tag for any of the simple
+                            # yes-or-no services means it is available.
+                            for service in ('missions', 'outfits', 'refuel',
+                                            'shipyard'):
+                                if services.get(service) == '':
+                                    services[service] = True
 
                             # Build the Services object.
                             self.services = Services(**services)
@@ -429,3 +488,42 @@ class SSystem:
                 # And just in case <nebula> was absent...
                 if self.nebula is None:
                     self.nebula = Nebula()
+
+def autoposition_jumps(ssystems):
+    '''Calculate the positions of all autopositioned jump points.
+
+    An autopositioned jump point lies on the edge of its star system
+    (that is, at a distance of the system's radius from its centre), in
+    the direction of the destination system. The positions of all such
+    jump points are calculated in one pass, and stored in the Jump
+    instances in place.
+
+    Jump points whose destination is not among the star systems given,
+    or lies at the very same location as the origin, are left alone.
+
+    Keyword arguments:
+        ssystems -- An iterable of star systems (SSystem instances).
+    Returns:
+        The number of jump points positioned.
+
+    '''
+    ssystems = list(ssystems)
+    positions = dict((ssys.name, ssys.pos.coords) for ssys in ssystems)
+    hypot = math.hypot
+
+    count = 0
+    for ssys in ssystems:
+        x, y = ssys.pos.coords
+        radius = ssys.radius
+        for dest, jump in ssys.jumps.items():
+            if not jump.autopos or dest not in positions:
+                continue
+            dest_x, dest_y = positions[dest]
+            dx, dy = dest_x - x, dest_y - y
+            dist = hypot(dx, dy)
+            if dist == 0:
+                continue
+            # Scale the vector between the systems to the system radius.
+            jump.x, jump.y = radius * dx / dist, radius * dy / dist
+            count += 1
+    return count
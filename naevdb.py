@@ -18,14 +18,23 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # Standard library imports.
+import argparse
 from collections import defaultdict
+import csv
+from functools import lru_cache
+import gzip
+from itertools import groupby
+import json
 import os
 import sqlite3 as db
 import sys
+from urllib.request import pathname2url
 
 # Local imports.
 from dataloader import datafiles
-from naevdata import Asset, Jump, SSystem
+import jumpgraph
+from naevdata import (Asset, Coords, Jump, Presence, Services, SSystem,
+                      autoposition_jumps)
 
 def adapt_boolean(boolean):
     '''Adapt (i.e. map from Python to SQLite3) boolean values.'''
@@ -34,9 +43,125 @@ db.register_adapter(bool, adapt_boolean)
 
 def convert_boolean(bool_column):
     '''Convert (i.e. map from SQLite3 to Python) boolean values.'''
-    return bool(bool_column)
+    # The value arrives as a bytes object, such as b'0', so it must be
+    # converted to an integer first.
+    return bool(int(bool_column))
 db.register_converter('BOOLEAN', convert_boolean)
 
+@lru_cache(maxsize=None)
+def _expected_schema():
+    '''Get the tables and columns that make_db() creates.
+
+    Returns:
+        A mapping object pairing each table name with a tuple of the
+        names of its columns.
+
+    '''
+    conn = db.connect(':memory:')
+    try:
+        make_db(conn)
+        return _schema(conn)
+    finally:
+        conn.close()
+
+def _schema(conn):
+    '''Get the tables and columns of an open database (as above).'''
+    cur = conn.cursor()
+    cur.execute('''SELECT name FROM sqlite_master
+                   WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ''')
+    tables = [row[0] for row in cur]
+    return dict((table, tuple(row[1] for row in
+                              cur.execute('PRAGMA table_info({})'.format(
+                                  table))))
+                for table in tables)
+
+def check_schema(conn, filename):
+    '''Make sure a database has every table and column this module reads.
+
+    Databases made by older versions of this module lack some of them,
+    and the data that would go in them, so they can't simply be added.
+
+    Keyword arguments:
+        conn -- An open connection to the database.
+        filename -- The name of the database file, for the error message.
+    Raises:
+        IOError -- If anything is missing.
+
+    '''
+    found = _schema(conn)
+    missing = []
+    for table, columns in sorted(_expected_schema().items()):
+        if table not in found:
+            missing.append(table)
+        else:
+            missing.extend('{}.{}'.format(table, column)
+                           for column in columns
+                           if column not in found[table])
+    if missing:
+        raise IOError("database file '{}' was made by an older version of "
+                      "naevdb.py (it has no {}); rebuild it with "
+                      "naevdb.py".format(filename, ', '.join(missing)))
+
+def open_db(filename, in_memory=True, readonly=False, threadsafe=False):
+    '''Open an existing database, ready for reading.
+
+    The connection converts BOOLEAN columns to Python booleans, and
+    returns rows as sqlite3.Row objects, so that columns can be looked
+    up by name (as the get_* functions in this module require). A
+    database made by an older version of this module is rejected with
+    an IOError (see check_schema()), rather than failing part way
+    through reading it.
+
+    Keyword arguments:
+        filename -- The database file to open.
+        in_memory -- If true (the default), the whole database is copied
+            into memory and the file is closed again, which makes the
+            many small queries of a read-heavy workload much faster.
+            Changes to the in-memory copy are not saved. If false, the
+            file is opened directly.
+        readonly -- If true, and the file is opened directly, it is
+            opened in read-only mode. The default is false.
+        threadsafe -- If true, the connection may be used from threads
+            other than the one that opened it, though only by one thread
+            at a time. The default is false.
+    Returns:
+        An open database connection.
+
+    '''
+    # Connecting to a non-existent file would create an empty database.
+    if not os.path.exists(filename):
+        raise IOError("database file '{}' does not exist".format(filename))
+
+    if in_memory:
+        disk_conn = db.connect(filename)
+        try:
+            # Check before copying anything.
+            check_schema(disk_conn, filename)
+            conn = db.connect(':memory:', detect_types=db.PARSE_DECLTYPES,
+                              check_same_thread=not threadsafe)
+            disk_conn.backup(conn)
+        finally:
+            disk_conn.close()
+        # The copy is ours to change, so make sure it can be searched
+        # quickly, even if the file was created without any indexes.
+        make_indexes(conn)
+    elif readonly:
+        uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(filename)))
+        conn = db.connect(uri, uri=True, detect_types=db.PARSE_DECLTYPES,
+                          check_same_thread=not threadsafe)
+    else:
+        conn = db.connect(filename, detect_types=db.PARSE_DECLTYPES,
+                          check_same_thread=not threadsafe)
+    if not in_memory:
+        try:
+            check_schema(conn, filename)
+        except BaseException:
+            conn.close()
+            raise
+
+    conn.row_factory = db.Row
+    return conn
+
 def make_db(conn):
     '''Create an empty database.'''
     cur = conn.cursor()
@@ -63,6 +188,7 @@ def make_db(conn):
                    , JumpPosY REAL
                    , JumpHide REAL NOT NULL
                    , JumpIsExitOnly BOOLEAN NOT NULL
+                   , JumpIsAutoPos BOOLEAN NOT NULL DEFAULT 0
                    )''')
     cur.execute('''CREATE TABLE Assets (
                      AssetID INTEGER PRIMARY KEY AUTOINCREMENT
@@ -86,6 +212,22 @@ def make_db(conn):
                    , AssetHasMissions BOOLEAN
                    , AssetHasOutfits BOOLEAN
                    , AssetHasShipyard BOOLEAN
+                   , AssetHasCommodities BOOLEAN
+                   , AssetDescription TEXT
+                   )''')
+    cur.execute('''CREATE TABLE AssetCommodities (
+                     AssetID INTEGER NOT NULL
+                     REFERENCES Assets
+                       ON DELETE CASCADE
+                   , Commodity TEXT NOT NULL
+                   , PRIMARY KEY (AssetID, Commodity)
+                   )''')
+    cur.execute('''CREATE TABLE AssetTechs (
+                     AssetID INTEGER NOT NULL
+                     REFERENCES Assets
+                       ON DELETE CASCADE
+                   , Tech TEXT NOT NULL
+                   , PRIMARY KEY (AssetID, Tech)
                    )''')
     cur.execute('''CREATE TABLE VirtualAssets (
                      VAssetID INTEGER PRIMARY KEY AUTOINCREMENT
@@ -103,6 +245,28 @@ def make_db(conn):
                        ON DELETE CASCADE
                    , PRIMARY KEY (SSysID, VAssetID)
                    )''')
+    cur.execute('''CREATE TABLE NearestServices (
+                     SSysID INTEGER NOT NULL
+                     REFERENCES SSystems
+                       ON DELETE CASCADE
+                   , Service TEXT NOT NULL
+                   , Distance INTEGER NOT NULL
+                   , AssetID INTEGER NOT NULL
+                     REFERENCES Assets
+                       ON DELETE CASCADE
+                   , PRIMARY KEY (SSysID, Service)
+                   )''')
+    make_indexes(conn)
+
+def make_indexes(conn):
+    '''Create the indexes used for looking up data in a database.'''
+    cur = conn.cursor()
+    cur.execute('''CREATE INDEX IF NOT EXISTS SSysNameIdx
+                   ON SSystems (SSysName)''')
+    cur.execute('''CREATE INDEX IF NOT EXISTS JumpFromIdx
+                   ON Jumps (JumpFromID)''')
+    cur.execute('''CREATE INDEX IF NOT EXISTS AssetSSysIdx
+                   ON Assets (SSysID)''')
 
 def store_ssys(conn, ssys):
     '''Store a star system in an open database.'''
@@ -125,12 +289,12 @@ def store_jumps(conn, ssys):
         to_id = get_ssys_id(conn, jumpdest)
         cur.execute('''INSERT INTO Jumps (
                          JumpFromID, JumpToID, JumpPosX, JumpPosY,
-                         JumpHide, JumpIsExitOnly
+                         JumpHide, JumpIsExitOnly, JumpIsAutoPos
                        ) VALUES (
                          ?, ?, ?, ?
-                       , ?, ?
+                       , ?, ?, ?
                        )''', (from_id, to_id, jump.x, jump.y,
-                              jump.hide, jump.exit_only))
+                              jump.hide, jump.exit_only, jump.autopos))
 
 def store_asset(conn, asset, ssys=None):
     '''Store an asset (virtual or not) in an open database.'''
@@ -144,6 +308,7 @@ def store_asset(conn, asset, ssys=None):
                        )''', (asset.name, asset.presence.faction,
                               asset.presence.value, asset.presence.range))
     else:
+        commodities = asset.services.commodities
         cur.execute('''INSERT INTO Assets (
                          AssetName, SSysID, AssetSpaceGfx, AssetExteriorGfx
                        , AssetPosX, AssetPosY
@@ -151,6 +316,7 @@ def store_asset(conn, asset, ssys=None):
                        , AssetClass, AssetPopulation, AssetHide
                        , AssetLandingRights, AssetHasRefuel, AssetBarDesc
                        , AssetHasMissions, AssetHasOutfits, AssetHasShipyard
+                       , AssetHasCommodities, AssetDescription
                        ) VALUES (
                          ?, ?, ?, ?
                        , ?, ?
@@ -158,6 +324,7 @@ def store_asset(conn, asset, ssys=None):
                        , ?, ?, ?
                        , ?, ?, ?
                        , ?, ?, ?
+                       , ?, ?
                        )''',
                     (asset.name, get_ssys_id(conn, ssys),
                      asset.gfx.get('space'), asset.gfx.get('exterior'),
@@ -166,7 +333,16 @@ def store_asset(conn, asset, ssys=None):
                      asset.world_class, asset.population, asset.hide,
                      asset.services.land, asset.services.refuel,
                      asset.services.bar, asset.services.missions,
-                     asset.services.outfits, asset.services.shipyard))
+                     asset.services.outfits, asset.services.shipyard,
+                     commodities is not None, asset.description))
+        asset_id = cur.lastrowid
+        cur.executemany('''INSERT INTO AssetCommodities (AssetID, Commodity)
+                           VALUES (?, ?)''',
+                        ((asset_id, commodity)
+                         for commodity in commodities or ()))
+        cur.executemany('''INSERT INTO AssetTechs (AssetID, Tech)
+                           VALUES (?, ?)''',
+                        ((asset_id, tech) for tech in asset.techs))
 
 def store_vasset_location(conn, ssys, vasset):
     '''Record a location of a virtual asset in an open database.'''
@@ -226,12 +402,14 @@ def _get_ssys_extras(conn, ssys, ssys_id):
     cur.execute('''SELECT
                      s.SSysName
                    , j.JumpPosX, j.JumpPosY, j.JumpHide, j.JumpIsExitOnly
+                   , j.JumpIsAutoPos
                    FROM
                      SSystems s JOIN
                      Jumps j ON s.SSysID = j.JumpToID
                    WHERE j.JumpFromID = ?''', (ssys_id,))
     for row in cur:
-        ssys.jumps[row[0]] = Jump((row[1], row[2]), row[3], row[4])
+        ssys.jumps[row[0]] = Jump((row[1], row[2]), row[3], row[4],
+                                  autopos=row[5])
 
     # Get the system asset data.
     cur.execute('SELECT AssetName FROM Assets WHERE SSysID = ?', (ssys_id,))
@@ -249,16 +427,18 @@ def get_ssystems(conn):
     ssystems = []
     cur = conn.cursor()
     cur.execute('''SELECT
-                     SSysID, SSysPosX, SSysPosY, SSysRadius, SSysStars
-                   , SSysInterference, SSysNebulaDensity, SSysNebulaVolatility
+                     SSysID, SSysName, SSysPosX, SSysPosY, SSysRadius
+                   , SSysStars, SSysInterference
+                   , SSysNebulaDensity, SSysNebulaVolatility
                    FROM SSystems''')
     for row in cur:
         ssys = SSystem()
+        ssys.name = row['SSysName']
         ssys.pos.x, ssys.pos.y = row['SSysPosX'], row['SSysPosY']
         ssys.radius, ssys.stars = row['SSysRadius'], row['SSysStars']
         ssys.interference = row['SSysInterference']
         ssys.nebula.density = row['SSysNebulaDensity']
-        ssys.nebula.volatility = row['SSysNebulaDensity']
+        ssys.nebula.volatility = row['SSysNebulaVolatility']
 
         ssys_id = row['SSysID']
         _get_ssys_extras(conn, ssys, ssys_id)
@@ -289,12 +469,183 @@ def get_ssys(conn, name):
         ssys.radius, ssys.stars = row['SSysRadius'], row['SSysStars']
         ssys.interference = row['SSysInterference']
         ssys.nebula.density = row['SSysNebulaDensity']
-        ssys.nebula.volatility = row['SSysNebulaDensity']
+        ssys.nebula.volatility = row['SSysNebulaVolatility']
 
     _get_ssys_extras(conn, ssys, ssys_id)
 
     return ssys
 
+def get_ssys_positions(conn):
+    '''Get the positions of all star systems in an open database.
+
+    Returns:
+        A mapping object pairing the name of each star system with its
+        coordinates, as a 2-tuple.
+
+    '''
+    cur = conn.cursor()
+    cur.execute('SELECT SSysName, SSysPosX, SSysPosY FROM SSystems')
+    return dict((row[0], (row[1], row[2])) for row in cur)
+
+def get_jump_pairs(conn):
+    '''Get all jumps in an open database, without their details.
+
+    Returns:
+        A list of 3-tuples, each holding the names of the origin and
+        destination systems of a jump, and whether it is exit-only.
+
+    '''
+    cur = conn.cursor()
+    cur.execute('''SELECT s1.SSysName, s2.SSysName, j.JumpIsExitOnly
+                   FROM
+                     Jumps j JOIN
+                     SSystems s1 ON s1.SSysID = j.JumpFromID JOIN
+                     SSystems s2 ON s2.SSysID = j.JumpToID
+                   ORDER BY j.JumpID''')
+    return [(row[0], row[1], row[2]) for row in cur]
+
+def _asset_from_row(row, commodities, techs):
+    '''Reconstruct a (non-virtual) asset from its database row.
+
+    Keyword arguments:
+        row -- The row of the Assets table for this asset.
+        commodities -- The set of commodities traded here, or None if
+            commodity trading is not available.
+        techs -- The set of technology groups available here.
+
+    '''
+    asset = Asset(None)
+    asset.name = row['AssetName']
+    asset.description = row['AssetDescription'] or ''
+    asset.gfx = dict((purpose, row[column])
+                     for purpose, column in (('space', 'AssetSpaceGfx'),
+                                             ('exterior', 'AssetExteriorGfx'))
+                     if row[column] is not None)
+    asset.hide = row['AssetHide']
+    asset.population = row['AssetPopulation']
+    asset.pos = Coords(row['AssetPosX'], row['AssetPosY'])
+    asset.presence = Presence(row['AssetFaction'])
+    if row['AssetPresence'] is not None:
+        asset.presence.value = row['AssetPresence']
+    if row['AssetPresenceRange'] is not None:
+        asset.presence.range = row['AssetPresenceRange']
+    asset.services = Services(row['AssetBarDesc'], commodities,
+                              row['AssetLandingRights'],
+                              row['AssetHasMissions'], row['AssetHasOutfits'],
+                              row['AssetHasRefuel'], row['AssetHasShipyard'])
+    asset.techs = techs
+    asset.virtual = False
+    asset.world_class = row['AssetClass']
+    return asset
+
+def _vasset_from_row(row):
+    '''Reconstruct a virtual asset from its database row.'''
+    asset = Asset(None)
+    asset.name = row['VAssetName']
+    asset.presence = Presence(row['VAssetFaction'], row['VAssetPresence'],
+                              row['VAssetPresenceRange'])
+    return asset
+
+def get_assets(conn):
+    '''Get all assets from an open database.
+
+    Everything is read in a fixed number of queries, however many
+    assets there are.
+
+    Returns:
+        A mapping object pairing each asset name with a 2-tuple, which
+        holds the asset (an instance of Asset) and a list of the names
+        of the star systems where it is present.
+
+    '''
+    cur = conn.cursor()
+
+    # Gather up the commodities and technologies of every concrete asset.
+    commodities = defaultdict(set)
+    cur.execute('SELECT AssetID, Commodity FROM AssetCommodities')
+    for row in cur:
+        commodities[row[0]].add(row[1])
+    techs = defaultdict(set)
+    cur.execute('SELECT AssetID, Tech FROM AssetTechs')
+    for row in cur:
+        techs[row[0]].add(row[1])
+
+    assets = {}
+    cur.execute('''SELECT a.*, s.SSysName
+                   FROM
+                     Assets a LEFT JOIN
+                     SSystems s ON s.SSysID = a.SSysID
+                   ORDER BY a.AssetID''')
+    for row in cur:
+        asset_id = row['AssetID']
+        asset = _asset_from_row(row,
+                                (commodities.get(asset_id, set())
+                                 if row['AssetHasCommodities'] else None),
+                                techs.get(asset_id, set()))
+        assets[asset.name] = (asset, ([] if row['SSysName'] is None else
+                                      [row['SSysName']]))
+
+    # Virtual assets may be present in any number of systems.
+    vassets = {}
+    cur.execute('SELECT * FROM VirtualAssets ORDER BY VAssetID')
+    for row in cur:
+        asset = _vasset_from_row(row)
+        vassets[row['VAssetID']] = assets[asset.name] = (asset, [])
+    cur.execute('''SELECT sv.VAssetID, s.SSysName
+                   FROM
+                     SSysVAssets sv JOIN
+                     SSystems s ON s.SSysID = sv.SSysID
+                   ORDER BY sv.SSysID''')
+    for row in cur:
+        vassets[row[0]][1].append(row[1])
+
+    return assets
+
+def get_asset(conn, name):
+    '''Get the named asset from an open database.
+
+    Returns:
+        A 2-tuple holding the asset and a list of the names of the star
+        systems where it is present (as for get_assets()), or None if
+        there is no such asset.
+
+    '''
+    cur = conn.cursor()
+
+    # As in get_assets(), a virtual asset hides a concrete one of the same
+    # name.
+    cur.execute('SELECT * FROM VirtualAssets WHERE VAssetName = ?', (name,))
+    row = cur.fetchone()
+    if row is not None:
+        asset = _vasset_from_row(row)
+        cur.execute('''SELECT s.SSysName
+                       FROM
+                         SSysVAssets sv JOIN
+                         SSystems s ON s.SSysID = sv.SSysID
+                       WHERE sv.VAssetID = ?
+                       ORDER BY sv.SSysID''', (row['VAssetID'],))
+        return asset, [row[0] for row in cur]
+
+    cur.execute('''SELECT a.*, s.SSysName
+                   FROM
+                     Assets a LEFT JOIN
+                     SSystems s ON s.SSysID = a.SSysID
+                   WHERE a.AssetName = ?''', (name,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+
+    asset_id = row['AssetID']
+    commodities = None
+    if row['AssetHasCommodities']:
+        cur.execute('SELECT Commodity FROM AssetCommodities WHERE AssetID = ?',
+                    (asset_id,))
+        commodities = set(comm_row[0] for comm_row in cur)
+    cur.execute('SELECT Tech FROM AssetTechs WHERE AssetID = ?', (asset_id,))
+    techs = set(tech_row[0] for tech_row in cur)
+    return (_asset_from_row(row, commodities, techs),
+            [] if row['SSysName'] is None else [row['SSysName']])
+
 def get_ssys_presence(conn, name):
     '''Get the faction presences in the named system.'''
     presences = defaultdict(float)
@@ -322,8 +673,365 @@ def get_ssys_presence(conn, name):
 
     return presences
 
-def build_db(filename):
-    '''Create and populate the Naev database.'''
+# A query giving every faction presence in every system, from concrete and
+# virtual assets alike, as rows of SSysID, Faction, Value and Range. Use it
+# as a subquery.
+PRESENCE_ROWS = '''SELECT
+                     SSysID
+                   , AssetFaction AS Faction
+                   , AssetPresence AS Value
+                   , AssetPresenceRange AS Range
+                   FROM Assets
+                   WHERE AssetFaction IS NOT NULL
+                   UNION ALL
+                   SELECT
+                     sv.SSysID
+                   , v.VAssetFaction
+                   , v.VAssetPresence
+                   , v.VAssetPresenceRange
+                   FROM VirtualAssets v JOIN
+                     SSysVAssets sv ON v.VAssetID = sv.VAssetID'''
+
+def get_all_presences(conn):
+    '''Get the faction presences in every system at once.
+
+    This gives the same result as calling get_ssys_presence() for each
+    system, but with one query for the whole universe.
+
+    Returns:
+        A mapping object pairing the name of each system that has any
+        faction presence with its presences, as for get_ssys_presence().
+
+    '''
+    presences = defaultdict(lambda: defaultdict(float))
+    cur = conn.cursor()
+    cur.execute('''SELECT s.SSysName, p.Faction, p.Range, SUM(p.Value)
+                   FROM
+                     ({}) p JOIN
+                     SSystems s ON s.SSysID = p.SSysID
+                   GROUP BY p.SSysID, p.Faction, p.Range'''.format(
+                       PRESENCE_ROWS))
+    for row in cur:
+        presences[row[0]][(row[1], row[2])] += row[3]
+    return presences
+
+# The services recorded in the NearestServices table, and the column of the
+# Assets table that shows whether an asset offers each. Each commodity is a
+# service as well, named with COMMODITY_PREFIX followed by the commodity.
+SERVICE_COLUMNS = {'refuel': 'AssetHasRefuel',
+                   'missions': 'AssetHasMissions',
+                   'outfits': 'AssetHasOutfits',
+                   'shipyard': 'AssetHasShipyard'}
+COMMODITY_PREFIX = 'commodity:'
+
+def _service_providers(conn):
+    '''Find the assets in each system that offer each service.
+
+    Only assets that can be landed on are counted. Where a system has
+    more than one, the first by name is taken.
+
+    Returns:
+        A mapping object pairing each service with a mapping object
+        that pairs the names of the systems offering it (in order of
+        name) with the ID of the asset that offers it there.
+
+    '''
+    providers = defaultdict(dict)
+    cur = conn.cursor()
+    for service, column in sorted(SERVICE_COLUMNS.items()):
+        cur.execute('''SELECT s.SSysName, a.AssetID
+                       FROM
+                         Assets a JOIN
+                         SSystems s ON s.SSysID = a.SSysID
+                       WHERE a.AssetLandingRights IS NOT NULL AND a.{}
+                       ORDER BY s.SSysName, a.AssetName'''.format(column))
+        for row in cur:
+            providers[service].setdefault(row[0], row[1])
+    cur.execute('''SELECT c.Commodity, s.SSysName, a.AssetID
+                   FROM
+                     AssetCommodities c JOIN
+                     Assets a ON a.AssetID = c.AssetID JOIN
+                     SSystems s ON s.SSysID = a.SSysID
+                   WHERE a.AssetLandingRights IS NOT NULL
+                   ORDER BY c.Commodity, s.SSysName, a.AssetName''')
+    for row in cur:
+        providers[COMMODITY_PREFIX + row[0]].setdefault(row[1], row[2])
+    return providers
+
+def store_nearest_services(conn):
+    '''Work out the nearest place offering each service, from every system.
+
+    Each service is found with one breadth-first search, starting from
+    every system that offers it at once (see jumpgraph.JumpGraph), and
+    the results are stored in the NearestServices table, replacing any
+    already there. Looking up the nearest service is then a matter of
+    reading one row (see get_nearest_service()).
+
+    '''
+    graph = jumpgraph.JumpGraph(get_ssys_positions(conn),
+                                get_jump_pairs(conn))
+    cur = conn.cursor()
+    cur.execute('SELECT SSysName, SSysID FROM SSystems')
+    ssys_ids = dict((row[0], row[1]) for row in cur)
+
+    cur.execute('DELETE FROM NearestServices')
+    for service, providers in sorted(_service_providers(conn).items()):
+        nearest = graph.nearest(providers)
+        cur.executemany('''INSERT INTO NearestServices (
+                             SSysID, Service, Distance, AssetID
+                           ) VALUES (
+                             ?, ?, ?, ?
+                           )''',
+                        ((ssys_ids[name], service, distance, asset_id)
+                         for name, (distance, asset_id) in nearest.items()))
+
+def get_nearest_service(conn, name, service):
+    '''Find the nearest place offering a service, from a star system.
+
+    The NearestServices table must have been filled in first (see
+    store_nearest_services()); build_db() does this.
+
+    Keyword arguments:
+        conn -- An open database connection.
+        name -- The name of the star system to start from.
+        service -- One of the keys of SERVICE_COLUMNS, or a commodity
+            name prefixed with COMMODITY_PREFIX.
+    Returns:
+        A 3-tuple of the number of jumps to the nearest system offering
+        the service, and the names of that system and the asset there
+        that offers it; or None, if the service can't be reached.
+
+    '''
+    cur = conn.cursor()
+    cur.execute('''SELECT n.Distance, t.SSysName, a.AssetName
+                   FROM
+                     SSystems s JOIN
+                     NearestServices n ON n.SSysID = s.SSysID JOIN
+                     Assets a ON a.AssetID = n.AssetID JOIN
+                     SSystems t ON t.SSysID = a.SSysID
+                   WHERE s.SSysName = ? AND n.Service = ?''', (name, service))
+    row = cur.fetchone()
+    return None if row is None else (row[0], row[1], row[2])
+
+# Number of rows fetched from the database at a time when exporting, and the
+# number of output lines gathered up before each write.
+EXPORT_BATCH_SIZE = 1000
+
+# Known export formats.
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+def _iter_rows(cur, size=EXPORT_BATCH_SIZE):
+    '''Iterate over the results of a cursor, fetching them in batches.'''
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+def get_table_names(conn):
+    '''Get the names of all tables in an open database.'''
+    cur = conn.cursor()
+    cur.execute('''SELECT name FROM sqlite_master
+                   WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+                   ORDER BY name''')
+    return [row[0] for row in cur]
+
+def iter_table(conn, table):
+    '''Iterate over every row of a table in an open database.
+
+    The rows are read lazily from the database, so only a small batch
+    of them is held in memory at any one time.
+
+    Keyword arguments:
+        conn -- An open database connection.
+        table -- The name of the table to read.
+    Returns:
+        A 2-tuple of the table's column names and an iterator over its
+        rows, each given as a tuple of values.
+
+    '''
+    if table not in get_table_names(conn):
+        raise ValueError("no such table '{}'".format(table))
+
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM "{}" ORDER BY rowid'.format(table))
+    columns = [col[0] for col in cur.description]
+    return columns, _iter_rows(cur)
+
+def iter_ssys_records(conn):
+    '''Iterate over denormalised star system records.
+
+    Each record is a dictionary holding the columns of the SSystems
+    table, along with the jumps from that system (under the key
+    'Jumps', as a list of dictionaries naming the destination in
+    'JumpTo') and the names of the assets, virtual or not, present
+    there (under the key 'Assets').
+
+    The systems, jumps and assets are read in step, each ordered by
+    system, so that only one system's records are held in memory at
+    any one time.
+
+    '''
+    sys_cur = conn.cursor()
+    sys_cur.execute('SELECT * FROM SSystems ORDER BY SSysID')
+    sys_columns = [col[0] for col in sys_cur.description]
+
+    jump_cur = conn.cursor()
+    jump_cur.execute('''SELECT
+                          j.JumpFromID, s.SSysName
+                        , j.JumpPosX, j.JumpPosY, j.JumpHide, j.JumpIsExitOnly
+                        , j.JumpIsAutoPos
+                        FROM
+                          Jumps j JOIN
+                          SSystems s ON s.SSysID = j.JumpToID
+                        ORDER BY j.JumpFromID, s.SSysName''')
+    jump_columns = [col[0] for col in jump_cur.description][2:]
+
+    asset_cur = conn.cursor()
+    asset_cur.execute('''SELECT SSysID, AssetName AS Name FROM Assets
+                         UNION ALL
+                         SELECT sv.SSysID, v.VAssetName
+                         FROM VirtualAssets v JOIN
+                              SSysVAssets sv ON v.VAssetID = sv.VAssetID
+                         ORDER BY SSysID, Name''')
+
+    # Group the jumps and assets by system. Both are ordered by system ID,
+    # just like the systems themselves, so we can step through all three
+    # together.
+    first = lambda row: row[0]
+    jump_groups = groupby(_iter_rows(jump_cur), first)
+    asset_groups = groupby(_iter_rows(asset_cur), first)
+    next_jumps = next(jump_groups, None)
+    next_assets = next(asset_groups, None)
+
+    for row in _iter_rows(sys_cur):
+        record = dict(zip(sys_columns, row))
+        ssys_id = record['SSysID']
+
+        record['Jumps'] = []
+        # Skip any jumps from systems that don't exist.
+        while next_jumps is not None and next_jumps[0] < ssys_id:
+            next_jumps = next(jump_groups, None)
+        if next_jumps is not None and next_jumps[0] == ssys_id:
+            for jump in next_jumps[1]:
+                jump_record = dict(zip(jump_columns, jump[2:]))
+                jump_record['JumpTo'] = jump[1]
+                record['Jumps'].append(jump_record)
+            next_jumps = next(jump_groups, None)
+
+        record['Assets'] = []
+        while next_assets is not None and next_assets[0] < ssys_id:
+            next_assets = next(asset_groups, None)
+        if next_assets is not None and next_assets[0] == ssys_id:
+            record['Assets'].extend(asset[1] for asset in next_assets[1])
+            next_assets = next(asset_groups, None)
+
+        yield record
+
+def _open_export(filename, compress=False):
+    '''Open an export file for writing, optionally gzip-compressed.'''
+    if compress:
+        return gzip.open(filename, 'wt', encoding='utf-8', newline='')
+    else:
+        return open(filename, 'w', encoding='utf-8', newline='',
+                    buffering=2 ** 16)
+
+def _write_batched(lines, out):
+    '''Write lines of text to a file in batches.'''
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            out.write(''.join(batch))
+            batch = []
+    if batch:
+        out.write(''.join(batch))
+
+def _jsonl_lines(records):
+    '''Format dictionaries as lines of JSON.'''
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+def _write_csv(columns, rows, out):
+    '''Write a header and rows of values to a CSV file in batches.'''
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            writer.writerows(batch)
+            batch = []
+    writer.writerows(batch)
+
+def export_db(conn, filename, fmt='jsonl', denormalise=False, compress=None):
+    '''Export the contents of an open database.
+
+    The data is streamed from the database to the output, so memory use
+    does not grow with the size of the universe.
+
+    Keyword arguments:
+        conn -- An open database connection.
+        filename -- Where to write the exported data. For a CSV export
+            of every table, this names a directory to be created, which
+            will hold one file per table; otherwise it is the name of
+            a single file.
+        fmt -- Either 'jsonl' (the default) for JSON Lines output, or
+            'csv' for comma-separated values.
+        denormalise -- If true, export one record for each star system,
+            including its jumps and assets (see iter_ssys_records). If
+            false (the default), export every row of every table; in
+            JSON Lines output, each row records its table name under
+            the key 'table'.
+        compress -- Whether or not to gzip-compress the output. If
+            omitted, output is compressed if the filename ends in .gz.
+
+    '''
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("unknown export format '{}'".format(fmt))
+    if compress is None:
+        compress = filename.endswith('.gz')
+
+    if fmt == 'jsonl':
+        if denormalise:
+            records = iter_ssys_records(conn)
+        else:
+            records = (dict([('table', table)] + list(zip(columns, row)))
+                       for table in get_table_names(conn)
+                       for columns, rows in [iter_table(conn, table)]
+                       for row in rows)
+        with _open_export(filename, compress) as out:
+            _write_batched(_jsonl_lines(records), out)
+    elif denormalise:
+        # Flatten the lists of jumps and assets into single columns.
+        columns, _ = iter_table(conn, 'SSystems')
+        def rows():
+            for record in iter_ssys_records(conn):
+                jumps = ';'.join(jump['JumpTo']
+                                 for jump in record.pop('Jumps'))
+                assets = ';'.join(record.pop('Assets'))
+                yield [record[col] for col in columns] + [jumps, assets]
+        with _open_export(filename, compress) as out:
+            _write_csv(columns + ['Jumps', 'Assets'], rows(), out)
+    else:
+        os.mkdir(filename)
+        ext = '.csv.gz' if compress else '.csv'
+        for table in get_table_names(conn):
+            columns, rows = iter_table(conn, table)
+            with _open_export(os.path.join(filename, table + ext),
+                              compress) as out:
+                _write_csv(columns, rows, out)
+
+def build_db(filename, autopos=False):
+    '''Create and populate the Naev database.
+
+    Keyword arguments:
+        filename -- The name of the database file to create.
+        autopos -- If true, calculate the positions of autopositioned
+            jump points (see naevdata.autoposition_jumps) and store
+            them. If false (the default), store them without positions.
+
+    '''
     with db.connect(filename) as conn:
         make_db(conn)
 
@@ -356,6 +1064,8 @@ def build_db(filename):
             store_asset(conn, asset, asset_ssys)
 
         # Store the jumps between systems, and the locations of virtual assets.
+        if autopos:
+            autoposition_jumps(ssystems)
         for ssys in ssystems:
             store_jumps(conn, ssys)
             for asset_name in ssys.assets:
@@ -370,14 +1080,83 @@ def build_db(filename):
                 if this_asset.virtual:
                     store_vasset_location(conn, ssys, this_asset)
 
+        # Work out where the nearest services are, now that the jumps are in.
+        store_nearest_services(conn)
+
+def _export_main(args):
+    '''Export an existing database from the command line.'''
+    parser = argparse.ArgumentParser(prog='naevdb.py export',
+                                     description='Export a Naev database.')
+    parser.add_argument('dbfile', help='the database to export')
+    parser.add_argument('output', help='the file (or, for a CSV export of '
+                        'every table, the directory) to write')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl',
+                        help='the output format (default: %(default)s)')
+    parser.add_argument('--systems', action='store_true',
+                        help='export one denormalised record per system')
+    parser.add_argument('--gzip', action='store_true', default=None,
+                        help='compress the output (default: only if the '
+                        'output name ends in .gz)')
+    args = parser.parse_args(args)
+
+    if not os.path.exists(args.dbfile):
+        raise IOError("database file '{}' does not exist".format(args.dbfile))
+    if os.path.exists(args.output):
+        raise IOError("output file '{}' already exists".format(args.output))
+
+    conn = db.connect(args.dbfile, detect_types=db.PARSE_DECLTYPES)
+    try:
+        export_db(conn, args.output, args.format, args.systems, args.gzip)
+    finally:
+        conn.close()
+
+def _nearest_main(args):
+    '''Look up the nearest service in an existing database.'''
+    parser = argparse.ArgumentParser(prog='naevdb.py nearest',
+                                     description='Find the nearest place '
+                                     'offering a service.')
+    parser.add_argument('dbfile', help='the database to search')
+    parser.add_argument('ssys', help='the star system to start from')
+    parser.add_argument('service', help='the service to look for: one of {}, '
+                        'or {}NAME for a commodity'.format(
+                            ', '.join(sorted(SERVICE_COLUMNS)),
+                            COMMODITY_PREFIX))
+    args = parser.parse_args(args)
+
+    conn = open_db(args.dbfile, in_memory=False, readonly=True)
+    try:
+        if get_ssys_id(conn, args.ssys) is None:
+            raise ValueError("no star system named '{}'".format(args.ssys))
+        nearest = get_nearest_service(conn, args.ssys, args.service)
+    finally:
+        conn.close()
+
+    if nearest is None:
+        print("No {} can be reached from {}.".format(args.service, args.ssys))
+    else:
+        distance, ssys, asset = nearest
+        print('{} ({}): {} jump{}'.format(asset, ssys, distance,
+                                          '' if distance == 1 else 's'))
+
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['export']:
+        _export_main(sys.argv[2:])
+        sys.exit()
+    elif sys.argv[1:2] == ['nearest']:
+        _nearest_main(sys.argv[2:])
+        sys.exit()
+
     # Create the database at the location given on the command line.
-    try:
-        filename = sys.argv[1]
-    except IndexError:
-        filename = 'naev.db'
+    parser = argparse.ArgumentParser(description='Compile the Naev data '
+                                     'files into a database.')
+    parser.add_argument('filename', nargs='?', default='naev.db',
+                        help='the database to create (default: %(default)s)')
+    parser.add_argument('--autopos', action='store_true',
+                        help='calculate and store the positions of '
+                        'autopositioned jump points')
+    args = parser.parse_args()
 
-    if os.path.exists(filename):
-        raise IOError("output file '{}' already exists".format(filename))
+    if os.path.exists(args.filename):
+        raise IOError("output file '{}' already exists".format(args.filename))
 
-    build_db(filename)
+    build_db(args.filename, args.autopos)
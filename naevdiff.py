@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+'''Compare two versions of the Naev data.
+
+Run this script with two sources of Naev data, each of which is either
+the root of a Naev source tree or a database file created by the script
+naevdb.py. It lists the star systems and assets added, removed or
+modified in going from the first to the second, along with the fields
+that changed. Example usage:
+    user@home:~/$ naevdiff naev-old/ naev-new/
+    user@home:~/$ naevdiff --json old.db new.db > changes.json
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+import json
+import os
+import sys
+
+# Local imports.
+from dataloader import datafiles
+from naevdata import Asset, SSystem, canonical, content_hash
+import naevdb
+
+def load_tree(naevroot):
+    '''Load the Naev data from a source tree for comparison.
+
+    Keyword arguments:
+        naevroot -- The root of the Naev source tree.
+    Returns:
+        A mapping object pairing the kind ('ssys' or 'asset') and name
+        of each star system and asset, as a 2-tuple, with its data in
+        canonical form.
+
+    '''
+    entities = {}
+    for ssysfile in datafiles('SSystems', naevroot):
+        ssys = SSystem(ssysfile)
+        entities['ssys', ssys.name] = canonical(ssys)
+    for assetfile in datafiles('Assets', naevroot):
+        asset = Asset(assetfile)
+        entities['asset', asset.name] = canonical(asset)
+    return entities
+
+def load_db(filename):
+    '''Load the Naev data from a database for comparison.
+
+    Keyword arguments:
+        filename -- The database file to read.
+    Returns:
+        As for load_tree().
+
+    '''
+    entities = {}
+    conn = naevdb.open_db(filename)
+    try:
+        for ssys in naevdb.get_ssystems(conn):
+            entities['ssys', ssys.name] = canonical(ssys)
+        for asset, systems in naevdb.get_assets(conn).values():
+            entities['asset', asset.name] = canonical(asset)
+    finally:
+        conn.close()
+    return entities
+
+def load(source):
+    '''Load Naev data from a source tree or database, as appropriate.'''
+    if os.path.isdir(source):
+        return load_tree(source)
+    elif os.path.exists(source):
+        return load_db(source)
+    else:
+        raise IOError("could not find Naev data at '{}'".format(source))
+
+def flatten(data, prefix=''):
+    '''Flatten nested mappings into one mapping with dotted keys.
+
+    For example, {'pos': {'x': 1, 'y': 2}} is flattened to {'pos.x': 1,
+    'pos.y': 2}. Values that are not mappings are left as they are.
+
+    '''
+    flat = {}
+    for key, val in data.items():
+        if isinstance(val, dict) and val:
+            flat.update(flatten(val, prefix + key + '.'))
+        else:
+            flat[prefix + key] = val
+    return flat
+
+def field_changes(old, new):
+    '''Find the fields that differ between two canonical records.
+
+    Returns:
+        A sorted list of 3-tuples, each holding the (dotted) name of a
+        changed field and its old and new values. A field that is only
+        present in one of the two records has None as its other value.
+
+    '''
+    old, new = flatten(old), flatten(new)
+    return sorted((field, old.get(field), new.get(field))
+                  for field in set(old) | set(new)
+                  if old.get(field) != new.get(field))
+
+def diff(old, new):
+    '''Compare two versions of the Naev data.
+
+    Each record is reduced to a hash of its canonical form, so the two
+    versions are compared in time proportional to their size. Only the
+    records whose hashes differ are compared field by field.
+
+    Keyword arguments:
+        old, new -- The two versions, as returned by load().
+    Returns:
+        A mapping object with the keys 'added', 'removed' and
+        'modified'. The first two hold sorted lists of the kinds and
+        names (as 2-tuples) of the records added or removed; the last
+        holds a sorted list of 3-tuples, each holding the kind and name
+        of a modified record, and its changed fields as given by
+        field_changes().
+
+    '''
+    old_hashes = dict((key, content_hash(data)) for key, data in old.items())
+    new_hashes = dict((key, content_hash(data)) for key, data in new.items())
+
+    added = sorted(key for key in new_hashes if key not in old_hashes)
+    removed = sorted(key for key in old_hashes if key not in new_hashes)
+    modified = sorted(key + (field_changes(old[key], new[key]),)
+                      for key, new_hash in new_hashes.items()
+                      if key in old_hashes and old_hashes[key] != new_hash)
+
+    return {'added': added, 'removed': removed, 'modified': modified}
+
+def print_diff(changes, file=sys.stdout):
+    '''Print a human-readable summary of the differences found.'''
+    for kind, name in changes['added']:
+        print('+ {} {}'.format(kind, name), file=file)
+    for kind, name in changes['removed']:
+        print('- {} {}'.format(kind, name), file=file)
+    for kind, name, fields in changes['modified']:
+        print('~ {} {}'.format(kind, name), file=file)
+        for field, old_val, new_val in fields:
+            print('    {}: {!r} -> {!r}'.format(field, old_val, new_val),
+                  file=file)
+
+def json_diff(changes):
+    '''Convert the differences found into a JSON-compatible form.'''
+    return {'added': [{'kind': kind, 'name': name}
+                      for kind, name in changes['added']],
+            'removed': [{'kind': kind, 'name': name}
+                        for kind, name in changes['removed']],
+            'modified': [{'kind': kind, 'name': name,
+                          'changes': [{'field': field, 'old': old_val,
+                                       'new': new_val}
+                                      for field, old_val, new_val in fields]}
+                         for kind, name, fields in changes['modified']]}
+
+def main(args):
+    '''Compare two versions of the Naev data from the command line.'''
+    parser = argparse.ArgumentParser(description='Compare two versions of '
+                                     'the Naev data.')
+    parser.add_argument('old', help='the old Naev source tree or database')
+    parser.add_argument('new', help='the new Naev source tree or database')
+    parser.add_argument('--json', action='store_true',
+                        help='write the differences as JSON')
+    args = parser.parse_args(args)
+
+    changes = diff(load(args.old), load(args.new))
+    if args.json:
+        json.dump(json_diff(changes), sys.stdout, indent=1,
+                  ensure_ascii=False)
+        print()
+    else:
+        print_diff(changes)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+'''Store many revisions of the Naev data in one SQLite database.
+
+Each star system, jump and asset is stored once for every distinct
+version of its content, identified by a hash of that content. A
+revision of the data is then just a list of the records it contains, so
+adding a revision that differs only slightly from one already stored
+costs little more than the records that changed. Example usage:
+    user@home:~/naev/$ naevstore add store.db 0.5.0
+    user@home:~/naev/$ naevstore list store.db
+    user@home:~/naev/$ naevstore compare store.db 0.4.2 0.5.0
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+import json
+import os
+import sqlite3 as db
+import sys
+
+# Local imports.
+from dataloader import datafiles
+from naevdata import Asset, SSystem, canonical, content_hash
+
+# The kinds of record held in the store.
+RECORD_KINDS = ('ssys', 'jump', 'asset')
+
+def make_store(conn):
+    '''Create an empty revision store.'''
+    cur = conn.cursor()
+    cur.execute('''CREATE TABLE IF NOT EXISTS Revisions (
+                     RevID INTEGER PRIMARY KEY AUTOINCREMENT
+                   , RevName TEXT UNIQUE NOT NULL
+                   )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS Records (
+                     RecHash TEXT PRIMARY KEY
+                   , RecKind TEXT NOT NULL
+                   , RecName TEXT NOT NULL
+                   , RecData TEXT NOT NULL
+                   )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS RevisionRecords (
+                     RevID INTEGER NOT NULL
+                     REFERENCES Revisions
+                       ON DELETE CASCADE
+                   , RecHash TEXT NOT NULL
+                     REFERENCES Records
+                   , PRIMARY KEY (RevID, RecHash)
+                   )''')
+    cur.execute('''CREATE INDEX IF NOT EXISTS RecKindNameIdx
+                   ON Records (RecKind, RecName)''')
+
+def jump_name(origin, dest):
+    '''Get the record name of the jump from one system to another.'''
+    return '{} > {}'.format(origin, dest)
+
+def records(ssystems, assets):
+    '''Break down Naev data into records for the store.
+
+    Star systems and their jumps are stored as separate records, so that
+    changing one jump does not make a new version of the whole system.
+
+    Keyword arguments:
+        ssystems -- An iterable of star systems (SSystem instances).
+        assets -- An iterable of assets (Asset instances).
+    Returns:
+        An iterator of 3-tuples, each holding the kind of record (one
+        of RECORD_KINDS), its name, and its data in canonical form.
+
+    '''
+    for ssys in ssystems:
+        data = canonical(ssys)
+        jumps = data.pop('jumps')
+        yield 'ssys', ssys.name, data
+        for dest, jump in jumps.items():
+            jump['origin'], jump['dest'] = ssys.name, dest
+            yield 'jump', jump_name(ssys.name, dest), jump
+    for asset in assets:
+        yield 'asset', asset.name, canonical(asset)
+
+def store_revision(conn, revname, ssystems, assets):
+    '''Store a revision of the Naev data in an open store.
+
+    Keyword arguments:
+        conn -- An open database connection to the store.
+        revname -- A name for this revision, which must not already be
+            in use.
+        ssystems, assets -- The data in this revision, as for records().
+    Returns:
+        A 2-tuple holding the number of records in this revision, and
+        how many of those were not already in the store.
+
+    '''
+    cur = conn.cursor()
+    cur.execute('SELECT 1 FROM Revisions WHERE RevName = ?', (revname,))
+    if cur.fetchone() is not None:
+        raise ValueError("revision '{}' is already stored".format(revname))
+    cur.execute('INSERT INTO Revisions (RevName) VALUES (?)', (revname,))
+    rev_id = cur.lastrowid
+
+    total = new = 0
+    for kind, name, data in records(ssystems, assets):
+        rec_hash = content_hash({'kind': kind, 'name': name, 'data': data})
+        cur.execute('''INSERT OR IGNORE INTO Records (
+                         RecHash, RecKind, RecName, RecData
+                       ) VALUES (
+                         ?, ?, ?, ?
+                       )''', (rec_hash, kind, name,
+                              json.dumps(data, sort_keys=True,
+                                         ensure_ascii=False)))
+        new += cur.rowcount
+        # The same record may turn up twice, if (say) two files define the
+        # same asset, so ignore duplicates here too.
+        cur.execute('''INSERT OR IGNORE INTO RevisionRecords (RevID, RecHash)
+                       VALUES (?, ?)''', (rev_id, rec_hash))
+        total += cur.rowcount
+
+    return total, new
+
+def add_revision(conn, revname, naevroot=None):
+    '''Read the data files from a Naev source tree into an open store.
+
+    Keyword arguments:
+        conn, revname -- As for store_revision().
+        naevroot -- The root of the Naev source tree. If omitted, the
+            current directory is used.
+    Returns:
+        As for store_revision().
+
+    '''
+    ssystems = (SSystem(ssysfile)
+                for ssysfile in datafiles('SSystems', naevroot))
+    assets = (Asset(assetfile) for assetfile in datafiles('Assets', naevroot))
+    return store_revision(conn, revname, ssystems, assets)
+
+def get_revisions(conn):
+    '''Get the names of all revisions in an open store, oldest first.'''
+    cur = conn.cursor()
+    cur.execute('SELECT RevName FROM Revisions ORDER BY RevID')
+    return [row[0] for row in cur]
+
+def _get_rev_id(conn, revname):
+    '''Get the database ID for the named revision.'''
+    cur = conn.cursor()
+    cur.execute('SELECT RevID FROM Revisions WHERE RevName = ?', (revname,))
+    row = cur.fetchone()
+    if row is None:
+        raise KeyError("no such revision '{}'".format(revname))
+    return row[0]
+
+def iter_revision(conn, revname, kind=None):
+    '''Iterate over the records in one revision of the data.
+
+    Keyword arguments:
+        conn -- An open database connection to the store.
+        revname -- The name of the revision to read.
+        kind -- If given, only records of this kind are read.
+    Returns:
+        An iterator of 3-tuples, as for records().
+
+    '''
+    rev_id = _get_rev_id(conn, revname)
+    cur = conn.cursor()
+    cur.execute('''SELECT r.RecKind, r.RecName, r.RecData
+                   FROM
+                     RevisionRecords rr JOIN
+                     Records r ON r.RecHash = rr.RecHash
+                   WHERE rr.RevID = ? AND (? IS NULL OR r.RecKind = ?)
+                   ORDER BY r.RecKind, r.RecName''', (rev_id, kind, kind))
+    for row in cur:
+        yield row[0], row[1], json.loads(row[2])
+
+def compare_revisions(conn, old, new):
+    '''Find the records that differ between two revisions of the data.
+
+    Keyword arguments:
+        conn -- An open database connection to the store.
+        old, new -- The names of the revisions to compare.
+    Returns:
+        A mapping object with the keys 'added', 'removed' and
+        'modified', each of which holds a sorted list of the kinds and
+        names (as 2-tuples) of the records that were added, removed or
+        modified in going from the old revision to the new one.
+
+    '''
+    old_id, new_id = _get_rev_id(conn, old), _get_rev_id(conn, new)
+    cur = conn.cursor()
+    # Find the records in one revision but not the other. Records common to
+    # both are never read at all.
+    query = '''SELECT r.RecKind, r.RecName
+               FROM
+                 RevisionRecords rr JOIN
+                 Records r ON r.RecHash = rr.RecHash
+               WHERE rr.RevID = ? AND rr.RecHash NOT IN (
+                 SELECT RecHash FROM RevisionRecords WHERE RevID = ?
+               )'''
+    cur.execute(query, (old_id, new_id))
+    only_old = set((row[0], row[1]) for row in cur)
+    cur.execute(query, (new_id, old_id))
+    only_new = set((row[0], row[1]) for row in cur)
+
+    return {'added': sorted(only_new - only_old),
+            'removed': sorted(only_old - only_new),
+            'modified': sorted(only_old & only_new)}
+
+def main(args):
+    '''Work with a revision store from the command line.'''
+    parser = argparse.ArgumentParser(description='Store many revisions of '
+                                     'the Naev data in one database.')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND',
+                                       required=True)
+    add_parser = subparsers.add_parser('add', help='read the data files into '
+                                       'the store as a new revision')
+    add_parser.add_argument('store', help='the store file, which is created '
+                            'if need be')
+    add_parser.add_argument('revision', help='the name of the new revision')
+    add_parser.add_argument('naevroot', nargs='?',
+                            help='the root of the Naev source tree '
+                            '(default: the current directory)')
+    list_parser = subparsers.add_parser('list', help='list the revisions in '
+                                        'the store, oldest first')
+    list_parser.add_argument('store', help='the store file')
+    compare_parser = subparsers.add_parser('compare', help='list the '
+                                           'records that differ between two '
+                                           'revisions')
+    compare_parser.add_argument('store', help='the store file')
+    compare_parser.add_argument('old', help='the name of the old revision')
+    compare_parser.add_argument('new', help='the name of the new revision')
+    args = parser.parse_args(args)
+
+    if args.command != 'add' and not os.path.exists(args.store):
+        raise IOError("store file '{}' does not exist".format(args.store))
+
+    conn = db.connect(args.store)
+    try:
+        if args.command == 'add':
+            with conn:
+                make_store(conn)
+                total, new = add_revision(conn, args.revision, args.naevroot)
+            print('Stored {} records ({} new).'.format(total, new))
+        elif args.command == 'list':
+            for revname in get_revisions(conn):
+                print(revname)
+        else:
+            try:
+                changes = compare_revisions(conn, args.old, args.new)
+            except KeyError as err:
+                parser.error(err.args[0])
+            for change in ('added', 'removed', 'modified'):
+                for kind, name in changes[change]:
+                    print('{} {} {}'.format(change, kind, name))
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
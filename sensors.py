@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+'''Work out what sensors can detect in the Naev universe.
+
+Jump points and assets each have a "hide" value, and star systems an
+"interference" value, which together decide how hard things are to
+find. This module gathers them into one table, from which it can be
+read off, for any sensor strength, what is detectable in every system.
+
+The model used is a simplification of the game's. A sensor of strength S
+is taken to work at S * (1 - interference / 1000) in a system, and to
+detect anything whose hide value is no more than that. Things with no
+hide value are always detected, and in a system with interference of
+1000 or more, nothing else is. The game itself compares the distance to
+each object with a sensor range scaled by these values, so what this
+gives is whether something can be detected from somewhere in the
+system, not from any one place; and the game may scale things in ways
+not modelled here. Treat the results as a comparison between systems
+and objects, not as exact game behaviour.
+
+'''
+
+# Copyright © 2012 Tim Pederick.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports.
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+import math
+import sys
+
+# Local imports.
+from dataloader import datafiles
+from naevdata import Asset, SSystem
+import naevdb
+
+# The interference at which sensors stop working altogether.
+MAX_INTERFERENCE = 1000.0
+
+# How much of a system sensors can see, as given by SensorTable.coverage().
+COVERAGE = ('all detected', 'partly detected', 'none detected')
+
+def threshold(hide, interference):
+    '''Find the sensor strength needed to detect something.
+
+    Keyword arguments:
+        hide -- The hide value of the thing to detect.
+        interference -- The interference in the system it is in.
+    Returns:
+        The lowest sensor strength that detects it, as a float. This is
+        infinite if it can't be detected at any strength.
+
+    '''
+    if hide <= 0:
+        return 0.0
+    elif interference >= MAX_INTERFERENCE:
+        return math.inf
+    return hide / (1 - interference / MAX_INTERFERENCE)
+
+class SensorTable:
+    '''The sensor strengths needed to detect things, system by system.
+
+    The strengths are worked out once, and kept in one flat array,
+    sorted within each system. The number of things a sensor detects in
+    a system is then found by a binary search, and the things themselves
+    are the ones before that point, so no query has to look at each
+    thing in turn.
+
+    Instance attributes:
+        systems -- A sorted list of the names of the star systems.
+        starts -- An array of positions in the rows below. The rows for
+            systems[i] run from starts[i] up to starts[i + 1].
+        thresholds -- An array of the sensor strengths needed to detect
+            each thing (see threshold()), one row per thing.
+        kinds -- A list of what each thing is, one row per thing:
+            'jump' or 'asset'.
+        names -- A list of the names of the things, one row per thing.
+            A jump is named for the system it leads to.
+
+    '''
+    def __init__(self, interference, objects):
+        '''Build the table.
+
+        Keyword arguments:
+            interference -- A mapping object pairing the name of each
+                star system with its interference.
+            objects -- An iterable of 4-tuples, one for each thing that
+                can be detected, holding the name of the system it is
+                in, what it is ('jump' or 'asset'), its name, and its
+                hide value. Things in unknown systems are left out.
+
+        '''
+        self.systems = sorted(interference)
+        index = dict((name, i) for i, name in enumerate(self.systems))
+        rows = sorted((index[ssys], threshold(hide, interference[ssys]),
+                       kind, name)
+                      for ssys, kind, name, hide in objects
+                      if ssys in index)
+
+        self.thresholds = array('d', (row[1] for row in rows))
+        self.kinds = [row[2] for row in rows]
+        self.names = [row[3] for row in rows]
+        self.starts = array('l', [0] * (len(self.systems) + 1))
+        for row in rows:
+            self.starts[row[0] + 1] += 1
+        for i in range(len(self.systems)):
+            self.starts[i + 1] += self.starts[i]
+
+    @classmethod
+    def from_ssystems(cls, ssystems, assets):
+        '''Build the table from SSystem and Asset instances.
+
+        Keyword arguments:
+            ssystems -- An iterable of the star systems.
+            assets -- An iterable of the assets. Virtual assets, and
+                assets that are in no system, are left out.
+
+        '''
+        ssystems = list(ssystems)
+        hides = dict((asset.name, asset.hide) for asset in assets
+                     if not asset.virtual)
+        objects = []
+        for ssys in ssystems:
+            objects.extend((ssys.name, 'jump', dest, jump.hide)
+                           for dest, jump in ssys.jumps.items())
+            objects.extend((ssys.name, 'asset', name, hides[name])
+                           for name in ssys.assets if name in hides)
+        return cls(dict((ssys.name, ssys.interference) for ssys in ssystems),
+                   objects)
+
+    @classmethod
+    def from_db(cls, conn):
+        '''Build the table from an open database.'''
+        cur = conn.cursor()
+        cur.execute('SELECT SSysName, SSysInterference FROM SSystems')
+        interference = dict((row[0], row[1]) for row in cur)
+        cur.execute('''SELECT s.SSysName, 'jump', t.SSysName, j.JumpHide
+                       FROM
+                         Jumps j JOIN
+                         SSystems s ON s.SSysID = j.JumpFromID JOIN
+                         SSystems t ON t.SSysID = j.JumpToID
+                       UNION ALL
+                       SELECT s.SSysName, 'asset', a.AssetName, a.AssetHide
+                       FROM
+                         Assets a JOIN
+                         SSystems s ON s.SSysID = a.SSysID''')
+        return cls(interference, (tuple(row) for row in cur))
+
+    def _rows(self, ssys):
+        '''Get the range of rows for a system.'''
+        i = bisect_left(self.systems, ssys)
+        if i == len(self.systems) or self.systems[i] != ssys:
+            raise KeyError(ssys)
+        return self.starts[i], self.starts[i + 1]
+
+    def total(self, ssys):
+        '''Count the jump points and assets in a system.'''
+        start, stop = self._rows(ssys)
+        return stop - start
+
+    def count(self, ssys, strength):
+        '''Count the things a sensor detects in a system.'''
+        start, stop = self._rows(ssys)
+        return bisect_right(self.thresholds, strength, start, stop) - start
+
+    def detected(self, ssys, strength):
+        '''List the things a sensor detects in a system.
+
+        Keyword arguments:
+            ssys -- The name of the star system.
+            strength -- The sensor strength.
+        Returns:
+            A list of 3-tuples, one for each thing detected, holding
+            what it is, its name, and the sensor strength needed to
+            detect it. They are in order of that strength.
+
+        '''
+        start, stop = self._rows(ssys)
+        stop = bisect_right(self.thresholds, strength, start, stop)
+        return [(self.kinds[row], self.names[row], self.thresholds[row])
+                for row in range(start, stop)]
+
+    def counts(self, strength):
+        '''Count the things a sensor detects in every system at once.
+
+        Returns:
+            A list of the counts, in the same order as the systems.
+
+        '''
+        thresholds = self.thresholds
+        starts = self.starts
+        return [bisect_right(thresholds, strength, starts[i],
+                             starts[i + 1]) - starts[i]
+                for i in range(len(self.systems))]
+
+    def coverage(self, strength):
+        '''Find how much of each system a sensor can see.
+
+        Returns:
+            A mapping object pairing the names of the systems that have
+            anything to detect with one of COVERAGE, for use as a
+            territory overlay (see jumpmap.makemap()).
+
+        '''
+        everything, some, nothing = COVERAGE
+        coverage = {}
+        for i, count in enumerate(self.counts(strength)):
+            total = self.starts[i + 1] - self.starts[i]
+            if total:
+                coverage[self.systems[i]] = (everything if count == total
+                                             else some if count
+                                             else nothing)
+        return coverage
+
+def _strength(value):
+    '''Format a sensor strength for printing.'''
+    return '{:g}'.format(value) if math.isfinite(value) else 'never'
+
+def report(table, strengths, file=sys.stdout):
+    '''Print out what sensors of different strengths detect.
+
+    Each system gets a line showing, for each strength, how many of the
+    things in it are detected out of how many there are. A total line
+    follows.
+
+    Keyword arguments:
+        table -- The SensorTable to report from.
+        strengths -- A sequence of sensor strengths.
+        file -- The file to print to. The default is standard output.
+
+    '''
+    columns = [table.counts(strength) for strength in strengths]
+    width = max([len(name) for name in table.systems] + [len('Total')])
+    print(' ' * width, *('{:>12}'.format('S=' + _strength(strength))
+                         for strength in strengths), file=file)
+    for i, name in enumerate(table.systems):
+        total = table.starts[i + 1] - table.starts[i]
+        print(name.ljust(width), *('{:>12}'.format('{}/{}'.format(
+            column[i], total)) for column in columns), file=file)
+    print('Total'.ljust(width), *('{:>12}'.format('{}/{}'.format(
+        sum(column), len(table.thresholds))) for column in columns),
+          file=file)
+
+def report_system(table, ssys, strengths, file=sys.stdout):
+    '''Print out the things in one system, and what detects them.
+
+    Keyword arguments:
+        table -- The SensorTable to report from.
+        ssys -- The name of the star system.
+        strengths -- A sequence of sensor strengths. Each thing is shown
+            with the lowest of these that detects it.
+        file -- The file to print to. The default is standard output.
+
+    '''
+    strengths = sorted(strengths)
+    print('{}:'.format(ssys), file=file)
+    # An infinite strength lists everything, even what can't be detected.
+    for kind, name, needed in table.detected(ssys, math.inf):
+        lowest = bisect_left(strengths, needed)
+        if not math.isfinite(needed):
+            detected_by = 'never detected'
+        elif lowest < len(strengths):
+            detected_by = 'detected from S={}'.format(
+                _strength(strengths[lowest]))
+        else:
+            detected_by = 'not detected by any strength given'
+        print('  {} {}: needs S={}, {}'.format(kind, name, _strength(needed),
+                                              detected_by), file=file)
+
+def main(args):
+    '''Report what sensors can detect from the command line.
+
+    Unless a database is given with the --db option, the data files are
+    assumed to be in ./dat/, relative to the current path, so this
+    should be run from the root of the Naev source directory.
+
+    '''
+    parser = argparse.ArgumentParser(description='Find which jump points '
+                                     'and assets sensors of different '
+                                     'strengths can detect in each system.')
+    parser.add_argument('strengths', type=float, nargs='+',
+                        metavar='STRENGTH', help='a sensor strength')
+    parser.add_argument('--db', metavar='FILE',
+                        help='read the data from this database (made by '
+                        'naevdb.py), instead of from the data files')
+    parser.add_argument('--system', metavar='SYSTEM',
+                        help='list the things in this system, instead of '
+                        'counting them in every system')
+    args = parser.parse_args(args)
+
+    if args.db is not None:
+        conn = naevdb.open_db(args.db, in_memory=False, readonly=True)
+        try:
+            table = SensorTable.from_db(conn)
+        finally:
+            conn.close()
+    else:
+        table = SensorTable.from_ssystems(
+            (SSystem(ssysfile) for ssysfile in datafiles('SSystems')),
+            (Asset(assetfile) for assetfile in datafiles('Assets')))
+
+    if args.system is None:
+        report(table, args.strengths)
+    else:
+        try:
+            table.total(args.system)
+        except KeyError:
+            parser.error("no star system named '{}'".format(args.system))
+        report_system(table, args.system, args.strengths)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])